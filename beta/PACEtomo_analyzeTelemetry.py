@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_analyzeTelemetry
+# Purpose:	Summarizes the _telemetry.csv files written by PACEtomo runs to compare settings across many sessions.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# Run outside of SerialEM: python PACEtomo_analyzeTelemetry.py [files or folders] [--bins 10] [--out summary.csv]
+# Folders are searched recursively for *_telemetry.csv files.
+
+import os
+import sys
+import glob
+import argparse
+import numpy as np
+
+######## FUNCTIONS ########
+
+def readTelemetry(fileName):										# read telemetry file into dict of typed column arrays
+	with open(fileName) as f:
+		header = f.readline().strip().split(",")
+	names = [col.split(":")[0] for col in header]
+	types = [int if col.split(":")[-1] == "int" else float for col in header]
+	data = np.loadtxt(fileName, delimiter=",", skiprows=1, ndmin=2)
+	if data.size == 0:
+		data = np.zeros((0, len(names)))
+	return {name: data[:, i].astype(dtype) for i, (name, dtype) in enumerate(zip(names, types))}
+
+def predictedImages(tel):										# images with SSYpred predicted from previous image of branch
+	if "predicted" in tel.keys():
+		return tel["predicted"] == 1
+	return tel["tilt"] != tel["tilt"][0] if len(tel["tilt"]) > 0 else np.zeros(0, dtype=bool)	# older files: all images except start tilt
+
+def summarizeRun(tel):											# calculate summary values of one run
+	predErr = np.abs(tel["SSY"] - tel["SSYpred"])[predictedImages(tel)]
+	aliErr = np.hypot(tel["aErrX"], tel["aErrY"])
+	ctf = np.isfinite(tel["ctfDefocus"])
+	summary = {
+		"images": len(tel["target"]),
+		"targets": len(np.unique(tel["target"])),
+		"minTilt": np.min(tel["tilt"]) if len(tel["tilt"]) > 0 else np.nan,
+		"maxTilt": np.max(tel["tilt"]) if len(tel["tilt"]) > 0 else np.nan,
+		"predErrMean": np.mean(predErr) if len(predErr) > 0 else np.nan,
+		"predErr95": np.percentile(predErr, 95) if len(predErr) > 0 else np.nan,
+		"aliErrRMS": np.sqrt(np.mean(aliErr**2)) if len(aliErr) > 0 else np.nan,
+		"ctfFraction": np.mean(ctf) if len(ctf) > 0 else np.nan,
+		"timePred": np.mean(tel["timePred"]) if len(tel["timePred"]) > 0 else np.nan,
+		"timeCtf": np.mean(tel["timeCtf"]) if len(tel["timeCtf"]) > 0 else np.nan,
+		"timeTotal": np.mean(tel["timeTotal"]) if len(tel["timeTotal"]) > 0 else np.nan,
+	}
+	return summary
+
+def binnedError(tilts, errors, edges):									# mean and count of errors per tilt angle bin
+	idx = np.digitize(tilts, edges) - 1
+	valid = (idx >= 0) & (idx < len(edges) - 1)
+	counts = np.bincount(idx[valid], minlength=len(edges) - 1)
+	sums = np.bincount(idx[valid], weights=errors[valid], minlength=len(edges) - 1)
+	with np.errstate(invalid="ignore", divide="ignore"):
+		return sums / counts, counts
+
+def formatValue(value):
+	if isinstance(value, (int, np.integer)):
+		return str(value)
+	return str(round(float(value), 4))
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Summarize PACEtomo telemetry files.")
+	parser.add_argument("paths", nargs="*", default=[os.getcwd()], help="telemetry files or folders containing telemetry files")
+	parser.add_argument("--bins", type=int, default=10, help="number of absolute tilt angle bins for prediction error")
+	parser.add_argument("--out", default="", help="save run summaries to this csv file")
+	args = parser.parse_args()
+
+	files = []
+	for path in args.paths:
+		if os.path.isdir(path):
+			files.extend(sorted(glob.glob(os.path.join(path, "**", "*_telemetry.csv"), recursive=True)))
+		else:
+			files.append(path)
+	if len(files) == 0:
+		print("ERROR: No telemetry files found!")
+		sys.exit(1)
+
+	summaries = []
+	allTilts = []
+	allErrors = []
+	for fileName in files:
+		tel = readTelemetry(fileName)
+		summary = summarizeRun(tel)
+		summary["file"] = os.path.basename(fileName)
+		summaries.append(summary)
+
+		predicted = predictedImages(tel)
+		allTilts.append(np.abs(tel["tilt"][predicted]))
+		allErrors.append(np.abs(tel["SSY"] - tel["SSYpred"])[predicted])
+
+	keys = [key for key in summaries[0].keys() if key != "file"]
+	print("file," + ",".join(keys))
+	for summary in summaries:
+		print(summary["file"] + "," + ",".join([formatValue(summary[key]) for key in keys]))
+
+	allTilts = np.concatenate(allTilts)
+	allErrors = np.concatenate(allErrors)
+	print("")
+	print("Runs: " + str(len(summaries)) + " | Images: " + str(sum([summary["images"] for summary in summaries])))
+	if len(allTilts) > 0:
+		edges = np.linspace(0, np.max(allTilts) + 1e-6, args.bins + 1)
+		means, counts = binnedError(allTilts, allErrors, edges)
+		print("Mean prediction error [microns] vs absolute tilt angle:")
+		for i in range(len(counts)):
+			if counts[i] > 0:
+				print("  " + str(round(edges[i], 1)) + " - " + str(round(edges[i + 1], 1)) + " deg: " + str(round(means[i], 4)) + " (" + str(counts[i]) + " images)")
+
+	if args.out != "":
+		with open(args.out, "w") as f:
+			f.write("file," + ",".join(keys) + "\n")
+			for summary in summaries:
+				f.write(summary["file"] + "," + ",".join([formatValue(summary[key]) for key in keys]) + "\n")
+		print("Saved summary to " + args.out)
+
+if __name__ == "__main__":
+	main()
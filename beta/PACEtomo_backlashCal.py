@@ -0,0 +1,126 @@
+#!Python
+# ===================================================================
+#ScriptName	PACEtomo_backlashCal
+# Purpose:	Measures stage tilt reproducibility with and without backlash step and saves the backlash model for PACEtomo (backlashModel setting).
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# Move the stage to an area with some features (not a target, it will receive many View images) and run the script.
+# For every step size and direction, the stage is repeatedly tilted away from refTilt by the step size and back. The tilt back is done
+# either directly or with a backlash step (like PACEtomo: tilt to angle, tilt by -backlashStep, tilt to angle). Every View image after
+# tilting back is aligned to the previous one of the same kind. The alignment shifts are the positioning errors that tracking has to absorb.
+# Additionally, the shift between approaching refTilt from above and from below is measured (tiltOffset). It applies once when a branch
+# switches between tilting with and without backlash step.
+# The results are saved to PACEtomo_calibration.txt in your home directory, where PACEtomo will find them and keep refining them during runs.
+
+############ SETTINGS ############
+
+refTilt		= 0				# tilt angle [degrees] at which positioning errors are measured
+stepSizes	= [3, 10, 20, 40, 60]		# sizes of tilt moves [degrees] (PACEtomo moves by up to twice the maximum tilt angle when switching branches)
+backlashStep	= 3				# size of backlash step [degrees] (use the step of your tilt series)
+repeats		= 4				# number of measurements for each step size, direction and backlash option
+
+########## END SETTINGS ##########
+
+import serialem as sem
+import os
+from datetime import datetime
+import numpy as np
+
+calibrationFile = os.path.join(os.path.expanduser("~"), "PACEtomo_calibration.txt")		# same file as used by PACEtomo
+tiltMoves = ["tiltPos", "tiltPosBL", "tiltNeg", "tiltNegBL"]						# direction of tilt move with or without backlash step
+
+######## FUNCTIONS ########
+
+def readCalibration():
+	calibration = {}
+	if os.path.exists(calibrationFile):
+		with open(calibrationFile) as f:
+			for line in f.readlines():
+				col = line.split("=")
+				if len(col) == 2 and not line.startswith("#"):
+					calibration[col[0].strip()] = float(col[1])
+	return calibration
+
+def writeCalibration(values):
+	calibration = readCalibration()
+	calibration.update(values)
+	output = "# PACEtomo calibration updated " + datetime.now().strftime("%d.%m.%Y %H:%M:%S") + "\n"
+	for key, value in calibration.items():
+		output += key + " = " + str(value) + "\n"
+	with open(calibrationFile, "w") as f:
+		f.write(output)
+
+def tiltBack(direction, stepSize, backlash):								# tilt away from refTilt (reversing the direction) and back
+	sem.TiltTo(refTilt - direction * stepSize)							# move before tilting back is in opposite direction
+	sem.TiltTo(refTilt)
+	if backlash:
+		sem.TiltBy(-backlashStep)
+		sem.TiltTo(refTilt)
+
+def measure(direction, stepSize, backlash):							# positioning errors [microns] after tilting back to refTilt
+	errors = []
+	for i in range(repeats + 1):
+		tiltBack(direction, stepSize, backlash)
+		sem.V()
+		if i > 0:										# first image is only reference
+			sem.AlignTo("O")
+			ASX, ASY = sem.ReportAlignShift()[4:6]
+			errors.append(np.hypot(ASX, ASY) / 1000)
+			sem.SetImageShift(ISX0, ISY0)
+			sem.V()
+		sem.Copy("A", "O")
+	return errors
+
+def measureOffset():											# shifts [microns] between approaching refTilt from above and from below
+	offsets = []
+	for i in range(repeats):
+		sem.TiltTo(refTilt + backlashStep)
+		sem.TiltTo(refTilt)
+		sem.V()
+		sem.Copy("A", "O")
+		sem.TiltBy(-backlashStep)
+		sem.TiltTo(refTilt)
+		sem.V()
+		sem.AlignTo("O")
+		ASX, ASY = sem.ReportAlignShift()[4:6]
+		offsets.append(np.hypot(ASX, ASY) / 1000)
+		sem.SetImageShift(ISX0, ISY0)
+	return offsets
+
+######## END FUNCTIONS ########
+
+sem.SuppressReports()
+sem.GoToLowDoseArea("V")
+ISX0, ISY0, *_ = sem.ReportImageShift()
+
+models = {}
+for move in tiltMoves:
+	direction = 1 if move.startswith("tiltPos") else -1
+	backlash = move.endswith("BL")
+	models[move] = {"n": 0, "Sx": 0, "Sy": 0, "Sxx": 0, "Sxy": 0}
+	for stepSize in stepSizes:
+		if abs(refTilt - direction * stepSize) > 70:
+			sem.Echo("WARNING: Step size " + str(stepSize) + " would exceed the tilt range and was skipped.")
+			continue
+		errors = measure(direction, stepSize, backlash)
+		for error in errors:									# same running sums as PACEtomo
+			models[move]["n"] += 1
+			models[move]["Sx"] += stepSize
+			models[move]["Sy"] += error
+			models[move]["Sxx"] += stepSize**2
+			models[move]["Sxy"] += stepSize * error
+		sem.Echo(move + " (" + str(stepSize) + " deg): mean error = " + str(round(np.mean(errors), 3)) + " microns | max error = " + str(round(np.max(errors), 3)) + " microns")
+
+offsets = measureOffset()
+sem.Echo("Backlash offset: mean = " + str(round(np.mean(offsets), 3)) + " microns | max = " + str(round(np.max(offsets), 3)) + " microns")
+
+sem.TiltTo(refTilt)
+sem.SetImageShift(ISX0, ISY0)
+calibration = {move + "_" + key: round(value, 6) for move in tiltMoves for key, value in models[move].items()}
+calibration["tiltOffset"] = round(float(np.mean(offsets)), 6)
+writeCalibration(calibration)
+sem.Echo("Saved backlash model to " + calibrationFile + ". Set backlashModel = True in PACEtomo to use it.")
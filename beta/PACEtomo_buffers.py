@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_buffers
+# Purpose:	Read-only NumPy views of SerialEM image buffers without copying the image data.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This module is imported by selectTargets and targetsFromMontage.
+# SerialEM has to be able to find it: copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.
+#
+# view() returns the buffer image as read-only array that shares memory with SerialEM. Flipping the y-axis and cropping only
+# change strides and offset of the view. The returned Orientation is needed to convert coords in the view back to buffer coords
+# (e.g. for AddImagePosAsNavPoint). Copies are only made by asType(), copy() and binImage() and are counted in allocated.
+#
+# Example:	image, orient = buffers.view("A", flipY=True, crop=(0, 0, 1024, 1024))
+#		peak = np.unravel_index(np.argmax(image), image.shape)
+#		row, col = buffers.toBuffer(peak, orient)
+#		sem.Echo(buffers.report())
+
+from collections import namedtuple
+import numpy as np
+import serialem as sem
+
+Orientation = namedtuple("Orientation", ["buffer", "flipY", "origin", "height"])			# origin: [row, col] of view in (flipped) buffer image, height: rows of buffer image
+allocated = {"bytes": 0, "arrays": 0}									# memory allocated by this module since last reset()
+
+######## FUNCTIONS ########
+
+def view(buffer, flipY=False, crop=None):								# read-only view of buffer image, crop as [row, col, rows, cols] after flipping
+	image = np.asarray(sem.bufferImage(buffer)).view()
+	image.flags.writeable = False									# never write to SerialEM buffer by accident
+	height = image.shape[0]
+	if flipY:
+		image = image[::-1]									# negative stride, no copy
+	origin = np.zeros(2, dtype=int)
+	if crop is not None:
+		origin = np.clip(np.array(crop[:2], dtype=int), 0, image.shape)
+		image = image[origin[0]:origin[0] + int(crop[2]), origin[1]:origin[1] + int(crop[3])]
+	return image, Orientation(buffer, flipY, origin, height)
+
+def centerCrop(buffer, size):										# crop of size [rows, cols] around buffer center for view()
+	shape = np.asarray(sem.bufferImage(buffer)).shape
+	return [max(0, int(shape[0] / 2 - size[0] / 2)), max(0, int(shape[1] / 2 - size[1] / 2)), int(size[0]), int(size[1])]
+
+def toBuffer(coords, orient):										# convert [row, col] coords of view to [row, col] coords of buffer image
+	coords = np.array(coords, dtype=float) + orient.origin
+	if orient.flipY:
+		coords[..., 0] = orient.height - 1 - coords[..., 0]
+	return coords
+
+def count(image):
+	allocated["bytes"] += image.nbytes
+	allocated["arrays"] += 1
+	return image
+
+def asType(image, dtype):										# cast only if dtype differs
+	if image.dtype == np.dtype(dtype):
+		return image
+	return count(image.astype(dtype))
+
+def copy(image):											# writable copy of view
+	return count(np.array(image))
+
+def binImage(image, factor, dtype=np.float32):								# sum of factor x factor pixels (edges are cropped to multiple of factor) in a single allocation
+	rows, cols = image.shape[0] // factor, image.shape[1] // factor
+	blocks = image[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor)
+	return count(blocks.sum(axis=(1, 3), dtype=dtype))
+
+def report():
+	return "Buffer image copies: " + str(allocated["arrays"]) + " (" + str(round(allocated["bytes"] / 1024**2, 1)) + " MB)"
+
+def reset():
+	allocated["bytes"] = 0
+	allocated["arrays"] = 0
+
+######## END FUNCTIONS ########
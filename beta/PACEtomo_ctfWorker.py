@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_ctfWorker
+# Purpose:	Background CTF estimation of tilt series images while PACEtomo is collecting.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This script is started by PACEtomo when ctfWorker = True (it needs numpy in the Python environment set as pythonExe).
+# It watches the given tilt series files for new sections, fits the defocus in a process pool and appends the results to a
+# sidecar file for each tilt series (<tsfile>_ctf.txt), which PACEtomo reads after every tilt.
+# Manual use: python PACEtomo_ctfWorker.py --files ts1.mrc ts2.mrc [--kV 300] [--cs 2.7] [--done stopfile]
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+######## FUNCTIONS ########
+
+def powerSpectrum(image, box=512):									# average power spectrum of tiles (periodogram averaging)
+	box = min(box, *image.shape) // 2 * 2
+	rows = image.shape[0] // box
+	cols = image.shape[1] // box
+	tiles = image[:rows * box, :cols * box].reshape(rows, box, cols, box).swapaxes(1, 2).reshape(-1, box, box)
+	tiles = tiles - np.mean(tiles, axis=(1, 2), keepdims=True)
+	spectrum = np.mean(np.abs(np.fft.rfft2(tiles))**2, axis=0)
+	return spectrum, box
+
+def radialAverage(spectrum, box):									# rotational average of rfft2 spectrum
+	ky = np.fft.fftfreq(box)[:, np.newaxis]
+	kx = np.fft.rfftfreq(box)[np.newaxis, :]
+	radius = np.round(np.sqrt(kx**2 + ky**2) * box).astype(int)
+	counts = np.bincount(radius.ravel())
+	profile = np.bincount(radius.ravel(), weights=spectrum.ravel()) / np.maximum(counts, 1)
+	return profile[:box // 2]
+
+def fitCtf(image, pixelSize, kV=300, cs=2.7, ampContrast=0.07, minDefocus=0.5, maxDefocus=10, minRes=30, maxRes=5):
+	# returns defocus [microns] (negative for underfocus like SerialEM) and estimated fit resolution [A]
+	spectrum, box = powerSpectrum(np.asarray(image, dtype=np.float32))
+	profile = np.sqrt(radialAverage(spectrum, box))
+	k = np.arange(len(profile)) / (box * pixelSize)							# spatial frequency [1/A]
+	band = (k >= 1 / minRes) & (k <= min(1 / maxRes, 0.95 / (2 * pixelSize)))
+	if np.sum(band) < 10:
+		return np.nan, np.nan
+
+	kernel = np.ones(15) / 15									# subtract smooth background
+	background = np.convolve(np.pad(profile, 7, mode="edge"), kernel, mode="valid")
+	signal = profile - background
+	k = k[band]
+	signal = signal[band]
+	signal = (signal - np.mean(signal)) / (np.std(signal) + 1e-12)
+
+	voltage = kV * 1e3										# electron wavelength [A]
+	wavelength = 12.2643 / np.sqrt(voltage * (1 + 0.978466e-6 * voltage))
+	phaseShift = np.arcsin(ampContrast)
+	defoci = np.arange(minDefocus, maxDefocus, 0.01) * 1e4						# defocus candidates [A]
+	chi = np.pi * wavelength * defoci[:, np.newaxis] * k[np.newaxis, :]**2 - 0.5 * np.pi * cs * 1e7 * wavelength**3 * k[np.newaxis, :]**4 + phaseShift
+	models = np.sin(chi)**2
+	models = (models - np.mean(models, axis=1, keepdims=True)) / (np.std(models, axis=1, keepdims=True) + 1e-12)
+	scores = models @ signal / len(signal)
+	best = np.argmax(scores)
+
+	window = max(5, len(signal) // 10)								# fit resolution: highest frequency where local correlation stays above 0.3
+	products = models[best] * signal
+	local = np.convolve(products, np.ones(window) / window, mode="same")
+	good = np.nonzero(local < 0.3)[0]
+	good = good[good > window]
+	resolution = 1 / k[good[0]] if len(good) > 0 else 1 / k[-1]
+	return -defoci[best] / 1e4, resolution
+
+def readHeader(fileName):										# dimensions, data type, data offset and pixel size [A] from MRC header (read with plain open to not lock the file)
+	with open(fileName, "rb") as f:
+		header = f.read(1024)
+	if len(header) < 1024:
+		return None
+	nx, ny, nz, mode = np.frombuffer(header, dtype="<i4", count=4)
+	mx = np.frombuffer(header, dtype="<i4", count=1, offset=28)[0]
+	xlen = np.frombuffer(header, dtype="<f4", count=1, offset=40)[0]
+	extended = np.frombuffer(header, dtype="<i4", count=1, offset=92)[0]
+	dtypes = {0: np.int8, 1: np.int16, 2: np.float32, 6: np.uint16, 12: np.float16}
+	if int(mode) not in dtypes.keys():
+		raise ValueError("Unsupported MRC mode " + str(mode) + " of " + fileName)
+	pixelSize = float(xlen / mx) if mx > 0 and xlen > 0 else 1.0
+	return int(nx), int(ny), int(nz), np.dtype(dtypes[int(mode)]).newbyteorder("<"), 1024 + int(extended), pixelSize
+
+def processSection(fileName, sec, kV, cs, minDefocus, maxDefocus):
+	nx, ny, nz, dtype, dataOffset, pixelSize = readHeader(fileName)
+	size = nx * ny * dtype.itemsize
+	with open(fileName, "rb") as f:								# short read of section instead of memory map that stays open while SerialEM appends
+		f.seek(dataOffset + sec * size)
+		data = f.read(size)
+	if len(data) < size:
+		raise ValueError("Section " + str(sec) + " of " + fileName + " is incomplete")
+	image = np.frombuffer(data, dtype=dtype).reshape((ny, nx))
+	defocus, resolution = fitCtf(image, pixelSize, kV, cs, minDefocus=minDefocus, maxDefocus=maxDefocus)
+	return fileName, sec, defocus, resolution
+
+def sectionCount(fileName):										# number of sections written so far (header is updated when SerialEM closes the file)
+	try:
+		header = readHeader(fileName)
+		return header[2] if header is not None else 0
+	except (OSError, ValueError):
+		return 0
+
+def sidecarName(fileName):
+	return os.path.splitext(fileName)[0] + "_ctf.txt"
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Background CTF estimation for PACEtomo tilt series.")
+	parser.add_argument("--files", nargs="+", required=True, help="tilt series files to watch")
+	parser.add_argument("--kV", type=float, default=300, help="acceleration voltage [kV]")
+	parser.add_argument("--cs", type=float, default=2.7, help="spherical aberration [mm]")
+	parser.add_argument("--minDefocus", type=float, default=0.5, help="minimum underfocus [microns] of fitting range")
+	parser.add_argument("--maxDefocus", type=float, default=10, help="maximum underfocus [microns] of fitting range")
+	parser.add_argument("--done", default="", help="worker stops after processing all sections when this file exists")
+	parser.add_argument("--timeout", type=float, default=1440, help="worker stops after this many minutes without new sections (if the done file is never written)")
+	parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="number of fitting processes")
+	args = parser.parse_args()
+
+	submitted = {fileName: set() for fileName in args.files}
+	for fileName in args.files:									# skip sections that were already processed (results can be written out of order)
+		if os.path.exists(sidecarName(fileName)):
+			with open(sidecarName(fileName)) as f:
+				submitted[fileName].update([int(line.split()[0]) for line in f.readlines() if line.strip() != "" and not line.startswith("#")])
+
+	lastNew = time.time()
+	pending = set()
+	with ProcessPoolExecutor(max_workers=args.processes) as pool:
+		while True:
+			finished = args.done != "" and os.path.exists(args.done)
+			for fileName in args.files:
+				if not os.path.exists(fileName):
+					continue
+				for sec in range(sectionCount(fileName)):
+					if sec not in submitted[fileName]:
+						pending.add(pool.submit(processSection, fileName, sec, args.kV, args.cs, args.minDefocus, args.maxDefocus))
+						submitted[fileName].add(sec)
+						lastNew = time.time()
+
+			if pending:
+				done, pending = wait(pending, timeout=2, return_when=FIRST_COMPLETED)
+				for future in done:
+					try:
+						fileName, sec, defocus, resolution = future.result()
+					except Exception as err:
+						print("WARNING: CTF fit failed: " + str(err), file=sys.stderr)
+						continue
+					with open(sidecarName(fileName), "a") as f:
+						if f.tell() == 0:
+							f.write("# sec defocus[microns] resolution[A]\n")
+						f.write(str(sec) + " " + str(round(defocus, 3)) + " " + str(round(resolution, 1)) + "\n")
+			elif finished or time.time() - lastNew > args.timeout * 60:
+				if not finished:
+					print("WARNING: No new sections were written for " + str(args.timeout) + " min. CTF estimation stopped.", file=sys.stderr)
+				break
+			else:
+				time.sleep(2)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_dashboard
+# Purpose:	Serves a live web page of a running PACEtomo session from its telemetry file.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This script is started by PACEtomo when dashboard = True (it only needs the Python standard library and PACEtomo_tgtsFile.py in workerDir).
+# The telemetry file of the run is tailed (only new complete lines are read) and the page is updated via server-sent events
+# with the changed targets only. The page shows per target progress, prediction error, alignment quality and aborted branches,
+# as well as time per operation, image rate, ETA and a warning when the recent image rate drops well below the session average.
+# Open http://localhost:8765 (or the port set by dashboardPort) in a browser. Set dashboardHost to 0.0.0.0 to allow remote access.
+# Manual use: python PACEtomo_dashboard.py --telemetry run01_telemetry.csv --tilts 0 -60 60 3 [--port 8765] [--closed run01_closed.txt --files ts1.mrc ts2.mrc]
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import PACEtomo_tgtsFile as tgtsFile							# shared reading of new lines (has to be in workerDir)
+
+abortReasons = ["", "finalTilt", "imageShiftLimit", "tooDark", "alignmentLost"]			# same order as abort column written by PACEtomo
+recentWindow = 15 * 60											# time window [s] for recent image rate
+slowFactor = 0.75											# recent rate below this fraction of session rate is reported as slowdown
+
+page = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>PACEtomo</title>
+<style>
+body {font-family: sans-serif; margin: 1em; background: #fafafa;}
+table {border-collapse: collapse;} td, th {padding: 2px 8px; border-bottom: 1px solid #ddd; text-align: right;}
+#summary span {margin-right: 2em;} .warn {color: #c00; font-weight: bold;} .aborted {color: #999;}
+.bar {display: inline-block; height: 10px; background: #48c;}
+</style></head>
+<body>
+<h2 id="title">PACEtomo</h2>
+<div id="summary"></div>
+<p id="slow" class="warn"></p>
+<table><thead><tr><th>Target</th><th>Images</th><th>Progress</th><th>Tilt (+/-)</th><th>Pred. error [nm]</th><th>Mean pred. error [nm]</th><th>Ali. quality</th><th>Time [s]</th><th>Status</th></tr></thead>
+<tbody id="targets"></tbody></table>
+<script>
+var targets = {};
+function fmt(value, digits) {return value === null ? "-" : value.toFixed(digits);}
+function showSummary(s) {
+	document.getElementById("title").textContent = "PACEtomo: " + s.run;
+	var eta = s.eta === null ? "?" : Math.round(s.eta / 60) + " min";
+	document.getElementById("summary").innerHTML = "<span>Images: " + s.images + " / " + (s.images + s.remaining) + "</span><span>ETA: " + eta + "</span>" +
+		"<span>Rate: " + fmt(s.rate, 2) + " img/min (recent: " + fmt(s.recentRate, 2) + ")</span>" +
+		"<span>Per image: prediction " + fmt(s.timePred * 1000, 1) + " ms | CTF " + fmt(s.timeCtf * 1000, 1) + " ms | total " + fmt(s.timeTotal, 2) + " s</span>" +
+		"<span>Aborted branches: " + s.aborted + "</span>";
+	document.getElementById("slow").textContent = s.slowdown ? "WARNING: Recent image rate is " + Math.round(100 * s.recentRate / s.rate) + " % of the session average!" : "";
+}
+function showTarget(t) {
+	var row = document.getElementById("tgt" + t.target);
+	if (row === null) {
+		row = document.createElement("tr");
+		row.id = "tgt" + t.target;
+		var body = document.getElementById("targets");
+		var next = Array.from(body.children).find(function(r) {return parseInt(r.id.slice(3)) > t.target;});
+		body.insertBefore(row, next || null);
+	}
+	var status = [1, 2].map(function(pn) {return t.reasons[pn] ? (pn == 1 ? "+" : "-") + t.reasons[pn] : "";}).filter(Boolean).join(" ");
+	if (t.closed) status = "finished " + status;
+	row.className = t.active ? "" : "aborted";
+	row.innerHTML = "<td>" + t.target + "</td><td>" + t.images + "</td><td><span class='bar' style='width:" + Math.round(t.progress * 100) + "px'></span></td>" +
+		"<td>" + fmt(t.tilts[1], 1) + " / " + fmt(t.tilts[2], 1) + "</td><td>" + fmt(t.predErr, 0) + "</td><td>" + fmt(t.meanPredErr, 0) + "</td>" +
+		"<td>" + fmt(t.aliScore, 2) + "</td><td>" + fmt(t.timeTotal, 1) + "</td><td>" + status + "</td>";
+}
+var source = new EventSource("/events");
+source.addEventListener("snapshot", function(e) {var data = JSON.parse(e.data); document.getElementById("targets").innerHTML = ""; data.targets.forEach(showTarget); showSummary(data.summary);});
+source.addEventListener("update", function(e) {var data = JSON.parse(e.data); data.targets.forEach(showTarget); showSummary(data.summary);});
+</script>
+</body></html>
+"""
+
+######## FUNCTIONS ########
+
+class Session:												# state of run built incrementally from new telemetry lines
+	def __init__(self, telemetryFile, closedFile, files, tilts):
+		self.telemetryFile = telemetryFile
+		self.closedFile = closedFile
+		self.files = {os.path.basename(fileName): i + 1 for i, fileName in enumerate(files)}		# tilt series file: target number
+		self.startTilt, self.minTilt, self.maxTilt, self.step = tilts
+		self.offset = 0
+		self.closedOffset = 0
+		self.columns = None
+		self.targets = {}
+		self.arrivals = []										# [time, number of images] of every batch of new lines
+		self.firstArrival = None
+		self.images = 0
+		self.sums = {"timePred": 0, "timeCtf": 0, "timeTotal": 0}
+		self.version = 0
+		self.updates = []										# [version, payload] of recent updates for connected clients
+		self.lock = threading.Condition()
+
+	def newTarget(self, target):
+		return {"target": target, "images": 0, "tilts": {1: None, 2: None}, "reasons": {1: "", 2: ""}, "predErr": None, "errSum": 0, "errCount": 0, "aliScore": None, "timeTotal": 0, "closed": False}
+
+	def readNew(self):										# read complete new lines of telemetry and closed files, returns changed targets
+		changed = set()
+		lines, self.offset = tgtsFile.readNewLines(self.telemetryFile, self.offset)
+		if len(lines) > 0:
+			if self.columns is None:
+				self.columns = [col.split(":")[0] for col in lines.pop(0).split(",")]
+			rows = [dict(zip(self.columns, line.split(","))) for line in lines if line.strip() != ""]
+			for row in rows:
+				changed.add(self.addRow(row))
+			if len(rows) > 0:
+				now = time.time()
+				self.firstArrival = now if self.firstArrival is None else self.firstArrival
+				self.arrivals.append([now, len(rows)])
+		if self.closedFile != "":
+			closed, self.closedOffset = tgtsFile.readClosed(self.closedFile, self.closedOffset)
+			for fileName in closed:
+				target = self.files.get(os.path.basename(fileName), None)
+				if target in self.targets.keys():
+					self.targets[target]["closed"] = True
+					changed.add(target)
+		return changed
+
+	def addRow(self, row):
+		target = int(row["target"])
+		pn = int(row["branch"])
+		if target not in self.targets.keys():
+			self.targets[target] = self.newTarget(target)
+		tgt = self.targets[target]
+		tgt["images"] += 1
+		tgt["tilts"][pn] = float(row["tilt"])
+		predicted = int(row["predicted"]) == 1 if "predicted" in row.keys() else float(row["tilt"]) != self.startTilt	# older telemetry files have no predicted column
+		if predicted:
+			tgt["predErr"] = abs(float(row["SSY"]) - float(row["SSYpred"])) * 1000
+			tgt["errSum"] += tgt["predErr"]
+			tgt["errCount"] += 1
+		if "aliScore" in row.keys():
+			tgt["aliScore"] = float(row["aliScore"])
+		if "abort" in row.keys() and int(row["abort"]) > 0:
+			tgt["reasons"][pn] = abortReasons[int(row["abort"])] if int(row["abort"]) < len(abortReasons) else "aborted"
+		tgt["timeTotal"] += float(row["timeTotal"])
+		self.images += 1
+		for key in self.sums.keys():
+			if key in row.keys():
+				self.sums[key] += float(row[key])
+		return target
+
+	def remaining(self, tgt):									# images still planned for target (branches end at final tilt or when aborted)
+		count = 0
+		for pn in (1, 2):
+			if tgt["reasons"][pn] != "":
+				continue
+			last = tgt["tilts"][pn]
+			if pn == 1:
+				count += round((self.maxTilt - (last if last is not None else self.startTilt - self.step)) / self.step)
+			else:
+				count += round(((last if last is not None else self.startTilt) - self.minTilt) / self.step)
+		return max(0, count)
+
+	def targetView(self, target):
+		tgt = self.targets[target]
+		remaining = self.remaining(tgt)
+		view = {key: tgt[key] for key in ["target", "images", "tilts", "reasons", "predErr", "aliScore", "timeTotal", "closed"]}
+		view["meanPredErr"] = tgt["errSum"] / tgt["errCount"] if tgt["errCount"] > 0 else None
+		view["progress"] = tgt["images"] / (tgt["images"] + remaining) if tgt["images"] + remaining > 0 else 1
+		view["active"] = remaining > 0
+		return view
+
+	def summary(self):
+		now = time.time()
+		remaining = sum([self.remaining(tgt) for tgt in self.targets.values()])
+		rate = recentRate = None
+		if self.firstArrival is not None and len(self.arrivals) > 1:
+			rate = (self.images - self.arrivals[0][1]) / max(1, self.arrivals[-1][0] - self.firstArrival) * 60
+			recent = [arrival for arrival in self.arrivals if arrival[0] > now - recentWindow]
+			if len(recent) > 1:
+				recentRate = sum([arrival[1] for arrival in recent[1:]]) / max(1, recent[-1][0] - recent[0][0]) * 60
+		speed = recentRate if recentRate is not None else rate
+		return {
+			"run": os.path.basename(self.telemetryFile).replace("_telemetry.csv", ""), "images": self.images, "remaining": remaining,
+			"rate": rate, "recentRate": recentRate, "eta": remaining / speed * 60 if speed else None,
+			"slowdown": rate is not None and recentRate is not None and recentRate < slowFactor * rate,
+			"aborted": sum([len([reason for reason in tgt["reasons"].values() if reason not in ["", "finalTilt"]]) for tgt in self.targets.values()]),
+			"timePred": self.sums["timePred"] / self.images if self.images > 0 else None,
+			"timeCtf": self.sums["timeCtf"] / self.images if self.images > 0 else None,
+			"timeTotal": self.sums["timeTotal"] / self.images if self.images > 0 else None,
+		}
+
+	def snapshot(self):
+		return {"targets": [self.targetView(target) for target in sorted(self.targets.keys())], "summary": self.summary()}
+
+	def poll(self):											# read new lines and notify clients with changed targets only
+		with self.lock:										# handler threads read state while holding the lock
+			changed = self.readNew()
+			if len(changed) == 0:
+				return
+			self.version += 1
+			self.updates.append([self.version, json.dumps({"targets": [self.targetView(target) for target in sorted(changed)], "summary": self.summary()})])
+			self.updates = self.updates[-100:]
+			self.lock.notify_all()
+
+class Handler(BaseHTTPRequestHandler):
+	def log_message(self, *args):									# no log line for every request
+		pass
+
+	def do_GET(self):
+		if self.path == "/events":
+			self.sendEvents()
+		elif self.path in ["/", "/index.html"]:
+			self.sendContent(page.encode(), "text/html; charset=utf-8")
+		elif self.path == "/state":
+			with session.lock:
+				self.sendContent(json.dumps(session.snapshot()).encode(), "application/json")
+		else:
+			self.send_error(404)
+
+	def sendContent(self, content, contentType):
+		self.send_response(200)
+		self.send_header("Content-Type", contentType)
+		self.send_header("Content-Length", str(len(content)))
+		self.end_headers()
+		self.wfile.write(content)
+
+	def sendEvents(self):										# server-sent events: snapshot on connect, then incremental updates
+		self.send_response(200)
+		self.send_header("Content-Type", "text/event-stream")
+		self.send_header("Cache-Control", "no-cache")
+		self.end_headers()
+		try:
+			with session.lock:
+				version = session.version
+				message = "event: snapshot\ndata: " + json.dumps(session.snapshot()) + "\n\n"
+			self.wfile.write(message.encode())
+			self.wfile.flush()
+			while True:
+				with session.lock:
+					session.lock.wait_for(lambda: session.version > version, timeout=15)
+					if len(session.updates) > 0 and session.updates[0][0] > version + 1:		# client missed updates
+						messages = ["event: snapshot\ndata: " + json.dumps(session.snapshot()) + "\n\n"]
+					else:
+						messages = ["event: update\ndata: " + payload + "\n\n" for v, payload in session.updates if v > version]
+					version = session.version
+				self.wfile.write(("".join(messages) if len(messages) > 0 else ": keep-alive\n\n").encode())
+				self.wfile.flush()
+		except (BrokenPipeError, ConnectionResetError):
+			pass
+
+######## END FUNCTIONS ########
+
+def main():
+	global session
+	parser = argparse.ArgumentParser(description="Live web dashboard of a PACEtomo session.")
+	parser.add_argument("--telemetry", required=True, help="telemetry file of run (written by PACEtomo)")
+	parser.add_argument("--closed", default="", help="file listing finished tilt series (written by PACEtomo)")
+	parser.add_argument("--files", nargs="*", default=[], help="tilt series files of all targets in order")
+	parser.add_argument("--tilts", nargs=4, type=float, default=[0, -60, 60, 3], help="start, min, max tilt angle and step [degrees]")
+	parser.add_argument("--host", default="localhost", help="address to listen on (0.0.0.0 for remote access)")
+	parser.add_argument("--port", type=int, default=8765, help="port to listen on")
+	parser.add_argument("--interval", type=float, default=2, help="interval [s] to check for new lines")
+	parser.add_argument("--done", default="", help="dashboard stops linger minutes after this file exists")
+	parser.add_argument("--linger", type=float, default=60, help="minutes to keep serving after the session finished")
+	parser.add_argument("--timeout", type=float, default=1440, help="dashboard stops after this many minutes")
+	args = parser.parse_args()
+
+	session = Session(args.telemetry, args.closed, args.files, args.tilts)
+	try:
+		server = ThreadingHTTPServer((args.host, args.port), Handler)
+	except OSError as err:
+		print("ERROR: Could not start dashboard on port " + str(args.port) + ": " + str(err), file=sys.stderr)
+		sys.exit(1)
+	server.daemon_threads = True
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	print("Dashboard running at http://" + args.host + ":" + str(args.port))
+	sys.stdout.flush()
+
+	startTime = time.time()
+	doneTime = None
+	while time.time() - startTime < args.timeout * 60:
+		session.poll()
+		if doneTime is None and args.done != "" and os.path.exists(args.done):
+			doneTime = time.time()
+		if doneTime is not None and time.time() - doneTime > args.linger * 60:
+			break
+		time.sleep(args.interval)
+	server.shutdown()
+
+if __name__ == "__main__":
+	main()
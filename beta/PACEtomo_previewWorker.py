@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_previewWorker
+# Purpose:	Reconstructs low resolution preview tomograms of finished tilt series while PACEtomo is collecting.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This script is started by PACEtomo when previewWorker = True (it needs numpy, scipy, mrcfile and pillow in the Python environment set as pythonExe and PACEtomo_tgtsFile.py in workerDir).
+# Every tilt series listed in the _closed.txt file of the run is binned (default: 20 A/px), coarsely aligned using the alignment
+# errors PACEtomo saved in the mdoc file (needs extendedMdoc) and reconstructed by weighted back-projection in a process pool.
+# Output per tilt series:
+#	<tsfile>_preview.mrc	preview tomogram
+#	<tsfile>_preview.jpg	average of central slab of preview tomogram
+# Manual use: python PACEtomo_previewWorker.py --matrix c2ss11 c2ss12 c2ss21 c2ss22 --files ts1.mrc ts2.mrc
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import mrcfile
+from scipy import ndimage
+from PIL import Image
+import PACEtomo_tgtsFile as tgtsFile							# shared reading of _closed.txt file (has to be in workerDir)
+from concurrent.futures import ProcessPoolExecutor
+
+######## FUNCTIONS ########
+
+def parseMdoc(mdocFile):										# read tilt angle and alignment error [microns] of every section from SerialEM mdoc file
+	sections = {}
+	sec = None
+	with open(mdocFile) as f:
+		for line in f.readlines():
+			col = line.strip().split(" = ")
+			if line.startswith("[ZValue"):
+				sec = int(line.strip("[] \n").split("=")[-1])
+				sections[sec] = {"angle": 0.0, "error": [0.0, 0.0]}
+			elif sec is not None and len(col) == 2:
+				if col[0] == "TiltAngle":
+					sections[sec]["angle"] = float(col[1])
+				elif col[0] == "AlignmentError":
+					sections[sec]["error"] = [float(val) for val in col[1].split()]
+	secs = sorted(sections.keys())
+	return np.array(secs, dtype=int), np.array([sections[sec]["angle"] for sec in secs]), np.array([sections[sec]["error"] for sec in secs])
+
+def binImage(image, binning):
+	rows = image.shape[0] // binning
+	cols = image.shape[1] // binning
+	return image[:rows * binning, :cols * binning].reshape(rows, binning, cols, binning).mean(axis=(1, 3))
+
+def prepareProjection(image, axis, shift, binning, size):						# bin, shift by alignment error and rotate tilt axis parallel to rows
+	image = binImage(np.asarray(image, dtype=np.float32), binning)
+	axisRC = np.array([axis[1], axis[0]])								# tilt axis direction in [row, col]
+	perpRC = np.array([axis[0], -axis[1]])
+	matrix = np.column_stack([axisRC, perpRC])
+	center = (np.array(image.shape) - 1) / 2
+	outCenter = (np.array([size, size]) - 1) / 2
+	offset = center + np.array([shift[1], shift[0]]) / binning - matrix @ outCenter
+	return ndimage.affine_transform(image, matrix, offset=offset, output_shape=(size, size), order=1, mode="constant", cval=np.mean(image))
+
+def rampFilter(projections):										# weighting of projections along X (perpendicular to tilt axis)
+	width = projections.shape[-1]
+	padded = 2 * width
+	freq = np.abs(np.fft.rfftfreq(padded))
+	spectrum = np.fft.rfft(projections - np.mean(projections, axis=-1, keepdims=True), n=padded, axis=-1) * freq
+	return np.fft.irfft(spectrum, n=padded, axis=-1)[..., :width]
+
+def backProject(projections, angles, thickness):							# projections: [tilt, y, x] => volume [z, y, x]
+	nTilts, ny, nx = projections.shape
+	x = np.arange(nx) - (nx - 1) / 2
+	z = np.arange(thickness) - (thickness - 1) / 2
+	volume = np.zeros((thickness, ny, nx), dtype=np.float32)
+	for proj, angle in zip(projections, np.radians(angles)):
+		t = x[np.newaxis, :] * np.cos(angle) + z[:, np.newaxis] * np.sin(angle) + (nx - 1) / 2
+		i0 = np.clip(np.floor(t).astype(int), 0, nx - 2)
+		w = np.clip(t - i0, 0, 1)
+		inside = (t >= 0) & (t <= nx - 1)
+		values = proj[:, i0] * (1 - w) + proj[:, i0 + 1] * w				# [y, z, x]
+		volume += np.where(inside, values, 0).transpose(1, 0, 2)
+	return volume / nTilts
+
+def reconstruct(fileName, c2ss, pixelTarget=20, thicknessNm=300):
+	stem = os.path.splitext(fileName)[0]
+	secs, angles, errors = parseMdoc(fileName + ".mdoc")
+	axis = np.linalg.inv(c2ss) @ np.array([1, 0])							# tilt axis (specimen X) in camera coords
+	axis /= np.linalg.norm(axis)
+	with mrcfile.mmap(fileName, mode="r", permissive=True) as mrc:
+		data = mrc.data if mrc.data.ndim == 3 else mrc.data[np.newaxis]
+		pixelSize = float(mrc.voxel_size.x) if mrc.voxel_size.x > 0 else 1.0
+		valid = secs < data.shape[0]
+		secs, angles, errors = secs[valid], angles[valid], errors[valid]
+		binning = max(1, int(round(pixelTarget / pixelSize)))
+		size = min(data.shape[1:]) // binning
+		# AlignmentError is the image shift applied by the alignment after the image was taken, i.e. the target appears displaced
+		# by this shift from the image center. Sampling at center + shift in prepareProjection moves it back to the center.
+		stackBinning = max(1, int(round(pixelSize / 10000 / np.sqrt(abs(np.linalg.det(c2ss)))))) if mrc.voxel_size.x > 0 else 1	# c2ss is given for unbinned camera pixels
+		shifts = (np.linalg.inv(c2ss * stackBinning) @ errors.T).T					# alignment errors in pixels of stack
+		projections = np.array([prepareProjection(data[sec], axis, shift, binning, size) for sec, shift in zip(secs, shifts)])
+
+	order = np.argsort(angles)
+	volume = backProject(rampFilter(projections[order]), angles[order], max(1, int(thicknessNm * 10 / (pixelSize * binning))))
+
+	with mrcfile.new(stem + "_preview.mrc", overwrite=True) as out:
+		out.set_data(volume.astype(np.float32))
+		out.voxel_size = pixelSize * binning
+
+	slab = volume[max(0, volume.shape[0] // 2 - 5):volume.shape[0] // 2 + 5].mean(axis=0)	# central slab of 10 slices
+	low, high = np.percentile(slab, (1, 99))
+	Image.fromarray((np.clip((slab - low) / max(high - low, 1e-6), 0, 1) * 255).astype(np.uint8)).save(stem + "_preview.jpg", quality=90)
+	return fileName, volume.shape
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Reconstruct preview tomograms of PACEtomo tilt series.")
+	parser.add_argument("--matrix", nargs=4, type=float, required=True, help="camera to specimen matrix [microns/unbinned pixel] (CameraToSpecimenMatrix of Record)")
+	parser.add_argument("--files", nargs="*", default=[], help="tilt series files to reconstruct")
+	parser.add_argument("--closed", default="", help="file listing finished tilt series (written by PACEtomo)")
+	parser.add_argument("--done", default="", help="worker stops after reconstructing all listed tilt series when this file exists")
+	parser.add_argument("--timeout", type=float, default=1440, help="worker stops after this many minutes without newly listed tilt series")
+	parser.add_argument("--pixel", type=float, default=20, help="pixel size [A] of preview tomogram")
+	parser.add_argument("--thickness", type=float, default=300, help="thickness [nm] of preview tomogram")
+	parser.add_argument("--processes", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="number of reconstruction processes")
+	args = parser.parse_args()
+	c2ss = np.array(args.matrix).reshape((2, 2))
+
+	queued = set()
+	offset = 0
+	lastNew = time.time()
+	with ProcessPoolExecutor(max_workers=args.processes) as pool:
+		futures = [pool.submit(reconstruct, fileName, c2ss, args.pixel, args.thickness) for fileName in args.files]
+		queued.update(args.files)
+		while args.closed != "":
+			finished = args.done != "" and os.path.exists(args.done)			# check before reading to not miss the last entries
+			newFiles, offset = tgtsFile.readClosed(args.closed, offset)
+			if len(newFiles) > 0:
+				lastNew = time.time()
+			for fileName in newFiles:
+				if fileName not in queued and os.path.exists(fileName):
+					futures.append(pool.submit(reconstruct, fileName, c2ss, args.pixel, args.thickness))
+					queued.add(fileName)
+			if finished or time.time() - lastNew > args.timeout * 60:
+				if not finished:
+					print("WARNING: No new tilt series were listed for " + str(args.timeout) + " min. Tilt series closed later will not be reconstructed.", file=sys.stderr)
+				break
+			time.sleep(5)
+
+		for future in futures:
+			try:
+				fileName, shape = future.result()
+				print("Reconstructed " + fileName + " (" + " x ".join([str(val) for val in shape[::-1]]) + ")")
+			except Exception as err:
+				print("WARNING: Reconstruction failed: " + str(err), file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_registry
+# Purpose:	SQLite registry of PACEtomo sessions, areas, targets, runs and tilt series for fast lookup of run files and analysis across sessions.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This module is imported by PACEtomo, selectTargets and targetsFromMontage when their registry setting is True. It only needs the
+# Python standard library and PACEtomo_tgtsFile.py. SerialEM has to be able to find both: copy them to the folder set by the
+# PythonModulePath property in your SerialEMproperties.txt.
+#
+# Tables:	sessions	data folders
+#		areas		tgts files (one per navigator item) and their number of targets
+#		targets		targets of each area
+#		runs		run files with PACEtomo version, settings hash, start, last update, status (running, completed, interrupted, indexed: found by scan without end of run) and number of images
+#		settings	all settings of a settings hash
+#		tiltSeries	images, tilt range, time, mean alignment error and abort reasons of each target of a run
+#
+# The selection scripts add areas when tgts files are written. PACEtomo adds a run at the start, adds all images of a tilt
+# at the end of the tilt and finishes the run at the end. Existing data can be indexed with the scan command.
+#
+# Manual use:	python PACEtomo_registry.py scan D:\data [more folders]
+#		python PACEtomo_registry.py find D:\data\X_tgts.txt
+#		python PACEtomo_registry.py runs [--name X_tgts] [--status completed] [--since 2026-01-01] [--limit 20]
+#		python PACEtomo_registry.py series D:\data\X_tgts_run01.txt
+#		python PACEtomo_registry.py aborts [--since 2026-01-01]
+#		python PACEtomo_registry.py throughput [--by month] [--since 2026-01-01]
+#		(all commands: --db path to use another registry file than the one in your home directory)
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+from datetime import datetime
+import PACEtomo_tgtsFile as tgtsFile
+
+registryFile = os.path.join(os.path.expanduser("~"), "PACEtomo_registry.sqlite")
+abortReasons = ["", "finalTilt", "imageShiftLimit", "tooDark", "alignmentLost"]			# same order as abort column written by PACEtomo
+tgtsPattern = re.compile(r"_tgts(_p\d+)?\.txt$")							# tgts files, but not run files or copies of them
+
+schema = """
+CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, directory TEXT UNIQUE NOT NULL, created TEXT);
+CREATE TABLE IF NOT EXISTS areas (id INTEGER PRIMARY KEY, session INTEGER NOT NULL REFERENCES sessions(id), tgtsFile TEXT UNIQUE NOT NULL, name TEXT, navID INTEGER, created TEXT, targets INTEGER);
+CREATE TABLE IF NOT EXISTS targets (area INTEGER NOT NULL REFERENCES areas(id), tgt INTEGER NOT NULL, tsfile TEXT, SSX REAL, SSY REAL, skip INTEGER, PRIMARY KEY (area, tgt));
+CREATE TABLE IF NOT EXISTS settings (hash TEXT PRIMARY KEY, settings TEXT);
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, area INTEGER NOT NULL REFERENCES areas(id), runFile TEXT UNIQUE NOT NULL, run INTEGER, version TEXT, settingsHash TEXT, recovery INTEGER, started TEXT, updated TEXT, finished TEXT, status TEXT, images INTEGER DEFAULT 0);
+CREATE TABLE IF NOT EXISTS tiltSeries (run INTEGER NOT NULL REFERENCES runs(id), tgt INTEGER NOT NULL, tsfile TEXT, images INTEGER, minTilt REAL, maxTilt REAL, seconds REAL, aliErrorSum REAL, posReason TEXT, negReason TEXT, PRIMARY KEY (run, tgt));
+CREATE INDEX IF NOT EXISTS areasSession ON areas(session);
+CREATE INDEX IF NOT EXISTS runsArea ON runs(area, run);
+CREATE INDEX IF NOT EXISTS runsStarted ON runs(started);
+"""
+
+######## FUNCTIONS ########
+
+def now():
+	return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def connect(dbFile=registryFile):									# open registry and create tables if necessary
+	db = sqlite3.connect(dbFile, timeout=10)
+	db.row_factory = sqlite3.Row
+	db.execute("PRAGMA journal_mode=WAL")								# queries from the command line do not block a running session
+	db.executescript(schema)
+	return db
+
+def addSession(db, directory):
+	directory = os.path.abspath(directory)
+	db.execute("INSERT OR IGNORE INTO sessions (directory, created) VALUES (?, ?)", (directory, now()))
+	return db.execute("SELECT id FROM sessions WHERE directory = ?", (directory,)).fetchone()["id"]
+
+def addArea(db, tgtsFileName, targets=None, navID=None, created=None):					# add or update area of tgts file including its targets, returns area id
+	tgtsFileName = os.path.abspath(tgtsFileName)
+	if targets is None:
+		targets = tgtsFile.readTargets(tgtsFileName, typed=True)[0]
+	with db:
+		session = addSession(db, os.path.dirname(tgtsFileName))
+		db.execute("INSERT INTO areas (session, tgtsFile, name, navID, created, targets) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(tgtsFile) DO UPDATE SET navID = coalesce(excluded.navID, navID), targets = excluded.targets",
+			(session, tgtsFileName, os.path.splitext(os.path.basename(tgtsFileName))[0], navID, created or now(), len(targets)))
+		area = db.execute("SELECT id FROM areas WHERE tgtsFile = ?", (tgtsFileName,)).fetchone()["id"]
+		db.execute("DELETE FROM targets WHERE area = ?", (area,))
+		db.executemany("INSERT INTO targets (area, tgt, tsfile, SSX, SSY, skip) VALUES (?, ?, ?, ?, ?, ?)",
+			[(area, i + 1, tgt.get("tsfile"), floatOrNone(tgt.get("SSX")), floatOrNone(tgt.get("SSY")), int(str(tgt.get("skip")) == "True")) for i, tgt in enumerate(targets)])
+	return area
+
+def addRun(db, tgtsFileName, runFileName, version="", settingsHash="", settings=None, recovery=False, navID=None, started=None, status="running"):	# add run of area, returns run id
+	row = db.execute("SELECT id FROM areas WHERE tgtsFile = ?", (os.path.abspath(tgtsFileName),)).fetchone()
+	area = row["id"] if row is not None else addArea(db, tgtsFileName, navID=navID)
+	with db:
+		if settings is not None:
+			db.execute("INSERT OR IGNORE INTO settings (hash, settings) VALUES (?, ?)", (settingsHash, json.dumps(settings, default=str)))
+		db.execute("""INSERT INTO runs (area, runFile, run, version, settingsHash, recovery, started, updated, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+			ON CONFLICT(runFile) DO UPDATE SET version = excluded.version, settingsHash = excluded.settingsHash, recovery = excluded.recovery, started = excluded.started, updated = excluded.updated, status = excluded.status""",
+			(area, os.path.abspath(runFileName), tgtsFile.runNumber(runFileName), version, settingsHash, int(recovery), started or now(), started or now(), status))
+		db.execute("UPDATE runs SET status = 'interrupted' WHERE area = ? AND status = 'running' AND runFile != ?", (area, os.path.abspath(runFileName)))	# new run of area means older runs were stopped
+		return db.execute("SELECT id FROM runs WHERE runFile = ?", (os.path.abspath(runFileName),)).fetchone()["id"]
+
+def addImages(db, run, images):										# add images [(tgt, tsfile, branch, tilt, seconds, aliError, reason)] to tilt series of run
+	with db:
+		db.executemany("""INSERT INTO tiltSeries (run, tgt, tsfile, images, minTilt, maxTilt, seconds, aliErrorSum, posReason, negReason) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+			ON CONFLICT(run, tgt) DO UPDATE SET images = images + 1, minTilt = min(minTilt, excluded.minTilt), maxTilt = max(maxTilt, excluded.maxTilt), seconds = seconds + excluded.seconds, aliErrorSum = aliErrorSum + excluded.aliErrorSum,
+			posReason = CASE WHEN excluded.posReason != '' THEN excluded.posReason ELSE posReason END, negReason = CASE WHEN excluded.negReason != '' THEN excluded.negReason ELSE negReason END""",
+			[(run, tgt, tsfile, tilt, tilt, seconds, aliError, reason if branch == 1 else "", reason if branch == 2 else "") for tgt, tsfile, branch, tilt, seconds, aliError, reason in images])
+		db.execute("UPDATE runs SET images = (SELECT coalesce(sum(images), 0) FROM tiltSeries WHERE run = ?), updated = ? WHERE id = ?", (run, now(), run))
+
+def finishRun(db, run, status="completed"):
+	with db:
+		db.execute("UPDATE runs SET finished = ?, updated = ?, status = ? WHERE id = ?", (now(), now(), status, run))
+
+def findRunFiles(db, tgtsFileName):									# existing run files of tgts file sorted by run number (indexed lookup)
+	rows = db.execute("SELECT runs.runFile FROM runs JOIN areas ON runs.area = areas.id WHERE areas.tgtsFile = ? ORDER BY runs.run", (os.path.abspath(tgtsFileName),)).fetchall()
+	return [row["runFile"] for row in rows if os.path.exists(row["runFile"])]
+
+def floatOrNone(value):
+	try:
+		return float(value)
+	except (TypeError, ValueError):
+		return None
+
+def readTelemetryImages(fileName, tsfiles):								# images of telemetry file in format of addImages
+	images = []
+	with open(fileName) as f:
+		names = [col.split(":")[0] for col in f.readline().strip().split(",")]
+		for line in f:
+			if line.strip() == "":
+				continue
+			row = dict(zip(names, line.strip().split(",")))
+			tgt = int(row["target"])
+			aliError = (float(row["aErrX"])**2 + float(row["aErrY"])**2)**0.5
+			reason = abortReasons[int(row["abort"])] if "abort" in row.keys() and int(row["abort"]) < len(abortReasons) else ""
+			images.append((tgt, tsfiles.get(tgt), int(row["branch"]), float(row["tilt"]), float(row["timeTotal"]), aliError, reason))
+	return images
+
+def settingsOfRun(runFileName):										# settings file written when run was started is named after the previous run file or the tgts file
+	previous = [fileName for fileName in tgtsFile.findRunFiles(os.path.dirname(runFileName), runFileName.rsplit("_run", 1)[0]) if tgtsFile.runNumber(fileName) < tgtsFile.runNumber(runFileName)]
+	stem = os.path.splitext(previous[-1] if len(previous) > 0 else runFileName.rsplit("_run", 1)[0] + ".txt")[0]
+	settings = {}
+	settingsHash = ""
+	if os.path.exists(stem + "_settings.txt"):
+		with open(stem + "_settings.txt") as f:
+			for line in f:
+				if line.startswith("# hash = "):
+					settingsHash = line.split("=", 1)[1].strip()
+				elif "=" in line and not line.startswith("#"):
+					key, value = line.split("=", 1)
+					settings[key.strip()] = value.strip()
+	return settingsHash, settings
+
+def scan(db, folder):											# index existing tgts, run and telemetry files in folder (recursively), returns numbers of areas and runs
+	areas = runs = 0
+	for root, dirs, files in os.walk(folder):
+		for name in sorted(files):
+			if not tgtsPattern.search(name):
+				continue
+			tgtsFileName = os.path.join(root, name)
+			try:
+				targets = tgtsFile.readTargets(tgtsFileName, typed=True)[0]
+			except Exception as err:
+				print("WARNING: Could not read " + tgtsFileName + " (" + str(err) + ")")
+				continue
+			addArea(db, tgtsFileName, targets, created=datetime.fromtimestamp(os.path.getmtime(tgtsFileName)).strftime("%Y-%m-%d %H:%M:%S"))
+			areas += 1
+			tsfiles = {i + 1: tgt.get("tsfile") for i, tgt in enumerate(targets)}
+			for runFileName in tgtsFile.findRunFiles(root, os.path.splitext(name)[0]):
+				settingsHash, settings = settingsOfRun(runFileName)
+				telemetryFileName = os.path.splitext(runFileName)[0] + "_telemetry.csv"
+				images = readTelemetryImages(telemetryFileName, tsfiles) if os.path.exists(telemetryFileName) else []
+				updated = os.path.getmtime(runFileName)
+				started = updated - sum([image[4] for image in images])				# run file is written after every image, start is estimated from image times
+				done = os.path.exists(os.path.splitext(runFileName)[0] + "_done")			# written by PACEtomo at the end of a run
+				run = addRun(db, tgtsFileName, runFileName, "", settingsHash, settings if settingsHash != "" else None, started=datetime.fromtimestamp(started).strftime("%Y-%m-%d %H:%M:%S"), status="completed" if done else "indexed")
+				with db:
+					db.execute("DELETE FROM tiltSeries WHERE run = ?", (run,))
+				if len(images) > 0:
+					addImages(db, run, images)
+				with db:
+					db.execute("UPDATE runs SET updated = ?, finished = ? WHERE id = ?", (datetime.fromtimestamp(updated).strftime("%Y-%m-%d %H:%M:%S"), datetime.fromtimestamp(updated).strftime("%Y-%m-%d %H:%M:%S") if done else None, run))
+				runs += 1
+	return areas, runs
+
+def printTable(rows, columns):
+	rows = [[("" if row[col] is None else str(round(row[col], 2)) if isinstance(row[col], float) else str(row[col])) for col in columns] for row in rows]
+	widths = [max([len(col)] + [len(row[i]) for row in rows]) for i, col in enumerate(columns)]
+	print("  ".join([col.ljust(widths[i]) for i, col in enumerate(columns)]))
+	for row in rows:
+		print("  ".join([val.ljust(widths[i]) for i, val in enumerate(row)]))
+	print(str(len(rows)) + " rows")
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Query and update the PACEtomo registry.")
+	parser.add_argument("--db", default=registryFile, help="registry file")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	scanParser = subparsers.add_parser("scan", help="index existing tgts, run and telemetry files")
+	scanParser.add_argument("folders", nargs="+", help="folders to search recursively")
+	findParser = subparsers.add_parser("find", help="list run files of tgts file")
+	findParser.add_argument("tgts", help="tgts file")
+	runsParser = subparsers.add_parser("runs", help="list runs")
+	runsParser.add_argument("--name", default="", help="only areas with tgts file name containing this text")
+	runsParser.add_argument("--status", default="", help="only runs with this status (running, completed, interrupted, indexed)")
+	runsParser.add_argument("--since", default="", help="only runs started after this date (YYYY-MM-DD)")
+	runsParser.add_argument("--limit", type=int, default=50, help="maximum number of runs (latest first)")
+	seriesParser = subparsers.add_parser("series", help="list tilt series of run")
+	seriesParser.add_argument("run", help="run file")
+	abortsParser = subparsers.add_parser("aborts", help="count reasons for aborted branches")
+	abortsParser.add_argument("--since", default="", help="only runs started after this date (YYYY-MM-DD)")
+	throughputParser = subparsers.add_parser("throughput", help="images and tilt series per day or month")
+	throughputParser.add_argument("--by", choices=["day", "month"], default="day", help="period")
+	throughputParser.add_argument("--since", default="", help="only runs started after this date (YYYY-MM-DD)")
+	args = parser.parse_args()
+
+	db = connect(args.db)
+	if args.command == "scan":
+		for folder in args.folders:
+			areas, runs = scan(db, folder)
+			print("Indexed " + str(areas) + " areas and " + str(runs) + " runs in " + folder)
+	elif args.command == "find":
+		runFiles = findRunFiles(db, args.tgts)
+		if len(runFiles) == 0:
+			print("No run files of " + args.tgts + " in registry.")
+			sys.exit(1)
+		print("\n".join(runFiles))
+	elif args.command == "runs":
+		rows = db.execute("""SELECT areas.name, runs.run, runs.started, runs.updated, runs.status, runs.images, runs.settingsHash, runs.runFile FROM runs JOIN areas ON runs.area = areas.id
+			WHERE areas.name LIKE ? AND (? = '' OR runs.status = ?) AND runs.started >= ? ORDER BY runs.started DESC LIMIT ?""", ("%" + args.name + "%", args.status, args.status, args.since, args.limit)).fetchall()
+		printTable(rows, ["name", "run", "started", "updated", "status", "images", "settingsHash", "runFile"])
+	elif args.command == "series":
+		rows = db.execute("""SELECT tiltSeries.tgt, tiltSeries.tsfile, tiltSeries.images, tiltSeries.minTilt, tiltSeries.maxTilt, tiltSeries.seconds / tiltSeries.images AS secPerImage, tiltSeries.aliErrorSum / tiltSeries.images * 1000 AS aliErrorNm, tiltSeries.posReason, tiltSeries.negReason
+			FROM tiltSeries JOIN runs ON tiltSeries.run = runs.id WHERE runs.runFile = ? ORDER BY tiltSeries.tgt""", (os.path.abspath(args.run),)).fetchall()
+		printTable(rows, ["tgt", "tsfile", "images", "minTilt", "maxTilt", "secPerImage", "aliErrorNm", "posReason", "negReason"])
+	elif args.command == "aborts":
+		rows = db.execute("""SELECT reason, count(*) AS branches FROM (SELECT posReason AS reason, run FROM tiltSeries UNION ALL SELECT negReason AS reason, run FROM tiltSeries) AS branches
+			JOIN runs ON branches.run = runs.id WHERE reason != '' AND reason IS NOT NULL AND runs.started >= ? GROUP BY reason ORDER BY branches DESC""", (args.since,)).fetchall()
+		printTable(rows, ["reason", "branches"])
+	else:
+		period = "substr(runs.started, 1, 10)" if args.by == "day" else "substr(runs.started, 1, 7)"
+		rows = db.execute("SELECT " + period + """ AS period, count(DISTINCT runs.id) AS runs, count(tiltSeries.tgt) AS tiltSeries, coalesce(sum(tiltSeries.images), 0) AS images, coalesce(sum(tiltSeries.seconds), 0) / 3600.0 AS hours
+			FROM runs LEFT JOIN tiltSeries ON tiltSeries.run = runs.id WHERE runs.started >= ? GROUP BY period ORDER BY period""", (args.since,)).fetchall()
+		rows = [dict(row, imagesPerHour=row["images"] / row["hours"] if row["hours"] > 0 else None) for row in rows]
+		printTable(rows, ["period", "runs", "tiltSeries", "images", "hours", "imagesPerHour"])
+
+if __name__ == "__main__":
+	main()
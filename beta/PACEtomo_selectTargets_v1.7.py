@@ -6,7 +6,8 @@
 # Author:	Fabian Eisenstein
 # Created:	2021/04/19
 # Revision:	v1.7
-# Last Change:	2023/11/01: added more checks to realignTrack, adjusted SPACEscore display, disabled some buttons in dummy mode
+# Last Change:	2026/10/19: added dose map, tgtsFile module, buffers module, registry
+#		2023/11/01: added more checks to realignTrack, adjusted SPACEscore display, disabled some buttons in dummy mode
 # ===================================================================
 
 ############ SETTINGS ############ 
@@ -23,12 +24,18 @@ drawBeam 	= True		# draws navigator item representing beam diameter
 beamDiameter 	= 0 		# beam diameter [microns] (if 0, ReportIlluminatedArea will be used, which is only available on some Thermo Scientific microscopes)
 maxTilt 	= 60		# tilt angle [degrees] to calculate stretching of beam perpendicular to tilt axis
 
+doseRecord	= 3.0		# dose map: dose [e/A^2] per Record image
+dosePreview	= 3.0		# dose map: dose [e/A^2] of Preview image taken at start tilt for each target (previewAli)
+doseTrack	= 0		# dose map: additional dose [e/A^2] per tilt on tracking target (e.g. addAF, trackTwice)
+doseZLP		= 0		# dose map: dose [e/A^2] per tilt for ZLP refinement next to target pattern (slitInterval)
+
 # Advanced settings
 sampleName	= ""		# optional prefix for all files created
 useSearch 	= False		# use Search mode instead of View mode to find targets by dragging
 vecA		= (0, 0)	# vectors for grid pattern [microns specimen shift] are determined automatically...
 vecB		= (0, 0)	# ...only change if you want to setup pattern without alignToP reference
 patternRot	= 0 		# rotation of pattern grid relative to tilt axis (used for filling a polygon with points)
+registry	= False		# adds tgts files to the SQLite registry in your home directory (PACEtomo_registry.py, has to be in folder set by PythonModulePath property)
 
 ########## END SETTINGS ########## 
 
@@ -49,6 +56,20 @@ import matplotlib.path
 from matplotlib.patches import Circle, Ellipse, Rectangle
 from matplotlib.backend_bases import MouseButton
 from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg, NavigationToolbar2Tk)
+try:
+	import PACEtomo_tgtsFile as tgtsFile								# shared tgts file reader/writer (has to be in folder set by PythonModulePath property)
+except ImportError:
+	sem.OKBox("PACEtomo_tgtsFile.py could not be imported! Please copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.")
+	sem.Exit()
+try:
+	import PACEtomo_buffers as buffers								# read-only views of buffer images (has to be in folder set by PythonModulePath property)
+except ImportError:
+	sem.OKBox("PACEtomo_buffers.py could not be imported! Please copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.")
+	sem.Exit()
+try:
+	import PACEtomo_registry as runRegistry							# optional SQLite registry of areas and runs (has to be in folder set by PythonModulePath property)
+except ImportError:
+	runRegistry = None
 
 versionCheck = sem.IsVersionAtLeast("40100", "20230619")
 if not versionCheck and sem.IsVariableDefined("warningVersion") == 0:
@@ -61,40 +82,7 @@ if not versionCheck and sem.IsVariableDefined("warningVersion") == 0:
 ########### FUNCTIONS ###########
 
 def parseTargets(targetFile):
-	with open(targetFile) as f:
-		content = f.readlines()
-	targets = []
-	geoPoints = []
-	savedRun = []
-	branch = None
-	resume = {"sec": 0, "pos": 0}
-	settings = {}
-	for line in content:
-		col = line.strip(os.linesep).split(" ")
-		if col[0] == "": continue
-		if line.startswith("_set") and len(col) == 4:
-			settings[col[1]] = col[3]
-		elif line.startswith("_spos"):
-			resume["sec"] = int(col[2].split(",")[0])
-			resume["pos"] = int(col[2].split(",")[1])
-		elif line.startswith("_tgt"):
-			targets.append({})
-			branch = None
-		elif line.startswith("_pbr"):
-			savedRun.append([{},{}])
-			branch = 0
-		elif line.startswith("_nbr"):
-			branch = 1
-		elif line.startswith("_geo"):
-			geoPoints.append({})
-			branch = "geo"
-		else:
-			if branch is None:
-				targets[-1][col[0]] = col[2]
-			elif branch == "geo":
-				geoPoints[-1][col[0]] = float(col[2])
-			else:
-				savedRun[-1][branch][col[0]] = col[2]
+	targets, savedRun, resume, settings, geoPoints = tgtsFile.readTargets(targetFile)
 	for i in range(len(targets)):
 		if "tgtfile" not in targets[i].keys(): targets[i]["tgtfile"] = None
 		if "tsfile" not in targets[i].keys() or sem.DoesFileExist(targets[i]["tsfile"]) == 0: targets[i]["tsfile"] = None
@@ -109,39 +97,9 @@ def parseTargets(targetFile):
 		else:
 			targets[i]["SPACEscore"] = None
 
-	if savedRun == []: savedRun = False
 	sem.Echo("NOTE: Found " + str(len(targets)) + " targets in " + os.path.basename(targetFile) + ".")
 	return targets, savedRun, resume, settings, geoPoints
 
-def writeTargets(targetFile, targets, geoPoints=[], savedRun=False, resume={"sec": 0, "pos": 0}, settings={}):
-	output = ""
-	if settings != {}:
-		for key, val in settings.items():
-			if val != "":
-				output += "_set " + key + " = " + str(val) + "\n"
-		output += "\n"
-	if resume["sec"] > 0 or resume["pos"] > 0:
-		output += "_spos = " + str(resume["sec"]) + "," + str(resume["pos"]) + "\n" * 2
-	for pos in range(len(targets)):
-		output += "_tgt = " + str(pos + 1).zfill(3) + "\n"
-		for key in targets[pos].keys():
-			output += key + " = " + str(targets[pos][key]) + "\n"
-		if savedRun:
-			output += "_pbr" + "\n"
-			for key in savedRun[pos][0].keys():
-				output += key + " = " + str(savedRun[pos][0][key]) + "\n"
-			output += "_nbr" + "\n"
-			for key in savedRun[pos][1].keys():
-				output += key + " = " + str(savedRun[pos][1][key]) + "\n"		
-		output += "\n"
-	for pos in range(len(geoPoints)):
-		output += "_geo = " + str(pos + 1) + "\n"
-		for key in geoPoints[pos].keys():
-			output += key + " = " + str(geoPoints[pos][key]) + "\n"
-		output += "\n"
-	with open(targetFile, "w") as f:
-		f.write(output)
-
 def saveNewTarget(targetFile, targetNo, target):
 	if targetPattern and usePolygon != 1:
 		if targetNo == 1:
@@ -161,17 +119,26 @@ def saveNewTarget(targetFile, targetNo, target):
 	sem.ChangeItemLabel(mapIndex, str(targetNo).zfill(3))
 
 	# write target file
-	output = "_tgt = " + str(targetNo).zfill(3) + "\n"
-	if not targetPattern:
-		output += "tgtfile = " + userName + "_tgt_" + str(targetNo).zfill(3) + ".mrc" + "\n"
-	output += "tsfile = " + userName + "_ts_" + str(targetNo).zfill(3) + ".mrc" + "\n"
-	for key in target.keys():
-		output += key + " = " + str(target[key]) + "\n"
-	output += "skip = False" + 2 * "\n"
-	with open(targetFile, "a") as f:
-		f.write(output)
+	entry = {} if targetPattern else {"tgtfile": userName + "_tgt_" + str(targetNo).zfill(3) + ".mrc"}
+	entry["tsfile"] = userName + "_ts_" + str(targetNo).zfill(3) + ".mrc"
+	entry.update(target)
+	entry["skip"] = False
+	tgtsFile.appendTarget(targetFile, targetNo, entry)
 	sem.Echo("Target " + str(targetNo).zfill(3) + " (" + userName + "_tgt_" + str(targetNo).zfill(3) + ".mrc) with image shifts " + str(round(target["SSX"], 3)) + ", " + str(round(target["SSY"], 3)) + " was added.")
 
+def registerArea(targetFile):										# add tgts file and its targets to registry (run files are registered by PACEtomo)
+	if not registry or not os.path.exists(targetFile) or tgtsFile.runNumber(targetFile) is not None:
+		return
+	if runRegistry is None:
+		sem.Echo("WARNING: PACEtomo_registry.py could not be imported. Targets were not registered.")
+		return
+	try:
+		db = runRegistry.connect()
+		runRegistry.addArea(db, targetFile)
+		db.close()
+	except Exception as err:
+		sem.Echo("WARNING: Registry could not be updated (" + str(err) + ").")
+
 def parseNav(navFile):
 	with open(navFile) as f:
 		navContent = f.readlines()
@@ -356,6 +323,32 @@ def autoXcorr(image):
 	return corr
 ##########
 
+def beamKernel(radius, tilts, pixelSize):								# sum of beam footprints stretched perpendicular to tilt axis (Y) for all tilt angles
+	cosines = np.cos(np.radians(np.atleast_1d(tilts)))
+	halfX = int(np.ceil(radius / pixelSize))
+	halfY = int(np.ceil(radius / np.min(cosines) / pixelSize))
+	x = np.arange(-halfX, halfX + 1) * pixelSize
+	y = np.arange(-halfY, halfY + 1) * pixelSize
+	inside = (x[np.newaxis, np.newaxis, :] / radius)**2 + (y[np.newaxis, :, np.newaxis] * cosines[:, np.newaxis, np.newaxis] / radius)**2 <= 1
+	return np.sum(inside, axis=0, dtype=float)
+
+def calcDoseMap(exposures, radius, startTilt, tilts, maxPixels=2048):					# exposures: array of [SSX, SSY, dose per tilt, dose at start tilt only]
+	margin = radius / np.min(np.cos(np.radians(tilts))) + radius
+	extent = [np.min(exposures[:, 0]) - margin, np.max(exposures[:, 0]) + margin, np.min(exposures[:, 1]) - margin, np.max(exposures[:, 1]) + margin]
+	pixelSize = max(radius / 25, (extent[1] - extent[0]) / maxPixels, (extent[3] - extent[2]) / maxPixels)
+	shape = (int(np.ceil((extent[3] - extent[2]) / pixelSize)) + 1, int(np.ceil((extent[1] - extent[0]) / pixelSize)) + 1)
+	ix = np.round((exposures[:, 0] - extent[0]) / pixelSize).astype(int)
+	iy = np.round((exposures[:, 1] - extent[2]) / pixelSize).astype(int)
+
+	doseMap = np.zeros(shape)
+	for column, kernel in ((2, beamKernel(radius, tilts, pixelSize)), (3, beamKernel(radius, startTilt, pixelSize))):
+		if np.any(exposures[:, column] > 0):
+			stamps = np.zeros(shape)
+			np.add.at(stamps, (iy, ix), exposures[:, column])				# stamp all exposures on grid and spread by beam footprint
+			doseMap += fftconvolve(stamps, kernel, mode="same")
+	doseMap[doseMap < 1e-6] = 0									# remove fft noise
+	return doseMap, extent, pixelSize
+
 def vecByXcorr(diameter):
 	# devSettings
 	updatePlot 	= False		# show plot after finding each peak
@@ -377,15 +370,9 @@ def vecByXcorr(diameter):
 		buffer = "A"
 		imgProp = sem.ImageProperties(buffer)
 		pixSize = imgProp[4]
-	x = imgProp[0]
-	y = imgProp[1]
 
 	searchRadius = int(diameter * 1000 / pixSize / 2 * searchRangeFac)
-	image = np.asarray(sem.bufferImage(buffer))
-
-	imgStartX = int(max(0, x / 2 - cropRangeFac * searchRadius))
-	imgStartY = int(max(0, y / 2 - cropRangeFac * searchRadius))
-	image = image[imgStartX:(imgStartX + 2 * cropRangeFac * searchRadius), imgStartY:(imgStartY + 2 * cropRangeFac * searchRadius)] 
+	image, orient = buffers.view(buffer, crop=buffers.centerCrop(buffer, [2 * cropRangeFac * searchRadius] * 2))	# read-only view of image center
 
 	correlation = autoXcorr(image)
 
@@ -399,7 +386,7 @@ def vecByXcorr(diameter):
 			imgplot = plt.imshow(correlation)
 			plt.show()
 
-	peaks = np.array(peaks) + np.array([imgStartX, imgStartY])
+	peaks = buffers.toBuffer(peaks, orient).astype(int)
 	success = False
 
 	ptID0 = int(sem.AddImagePosAsNavPoint(buffer, peaks[0][1], peaks[0][0], 0))
@@ -546,6 +533,12 @@ def gui(targetFile):
 			if not swapXY:
 				plt.gca().invert_xaxis()
 				plt.gca().invert_yaxis()
+		if showDose:
+			doseMap, doseExtent, preDose = calcTargetDose()
+			if swapXY:
+				doseImage = plt.imshow(doseMap.T, cmap="inferno", alpha=0.5, origin="lower", extent=[doseExtent[2], doseExtent[3], doseExtent[0], doseExtent[1]])
+			else:
+				doseImage = plt.imshow(doseMap, cmap="inferno", alpha=0.5, origin="lower", extent=doseExtent)
 		if invX:
 			plt.gca().invert_xaxis()
 		if invY:
@@ -587,6 +580,11 @@ def gui(targetFile):
 
 		for i in range(len(targets)):									# add target numbers to plot
 			plt.annotate(str(i + 1).zfill(3), (xval[i], yval[i]), ha="center", va="center")		
+			if showDose and i in preDose.keys():
+				plt.annotate("+" + str(round(preDose[i], 1)), (xval[i], yval[i]), xytext=(0, -8), textcoords="offset points", ha="center", va="top", fontsize=8, color="#c92b27")
+
+		if showDose:
+			plt.colorbar(doseImage, cax=plt.gca().inset_axes((0.9, 0.25, 0.01, 0.5)), label="dose [e/A^2]")
 
 		if showScore:
 			plt.colorbar(cax=plt.gca().inset_axes((0.95, 0.25, 0.01, 0.5)))
@@ -596,6 +594,48 @@ def gui(targetFile):
 		if loadedMap is not None:
 			plt.text(0.01, 0.01, "NOTE: Targets might appear slightly off due to montage stitching.", ha="left", va="bottom", transform=plt.gca().transAxes, bbox=dict(facecolor="#ffdddd", edgecolor="none"))
 
+	def calcTargetDose():											# calculate dose map of all planned exposures and additional dose on each target from other exposures
+		tiltStart = settings["startTilt"] if "startTilt" in settings.keys() and settings["startTilt"] != "" else 0
+		tiltMin = settings["minTilt"] if "minTilt" in settings.keys() and settings["minTilt"] != "" else -maxTilt
+		tiltMax = settings["maxTilt"] if "maxTilt" in settings.keys() and settings["maxTilt"] != "" else maxTilt
+		tiltStep = settings["step"] if "step" in settings.keys() and settings["step"] != "" else 3
+		tilts = np.concatenate([np.arange(float(tiltStart), float(tiltMax) + 0.01, float(tiltStep)), np.arange(float(tiltStart) - float(tiltStep), float(tiltMin) - 0.01, -float(tiltStep))])
+
+		exposures = []
+		tgtIndex = []
+		for t, target in enumerate(targets):
+			if t == 0 or not target["skip"]:							# tracking target is never skipped
+				exposures.append([float(target["SSX"]), float(target["SSY"]), doseRecord + (doseTrack if t == 0 else 0), dosePreview])
+				tgtIndex.append(t)
+		if doseZLP > 0 and "size" in settings.keys():						# ZLP refinement position outside of target pattern (see checkSlit in PACEtomo)
+			shift = np.array([float(settings["vecB0"]), float(settings["vecB1"])]) * (float(settings["size"]) + 1)
+			exposures.append([float(targets[0]["SSX"]) + shift[0], float(targets[0]["SSY"]) + shift[1], doseZLP, 0])
+		exposures = np.array(exposures)
+
+		doseMap, extent, pixelSize = calcDoseMap(exposures, beamR, float(tiltStart), tilts)
+		halfX = max(0, int(recDims[1] / 2 / pixelSize))							# record area in specimen coords
+		halfY = max(0, int(recDims[0] / 2 / pixelSize))
+		preDose = {}
+		for i, t in enumerate(tgtIndex):
+			ix = int(round((exposures[i, 0] - extent[0]) / pixelSize))
+			iy = int(round((exposures[i, 1] - extent[2]) / pixelSize))
+			area = doseMap[max(0, iy - halfY):iy + halfY + 1, max(0, ix - halfX):ix + halfX + 1]
+			preDose[t] = max(0, np.max(area) - len(tilts) * exposures[i, 2] - exposures[i, 3])	# subtract own dose
+		return doseMap, extent, preDose
+
+	def toggleDose():
+		nonlocal showDose
+		showDose = not showDose
+		plt.clf()
+		plotTargets()
+		fig.canvas.draw()
+		if showDose:
+			doseMap, extent, preDose = calcTargetDose()
+			sem.Echo("Additional dose [e/A^2] on target from other exposures:")
+			for t in preDose.keys():
+				sem.Echo(str(t + 1).zfill(3) + ": " + str(round(preDose[t], 1)))
+			sem.Echo("Max: " + str(round(max(preDose.values()), 1)) + " e/A^2 (max total dose: " + str(round(np.max(doseMap), 1)) + " e/A^2)")
+
 	def realignTrack(rough=False, wiggle=0.5):
 		global stageX, stageY, stageZ, SSX0, SSY0, ISX0, ISY0
 		stageX, stageY, stageZ = sem.ReportStageXYZ()
@@ -835,9 +875,8 @@ def gui(targetFile):
 			imgProp = sem.ImageProperties(buffer)							# get map dimensions and pixel size
 			mapWidth, mapHeight = int(imgProp[0]), int(imgProp[1])
 			mapPixelSize = float(imgProp[4]) / 1000 #micron
-			loadedMap = np.flip(np.asarray(sem.bufferImage(buffer)), axis=0)			# flip y-axis of map
-			loadedMap = loadedMap[0:mapHeight - mapHeight % 8, 0:mapWidth - mapWidth % 8]		# make divisible by 8
-			loadedMap = loadedMap.reshape(mapHeight // 8, 8, mapWidth // 8, 8).sum(3).sum(1)	# fast binning by 8
+			loadedMap, _ = buffers.view(buffer, flipY=True)						# flip y-axis of map (view without copy)
+			loadedMap = buffers.binImage(loadedMap, 8)						# fast binning by 8 (only binned map is allocated)
 			loadedMap = exposure.rescale_intensity(loadedMap, out_range=(0, 1))			# recover intensity from binning
 			loadedMap = transform.rotate(loadedMap, -taRot, cval=1)					# rotate by tilt axis rotation
 			# calculate scaling for plot using stage coords of montage and target 1 to set (0, 0)
@@ -953,7 +992,8 @@ def gui(targetFile):
 					ptIndex = int(sem.AddStagePosAsNavPoint(targetsTemp[0]["stageX"] + stageShift[0], targetsTemp[0]["stageY"] + stageShift[1], item[3], groupIndex))
 					#ptIndex = int(sem.AddStagePosAsNavPoint(targetsTemp[0]["stageX"] + ss2sMatrix[0] * targetsTemp[i]["SSX"], targetsTemp[0]["stageY"] + ss2sMatrix[3] * targetsTemp[i]["SSY"], item[3], groupIndex))
 					sem.ChangeItemLabel(ptIndex, str(i + 1).zfill(3))
-			writeTargets(targetFileCopy, targetsTemp, geoPoints, settings=settings)				# write new tgts file for each stage position
+			tgtsFile.writeTargets(targetFileCopy, targetsTemp, geoPoints, settings=settings, version=tgtsFile.detectVersion(targetFile))	# write new tgts file for each stage position
+			registerArea(targetFileCopy)
 		tk.messagebox.showinfo(title="Target file copied", message="The targets file was copied to " + str(copied) + " navigator points!")
 		sem.Echo("NOTE: Copied tgts file to " + str(copied) + " navigator points!")
 
@@ -972,7 +1012,7 @@ def gui(targetFile):
 					targetsTemp[i]["tsfile"] = userName + "_ts_" + str(i + 1).zfill(3) + ".mrc"	# if not, renumber (there should not be a mixed case)
 					targetsTemp[i].pop("tgtfile")						# don't save tgtfile to tgts file if False
 		os.replace(targetFile, targetFile + "~")							# make backup
-		writeTargets(targetFile, targetsTemp, geoPoints, savedRun, resume, settings)
+		tgtsFile.writeTargets(targetFile, targetsTemp, geoPoints, savedRun, resume, settings, version=tgtsFile.detectVersion(targetFile + "~"))	# keep format of tgts file
 		sem.Echo("NOTE: Changes to targets file were saved!")
 
 	def resetOrder():											# restore targets array as read from file
@@ -1131,6 +1171,7 @@ def gui(targetFile):
 				sem.ChangeItemDraw(polyID, 0)
 
 	showScore = False
+	showDose = False
 	s2cMatrix = sem.SpecimenToCameraMatrix(0)								# figure out axis of plot to match SerialEM view
 	if(abs(s2cMatrix[0]) > abs(s2cMatrix[1])):
 		swapXY = False
@@ -1325,9 +1366,13 @@ def gui(targetFile):
 	CreateToolTip(btnInvertX, "Inverts X axis of target plot.")
 
 	btnInvertY = tk.Button(top, text="Invert Y", image=pixel, compound="center", height=btnHeight, command=invertY)
-	btnInvertY.grid(column=4, columnspan=4, row=8, sticky=tk.W, pady=5, padx=5)
+	btnInvertY.grid(column=4, row=8, sticky=tk.W, pady=5, padx=5)
 	CreateToolTip(btnInvertY, "Inverts Y axis of target plot.")
 
+	btnDoseMap = tk.Button(top, text="Dose map", image=pixel, compound="center", height=btnHeight, command=toggleDose)
+	btnDoseMap.grid(column=5, columnspan=3, row=8, sticky=tk.W, pady=5, padx=5)
+	CreateToolTip(btnDoseMap, "\n".join(["Toggles display of dose map of all planned exposures (Record, Preview, tracking and ZLP).", "Numbers below targets give additional dose from overlapping beams of other targets."]))
+
 	checkForMap()
 
 	def closeGUI():
@@ -1373,7 +1418,7 @@ if fileStem != "":
 	userName = fileStem.split("_tgts")[0]
 	tf = sorted(glob.glob(os.path.join(curDir, userName + "_tgts.txt")))					# find original tgts file
 	tfp = sorted(glob.glob(os.path.join(curDir, userName + "_tgts_p??.txt")))				# find tgts files copied to other positions
-	tfr = sorted(glob.glob(os.path.join(curDir, fileStem + "_run??.txt")))					# find run files of current nav item but not other copied tgts file
+	tfr = tgtsFile.findRunFiles(curDir, fileStem)								# find run files of current nav item but not other copied tgts file
 	tf.extend(tfr)												# only add run files to list of considered files
 else:
 	tf = []
@@ -1629,6 +1674,7 @@ if len(beamPolygons) > 0:
 	for polyID in beamPolygons:											# needs to be reversed to keep IDs consistent during deletion
 		sem.DeleteNavigatorItem(polyID)
 
+registerArea(tgtsFilePath)
 sem.Echo("Target selection completed! " + str(targetNo) + " targets were selected.")
 if guidance: 
 	sem.OKBox("Target selection completed! " + str(targetNo) + " targets were selected.")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_sortWorker
+# Purpose:	Sorts finished tilt series by tilt angle and writes IMOD tilt angle and dose files while PACEtomo is collecting.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This script is started by PACEtomo when sortWorker = True (it needs numpy and mrcfile in the Python environment set as pythonExe and PACEtomo_tgtsFile.py in workerDir).
+# PACEtomo lists every tilt series that will not receive any more images in the _closed.txt file of the run. For every listed
+# tilt series, the section to tilt angle index is read from its mdoc file and the following files are written:
+#	<tsfile>_sorted.mrc	tilt series sorted by tilt angle (copied section by section using memory-mapped files)
+#	<tsfile>_sorted.rawtlt	sorted tilt angles
+#	<tsfile>_sorted.tlt	sorted tilt angles (same as rawtlt, can be replaced by aligned angles)
+#	<tsfile>_order.csv	section of sorted stack, section of acquisition, tilt angle, prior dose [e/A^2]
+# Manual use: python PACEtomo_sortWorker.py --files ts1.mrc ts2.mrc
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import mrcfile
+import PACEtomo_tgtsFile as tgtsFile							# shared reading of _closed.txt file (has to be in workerDir)
+from concurrent.futures import ThreadPoolExecutor
+
+######## FUNCTIONS ########
+
+def parseMdoc(mdocFile):										# read tilt angle and dose of every section from SerialEM mdoc file
+	sections = {}
+	sec = None
+	with open(mdocFile) as f:
+		for line in f.readlines():
+			col = line.strip().split(" = ")
+			if line.startswith("[ZValue"):
+				sec = int(line.strip("[] \n").split("=")[-1])
+				sections[sec] = {"angle": 0.0, "dose": 0.0}
+			elif sec is not None and len(col) == 2:
+				if col[0] == "TiltAngle":
+					sections[sec]["angle"] = float(col[1])
+				elif col[0] == "ExposureDose":
+					sections[sec]["dose"] = float(col[1])
+	secs = sorted(sections.keys())
+	return np.array(secs, dtype=int), np.array([sections[sec]["angle"] for sec in secs]), np.array([sections[sec]["dose"] for sec in secs])
+
+def sortSeries(fileName, suffix="_sorted"):
+	stem = os.path.splitext(fileName)[0]
+	secs, angles, doses = parseMdoc(fileName + ".mdoc")
+	with mrcfile.mmap(fileName, mode="r", permissive=True) as mrc:
+		data = mrc.data if mrc.data.ndim == 3 else mrc.data[np.newaxis]
+		valid = secs < data.shape[0]								# ignore mdoc entries of sections that were not written
+		secs, angles, doses = secs[valid], angles[valid], doses[valid]
+		order = np.argsort(angles, kind="stable")
+		priorDose = np.cumsum(doses) - doses							# sections are saved in acquisition order
+
+		with mrcfile.new_mmap(stem + suffix + ".mrc", shape=(len(order), data.shape[1], data.shape[2]), mrc_mode=mrcfile.utils.mode_from_dtype(data.dtype), overwrite=True) as out:
+			for i, sec in enumerate(secs[order]):
+				out.data[i] = data[sec]
+			out.voxel_size = mrc.voxel_size
+			out.update_header_stats()
+
+	with open(stem + suffix + ".rawtlt", "w") as f:
+		f.write("".join([str(round(angle, 2)) + "\n" for angle in angles[order]]))
+	with open(stem + suffix + ".tlt", "w") as f:
+		f.write("".join([str(round(angle, 2)) + "\n" for angle in angles[order]]))
+	with open(stem + "_order.csv", "w") as f:
+		f.write("sortedSec,acquiredSec,angle,priorDose\n")
+		for i, j in enumerate(order):
+			f.write(",".join([str(i), str(secs[j]), str(round(angles[j], 2)), str(round(priorDose[j], 3))]) + "\n")
+	return fileName, len(order)
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Sort PACEtomo tilt series by tilt angle.")
+	parser.add_argument("--files", nargs="*", default=[], help="tilt series files to sort")
+	parser.add_argument("--closed", default="", help="file listing finished tilt series (written by PACEtomo)")
+	parser.add_argument("--done", default="", help="worker stops after sorting all listed tilt series when this file exists")
+	parser.add_argument("--timeout", type=float, default=1440, help="worker stops after this many minutes without newly listed tilt series")
+	parser.add_argument("--threads", type=int, default=4, help="number of tilt series sorted at the same time")
+	args = parser.parse_args()
+
+	queued = set()
+	offset = 0
+	lastNew = time.time()
+	with ThreadPoolExecutor(max_workers=args.threads) as pool:
+		futures = [pool.submit(sortSeries, fileName) for fileName in args.files]
+		queued.update(args.files)
+		while args.closed != "":
+			finished = args.done != "" and os.path.exists(args.done)			# check before reading to not miss the last entries
+			newFiles, offset = tgtsFile.readClosed(args.closed, offset)
+			if len(newFiles) > 0:
+				lastNew = time.time()
+			for fileName in newFiles:
+				if fileName not in queued and os.path.exists(fileName):
+					futures.append(pool.submit(sortSeries, fileName))
+					queued.add(fileName)
+			if finished or time.time() - lastNew > args.timeout * 60:
+				if not finished:
+					print("WARNING: No new tilt series were listed for " + str(args.timeout) + " min. Tilt series closed later will not be sorted.", file=sys.stderr)
+				break
+			time.sleep(5)
+
+		for future in futures:
+			try:
+				fileName, count = future.result()
+				print("Sorted " + fileName + " (" + str(count) + " sections)")
+			except Exception as err:
+				print("WARNING: Sorting failed: " + str(err), file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
@@ -4,7 +4,8 @@
 # Author:	Fabian Eisenstein
 # Created:	2022/12/09
 # Revision:	v0.13
-# Last Change:	2023/06/21: added check for dummy property (requires >June2023), used SkipAcquiringNavItem, fixed navigor save popup
+# Last Change:	2026/10/19: use shared tgtsFile module, use read-only view of montage instead of float copy (buffers module), registry
+#		2023/06/21: added check for dummy property (requires >June2023), used SkipAcquiringNavItem, fixed navigor save popup
 #		2023/06/07: added sanity check for template pixel sizes, limited binning to multiple of 2
 #		2023/05/15: added new EndAcquireAtItems command
 #		2023/02/28: automatically determine virt map binning
@@ -32,6 +33,7 @@
 
 noUI 	= False	# set to True to avoid folder/name selection (e.g. to run the script in a Acquire at Items routine), it will use the label of the montage as name template
 prefix	= "pos"	# prefix for name when running noUI
+registry = False	# adds tgts file to the SQLite registry in your home directory (PACEtomo_registry.py, has to be in folder set by PythonModulePath property)
 
 ### END SETTINGS ###
 
@@ -43,33 +45,23 @@ import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 import mrcfile
 from skimage.transform import resize
+try:
+	import PACEtomo_tgtsFile as tgtsFile								# shared tgts file reader/writer (has to be in folder set by PythonModulePath property)
+except ImportError:
+	sem.OKBox("PACEtomo_tgtsFile.py could not be imported! Please copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.")
+	sem.Exit()
+try:
+	import PACEtomo_buffers as buffers								# read-only views of buffer images (has to be in folder set by PythonModulePath property)
+except ImportError:
+	sem.OKBox("PACEtomo_buffers.py could not be imported! Please copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.")
+	sem.Exit()
+try:
+	import PACEtomo_registry as runRegistry							# optional SQLite registry of areas and runs (has to be in folder set by PythonModulePath property)
+except ImportError:
+	runRegistry = None
 
 ### FUNCTIONS ###
 
-def WriteTargets(targetFile, targets, savedRun=False, resume={"sec": 0, "pos": 0}, settings={}):
-	output = ""
-	if settings != {}:
-		for key, val in settings.items():
-			if val != "":
-				output += "_set " + key + " = " + str(val) + "\n"
-		output += "\n"
-	if resume["sec"] > 0 or resume["pos"] > 0:
-		output += "_spos = " + str(resume["sec"]) + "," + str(resume["pos"]) + "\n" * 2
-	for pos in range(len(targets)):
-		output += "_tgt = " + str(pos + 1).zfill(3) + "\n"
-		for key in targets[pos].keys():
-			output += key + " = " + str(targets[pos][key]) + "\n"
-		if savedRun:
-			output += "_pbr" + "\n"
-			for key in savedRun[pos][0].keys():
-				output += key + " = " + str(savedRun[pos][0][key]) + "\n"
-			output += "_nbr" + "\n"
-			for key in savedRun[pos][1].keys():
-				output += key + " = " + str(savedRun[pos][1][key]) + "\n"		
-		output += "\n"
-	with open(targetFile, "w") as f:
-		f.write(output)
-
 def WriteMrc(outfilename, image, pixSize):
 	with mrcfile.new(os.path.join(curDir, outfilename), overwrite=True) as mrc:
 		mrc.set_data(image)
@@ -258,7 +250,7 @@ x = imgProp[0]
 y = imgProp[1]
 pixSize = imgProp[4] * 10
 
-image = np.asarray(sem.bufferImage(buffer), dtype=float)
+image, _ = buffers.view(buffer)				# read-only view of montage (crops are converted to float by resize)
 
 # Get point coords
 
@@ -409,7 +401,17 @@ sem.Echo("Updated navigator file with target maps.")
 
 # Write tgts file
 
-WriteTargets(tgtsFilePath, targets)
+tgtsFile.writeTargets(tgtsFilePath, targets)
+if registry:
+	if runRegistry is not None:
+		try:
+			db = runRegistry.connect()
+			runRegistry.addArea(db, tgtsFilePath, targets)
+			db.close()
+		except Exception as err:
+			sem.Echo("WARNING: Registry could not be updated (" + str(err) + ").")
+	else:
+		sem.Echo("WARNING: PACEtomo_registry.py could not be imported. Targets were not registered.")
 
 sem.Echo("Target selection completed! " + str(len(targets)) + " targets were selected.")
 
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_tgtsFile
+# Purpose:	Shared reading and writing of PACEtomo target files (tgts and run files) in text (v1) and JSON lines (v2) format.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This module is imported by PACEtomo, selectTargets, targetsFromMontage and the background workers. It only needs the Python standard library.
+# SerialEM has to be able to find it: copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.
+#
+# Format v1 (text):		Format v2 (JSON lines, one record per line):
+#	_set step = 3.0			{"PACEtomo": "tgts", "version": 2}
+#	_spos = 5,3			{"set": {"step": 3.0}}
+#	_tgt = 001			{"spos": [5, 3]}
+#	tsfile = ts_001.mrc		{"tgt": {"tsfile": "ts_001.mrc", ...}, "pbr": {...}, "nbr": {...}}
+#	_pbr / _nbr / _geo = 1		{"geo": {"x": 1.0, "y": 2.0}}
+#
+# Values of v1 files are strings, values of v2 files keep their type. By default, values are returned as strings like they
+# appear in v1 files, so scripts behave the same for both formats. Use typed=True to get numbers, booleans and lists instead.
+#
+# Manual use:	python PACEtomo_tgtsFile.py convert X_tgts.txt X_tgts_v2.txt --version 2
+#		python PACEtomo_tgtsFile.py bench [--targets 10000]
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import tempfile
+
+formatVersion = 2
+listKeys = ["shifts", "angles"]										# branch values that are always lists
+
+######## FUNCTIONS ########
+
+def detectVersion(fileName):										# v2 files start with JSON header record
+	with open(fileName) as f:
+		for line in f:
+			if line.strip() != "":
+				return 2 if line.lstrip().startswith("{") else 1
+	return 1
+
+def parseValue(key, text):										# convert text value of v1 file to its type
+	if key in listKeys:
+		return [float(val) for val in text.split(",")] if text != "" else []
+	if text in ["True", "False"]:
+		return text == "True"
+	if text == "None":
+		return None
+	for valType in [int, float]:
+		try:
+			return valType(text)
+		except ValueError:
+			pass
+	return text
+
+def formatValue(value):											# convert value to text as written to v1 file
+	if isinstance(value, (list, tuple)):
+		return ",".join([str(val) for val in value])
+	return str(value)
+
+def typedRecord(record):										# convert text values (e.g. read from v1 file) to their type before writing v2 file
+	return {key: parseValue(key, val) if isinstance(val, str) else val for key, val in record.items()}
+
+def jsonValue(value):											# make numpy and other values JSON serializable
+	if hasattr(value, "item"):									# numpy scalars
+		return value.item()
+	if hasattr(value, "tolist"):									# numpy arrays
+		return value.tolist()
+	return str(value)
+
+def streamTargets(fileName, typed=False):								# yield records of target file one by one: ("set", dict), ("spos", dict), ("tgt", [target, pbr, nbr]), ("geo", dict)
+	with open(fileName) as f:
+		if detectVersion(fileName) == 2:
+			for line in f:
+				if line.strip() == "":
+					continue
+				record = json.loads(line)
+				if "set" in record.keys():
+					yield "set", record["set"] if typed else {key: formatValue(val) for key, val in record["set"].items()}
+				elif "spos" in record.keys():
+					yield "spos", {"sec": int(record["spos"][0]), "pos": int(record["spos"][1])}
+				elif "tgt" in record.keys():
+					branches = [record["tgt"], record.get("pbr"), record.get("nbr")]
+					if not typed:
+						branches = [{key: formatValue(val) for key, val in branch.items()} if branch is not None else None for branch in branches]
+					yield "tgt", branches
+				elif "geo" in record.keys():
+					yield "geo", {key: float(val) for key, val in record["geo"].items()}
+			return
+
+		current = None
+		branch = None
+		for line in f:
+			col = line.rstrip("\r\n").split(" ")
+			if col[0] == "": continue
+			if line.startswith("_set") and len(col) == 4:
+				yield "set", {col[1]: parseValue(col[1], col[3]) if typed else col[3]}
+			elif line.startswith("_spos"):
+				yield "spos", {"sec": int(col[2].split(",")[0]), "pos": int(col[2].split(",")[1])}
+			elif line.startswith("_tgt"):
+				if current is not None:
+					yield "tgt", current
+				if branch == "geo":							# geo points are usually written after all targets
+					yield "geo", geoPoint
+				current = [{}, None, None]
+				branch = 0
+			elif line.startswith("_pbr"):
+				current[1] = {}
+				branch = 1
+			elif line.startswith("_nbr"):
+				current[2] = {}
+				branch = 2
+			elif line.startswith("_geo"):
+				if current is not None:
+					yield "tgt", current
+					current = None
+				if branch == "geo":
+					yield "geo", geoPoint
+				geoPoint = {}
+				branch = "geo"
+			elif len(col) >= 3:
+				if branch == "geo":
+					geoPoint[col[0]] = float(col[2])
+				elif current is not None:
+					current[branch][col[0]] = parseValue(col[0], col[2]) if typed else col[2]
+		if current is not None:
+			yield "tgt", current
+		if branch == "geo":
+			yield "geo", geoPoint
+
+def readTargets(fileName, typed=False):									# read complete target file
+	targets = []
+	geoPoints = []
+	savedRun = []
+	resume = {"sec": 0, "pos": 0}
+	settings = {}
+	for kind, record in streamTargets(fileName, typed):
+		if kind == "tgt":
+			targets.append(record[0])
+			if record[1] is not None or record[2] is not None:
+				savedRun.append([record[1] if record[1] is not None else {}, record[2] if record[2] is not None else {}])
+		elif kind == "geo":
+			geoPoints.append(record)
+		elif kind == "spos":
+			resume = record
+		elif kind == "set":
+			settings.update(record)
+	if savedRun == []: savedRun = False
+	return targets, savedRun, resume, settings, geoPoints
+
+def writeTargets(fileName, targets, geoPoints=[], savedRun=False, resume={"sec": 0, "pos": 0}, settings={}, version=1):
+	settings = {key: val for key, val in settings.items() if val != ""}
+	if version == 2:
+		output = [json.dumps({"PACEtomo": "tgts", "version": formatVersion})]
+		if settings != {}:
+			output.append(json.dumps({"set": typedRecord(settings)}, default=jsonValue))
+		if resume["sec"] > 0 or resume["pos"] > 0:
+			output.append(json.dumps({"spos": [resume["sec"], resume["pos"]]}))
+		for pos in range(len(targets)):
+			record = {"tgt": typedRecord(targets[pos]), "pbr": typedRecord(savedRun[pos][0]), "nbr": typedRecord(savedRun[pos][1])} if savedRun else {"tgt": typedRecord(targets[pos])}
+			output.append(json.dumps(record, separators=(",", ":"), default=jsonValue))
+		for point in geoPoints:
+			output.append(json.dumps({"geo": point}, default=jsonValue))
+		output = "\n".join(output) + "\n"
+	else:
+		output = []
+		if settings != {}:
+			output.extend(["_set " + key + " = " + formatValue(val) + "\n" for key, val in settings.items()])
+			output.append("\n")
+		if resume["sec"] > 0 or resume["pos"] > 0:
+			output.append("_spos = " + str(resume["sec"]) + "," + str(resume["pos"]) + "\n" * 2)
+		for pos in range(len(targets)):
+			output.append("_tgt = " + str(pos + 1).zfill(3) + "\n")
+			output.extend([key + " = " + formatValue(val) + "\n" for key, val in targets[pos].items()])
+			if savedRun:
+				output.append("_pbr" + "\n")
+				output.extend([key + " = " + formatValue(val) + "\n" for key, val in savedRun[pos][0].items()])
+				output.append("_nbr" + "\n")
+				output.extend([key + " = " + formatValue(val) + "\n" for key, val in savedRun[pos][1].items()])
+			output.append("\n")
+		for pos in range(len(geoPoints)):
+			output.append("_geo = " + str(pos + 1) + "\n")
+			output.extend([key + " = " + formatValue(val) + "\n" for key, val in geoPoints[pos].items()])
+			output.append("\n")
+		output = "".join(output)
+	with open(fileName, "w") as f:
+		f.write(output)
+
+def appendTarget(fileName, targetNo, target):								# add target to end of existing target file in its format
+	if os.path.exists(fileName) and detectVersion(fileName) == 2:
+		output = json.dumps({"tgt": typedRecord(target)}, separators=(",", ":"), default=jsonValue) + "\n"
+	else:
+		output = "_tgt = " + str(targetNo).zfill(3) + "\n"
+		output += "".join([key + " = " + formatValue(val) + "\n" for key, val in target.items()]) + "\n"
+	with open(fileName, "a") as f:
+		f.write(output)
+
+def runNumber(fileName):										# number of run file (X_tgts_run12.txt: 12), None for other files
+	match = re.search(r"_run(\d+)\.txt$", os.path.basename(fileName))
+	return int(match.group(1)) if match else None
+
+def findRunFiles(folder, fileStem):									# run files of tgts file sorted by run number (also beyond run 99, but not e.g. _run01_closed.txt)
+	runFiles = [fileName for fileName in glob.glob(os.path.join(folder, glob.escape(fileStem) + "_run*.txt")) if runNumber(fileName) is not None]
+	return sorted(runFiles, key=runNumber)
+
+def readNewLines(fileName, offset):									# complete lines appended to file since byte offset, returns lines and new offset
+	if not os.path.exists(fileName):
+		return [], offset
+	with open(fileName, "rb") as f:									# binary mode: offset counts bytes also for CRLF files
+		f.seek(offset)
+		content = f.read()
+	content = content[:content.rfind(b"\n") + 1]							# only use complete lines
+	return content.decode(errors="replace").splitlines(), offset + len(content)
+
+def readClosed(closedFile, offset):									# tilt series newly listed in _closed.txt file of run (used by background workers)
+	lines, offset = readNewLines(closedFile, offset)
+	return [line.strip() for line in lines if line.strip() != ""], offset
+
+def convertTargets(inFile, outFile, version=formatVersion):
+	targets, savedRun, resume, settings, geoPoints = readTargets(inFile, typed=True)
+	writeTargets(outFile, targets, geoPoints, savedRun, resume, settings, version)
+	return len(targets)
+
+def benchmark(nTargets, repeats=3):									# time writing and reading of synthetic run file with both formats
+	targets = [{"tsfile": "bench_ts_" + str(i + 1).zfill(3) + ".mrc", "SSX": 0.1 * i, "SSY": -0.1 * i, "stageX": 1.5, "stageY": -2.5, "SPACEscore": 0.5, "skip": False} for i in range(nTargets)]
+	branch = {"SSX": 0.123, "SSY": -0.456, "focus": -3.5, "tgtDefocus": -3.5, "z0": 0.05, "n0": 0.0, "shifts": [0.01, 0.02, -0.01, 0.03], "angles": [3.0, 6.0, 9.0, 12.0], "ISXset": 1.0, "ISYset": -1.0, "ISXali": 0.001, "ISYali": -0.002, "dose": 25.0, "sec": 8, "skip": False}
+	savedRun = [[dict(branch), dict(branch)] for i in range(nTargets)]
+	settings = {"startTilt": 0.0, "minTilt": -60.0, "maxTilt": 60.0, "step": 3.0, "pretilt": 0.0, "rotation": 0.0}
+	results = {}
+	folder = tempfile.mkdtemp()
+	for version in [1, 2]:
+		fileName = os.path.join(folder, "bench_v" + str(version) + ".txt")
+		timings = {"write": [], "read": [], "readTyped": []}
+		for i in range(repeats):
+			start = time.perf_counter()
+			writeTargets(fileName, targets, [], savedRun, {"sec": 8, "pos": 3}, settings, version)
+			timings["write"].append(time.perf_counter() - start)
+			start = time.perf_counter()
+			readTargets(fileName)
+			timings["read"].append(time.perf_counter() - start)
+			start = time.perf_counter()
+			readTargets(fileName, typed=True)
+			timings["readTyped"].append(time.perf_counter() - start)
+		results[version] = {key: min(val) for key, val in timings.items()}
+		results[version]["size"] = os.path.getsize(fileName)
+		os.remove(fileName)
+	os.rmdir(folder)
+	return results
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Convert and benchmark PACEtomo target files.")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	convertParser = subparsers.add_parser("convert", help="convert target file to other format")
+	convertParser.add_argument("input", help="tgts or run file")
+	convertParser.add_argument("output", help="converted file")
+	convertParser.add_argument("--version", type=int, choices=[1, 2], default=formatVersion, help="format of converted file (1: text, 2: JSON lines)")
+	benchParser = subparsers.add_parser("bench", help="time writing and reading of synthetic run files")
+	benchParser.add_argument("--targets", type=int, default=10000, help="number of targets")
+	benchParser.add_argument("--repeats", type=int, default=3, help="best of this many repeats is reported")
+	args = parser.parse_args()
+
+	if args.command == "convert":
+		if os.path.abspath(args.input) == os.path.abspath(args.output):
+			print("ERROR: Output file has to be different from input file!")
+			sys.exit(1)
+		count = convertTargets(args.input, args.output, args.version)
+		print("Converted " + str(count) + " targets from v" + str(detectVersion(args.input)) + " to v" + str(args.version) + ": " + args.output)
+	else:
+		results = benchmark(args.targets, args.repeats)
+		print("Run file with " + str(args.targets) + " targets (best of " + str(args.repeats) + "):")
+		for version, timing in results.items():
+			print("  v" + str(version) + ": write " + str(round(timing["write"] * 1000, 1)) + " ms | read " + str(round(timing["read"] * 1000, 1)) + " ms | read typed " + str(round(timing["readTyped"] * 1000, 1)) + " ms | " + str(round(timing["size"] / 1024**2, 2)) + " MB")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_transferWorker
+# Purpose:	Copies finished tilt series to another location while PACEtomo is still collecting.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# This script is started by PACEtomo when transferWorker = True (it only needs the Python standard library and PACEtomo_tgtsFile.py in workerDir).
+# Only tilt series listed in the _closed.txt file of the run are copied (together with their mdoc file and the files of montage
+# tiles when using tgtMontage). These are never opened again by SerialEM, so the transfer cannot interfere with the collection.
+# The tgts, run, telemetry and _closed.txt files of the run are copied once PACEtomo is done (the SerialEM log is not copied).
+# Files are copied in chunks with an optional bandwidth limit, verified by SHA-256 checksum and listed in PACEtomo_manifest.csv
+# in the destination folder.
+# Manual use: python PACEtomo_transferWorker.py --dest X:\transfer --files ts1.mrc ts2.mrc [--rate 100]
+
+import os
+import re
+import sys
+import glob
+import time
+import hashlib
+import argparse
+from datetime import datetime
+import PACEtomo_tgtsFile as tgtsFile							# shared reading of _closed.txt file (has to be in workerDir)
+
+chunkSize = 8 * 1024**2
+
+######## FUNCTIONS ########
+
+def fileHash(fileName):
+	sha = hashlib.sha256()
+	with open(fileName, "rb") as f:
+		for chunk in iter(lambda: f.read(chunkSize), b""):
+			sha.update(chunk)
+	return sha.hexdigest()
+
+def copyFile(fileName, dest, rate=0):									# copy with bandwidth limit [MB/s] and return checksum of copied data
+	target = os.path.join(dest, os.path.basename(fileName))
+	sha = hashlib.sha256()
+	startTime = time.time()
+	copied = 0
+	with open(fileName, "rb") as src, open(target + ".part", "wb") as dst:
+		for chunk in iter(lambda: src.read(chunkSize), b""):
+			dst.write(chunk)
+			sha.update(chunk)
+			copied += len(chunk)
+			if rate > 0:
+				delay = copied / (rate * 1024**2) - (time.time() - startTime)
+				if delay > 0:
+					time.sleep(delay)
+	checksum = sha.hexdigest()
+	if fileHash(target + ".part") != checksum:
+		os.remove(target + ".part")
+		raise IOError("Checksum mismatch after copying " + fileName)
+	os.replace(target + ".part", target)
+	return target, copied, checksum
+
+def readManifest(manifestFile):										# files already transferred: {name: [size, checksum]}
+	manifest = {}
+	if os.path.exists(manifestFile):
+		with open(manifestFile) as f:
+			for line in f.readlines()[1:]:
+				col = line.strip().split(",")
+				if len(col) >= 3:
+					manifest[col[0]] = [int(col[1]), col[2]]
+	return manifest
+
+def addToManifest(manifestFile, name, size, checksum):
+	with open(manifestFile, "a") as f:
+		if f.tell() == 0:
+			f.write("file,size,sha256,copied\n")
+		f.write(",".join([name, str(size), checksum, datetime.now().strftime("%Y-%m-%d %H:%M:%S")]) + "\n")
+
+def seriesFiles(fileName):										# tilt series, its mdoc file and files of montage tiles (tgtMontage: <tsfile>_i_j.mrc) with their mdoc files
+	stem, ext = os.path.splitext(fileName)
+	tiles = sorted([name for name in glob.glob(glob.escape(stem) + "_*_*" + ext) if re.fullmatch(r"_-?\d+_-?\d+", name[len(stem):-len(ext)])])
+	return [name for tile in [fileName] + tiles for name in [tile, tile + ".mdoc"]]
+
+def transfer(fileNames, dest, manifest, manifestFile, rate):						# copy files that are not in manifest with same size
+	for name in fileNames:
+		if not os.path.exists(name):
+			continue
+		size = os.path.getsize(name)
+		if os.path.basename(name) in manifest.keys() and manifest[os.path.basename(name)][0] == size:
+			continue
+		target, size, checksum = copyFile(name, dest, rate)
+		manifest[os.path.basename(name)] = [size, checksum]
+		addToManifest(manifestFile, os.path.basename(name), size, checksum)
+		print("Copied " + name + " (" + str(round(size / 1024**2, 1)) + " MB)")
+		sys.stdout.flush()
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Copy finished PACEtomo tilt series during collection.")
+	parser.add_argument("--dest", required=True, help="destination folder")
+	parser.add_argument("--files", nargs="*", default=[], help="tilt series files to copy")
+	parser.add_argument("--closed", default="", help="file listing finished tilt series (written by PACEtomo)")
+	parser.add_argument("--done", default="", help="worker stops after copying all listed tilt series when this file exists")
+	parser.add_argument("--session", nargs="*", default=[], help="other files of the run (e.g. tgts, run and telemetry file) copied when the done file exists")
+	parser.add_argument("--timeout", type=float, default=1440, help="worker stops after this many minutes without newly listed tilt series")
+	parser.add_argument("--rate", type=float, default=0, help="bandwidth limit [MB/s] (0: no limit)")
+	args = parser.parse_args()
+
+	os.makedirs(args.dest, exist_ok=True)
+	manifestFile = os.path.join(args.dest, "PACEtomo_manifest.csv")
+	manifest = readManifest(manifestFile)
+
+	queue = list(args.files)
+	offset = 0
+	lastNew = time.time()
+	while True:
+		finished = args.done != "" and os.path.exists(args.done)				# check before reading to not miss the last entries
+		if args.closed != "":
+			newFiles, offset = tgtsFile.readClosed(args.closed, offset)
+			if len(newFiles) > 0:
+				lastNew = time.time()
+			queue.extend([fileName for fileName in newFiles if fileName not in queue])
+		while len(queue) > 0:
+			fileName = queue.pop(0)
+			try:
+				transfer(seriesFiles(fileName), args.dest, manifest, manifestFile, args.rate)
+			except (IOError, OSError) as err:
+				print("WARNING: Transfer of " + fileName + " failed: " + str(err), file=sys.stderr)
+		if finished or args.done == "":								# session files are complete once PACEtomo is done
+			try:
+				transfer(args.session, args.dest, manifest, manifestFile, args.rate)
+			except (IOError, OSError) as err:
+				print("WARNING: Transfer of session files failed: " + str(err), file=sys.stderr)
+		if args.closed == "" or finished or time.time() - lastNew > args.timeout * 60:
+			if not finished and args.closed != "":
+				print("WARNING: No new tilt series were listed for " + str(args.timeout) + " min. Transfer stopped.", file=sys.stderr)
+			break
+		time.sleep(10)
+
+if __name__ == "__main__":
+	main()
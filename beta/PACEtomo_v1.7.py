@@ -7,7 +7,8 @@
 # Author:	Fabian Eisenstein
 # Created:	2021/04/16
 # Revision:	v1.7
-# Last Change:	2023/12/11: fixed CTFfind target defocus
+# Last Change:	2026/10/19: added stretchAli, continuous geoRefine, focusSlopeCal, telemetry, ctfWorker, sortWorker, previewWorker, transferWorker, mdocRecovery, typed settings, tgtsFile module, active target sets, alignment quality, dashboard, focusCtrl, backlashModel, afTol, savePipeline, slitTol, registry
+#		2023/12/11: fixed CTFfind target defocus
 # ===================================================================
 
 ############ SETTINGS ############ 
@@ -21,7 +22,11 @@ maxDefocus	= -5		# maximum defocus [microns] of target range (high defocus)
 stepDefocus	= 0.5		# step [microns] between target defoci (between TS)
 
 focusSlope	= 0.0		# empirical linear focus correction [microns per degree] (obtained by linear regression of CTF fitted defoci over tilt series; microscope stage dependent)
+focusSlopeCal	= False		# refines focusSlope during the run from CTF results and saves it to the calibration file in your home directory as starting value for the next run (overrides focusSlope if a saved value exists)
+focusCtrl	= False		# corrects the focus of each target by its running average of CTF defocus errors (needs CTF estimation, only use when CTF fits on your sample seem reliable)
+focusCtrlMax	= 0.3		# focusCtrl: maximum focus correction [microns] applied to a target after each CTF result
 delayIS		= 0.5		# delay [s] between applying image shift and Record
+savePipeline	= False		# saves each image while the image shift of the next image settles instead of right after Record (hides saving time in delayIS)
 delayTilt	= 0.5 		# delay [s] after stage tilt
 zeroExpTime	= 0 		# set to exposure time [s] used for start tilt image, if 0: use same exposure time for all tilt images
 
@@ -30,6 +35,7 @@ trackExpTime	= 0		# set to exposure time [s] used for tracking tilt series, if 0
 trackDefocus	= 0		# set to defocus [microns] used for tracking tilt series, if 0: use same defocus range for all tilt series
 trackMag	= 0		# set to nominal magnification for tracking tilt series (make sure detector is still covered under the same beam conditions), if 0: use same mag for all tilt series
 trackTwice	= False		# track in 2 steps, useful when large tracking shifts cause inaccuracies in alignment and hence, in residual errors for all targets, but causes double exposure of tracking area
+stretchAli	= False		# stretch previous image perpendicular to the tilt axis by cos(tilt)/cos(previous tilt) before aligning (reduces alignment errors at high tilt and second shots when using trackTwice)
 
 # Geometry settings
 pretilt		= 0		# pretilt [degrees] of sample in deg e.g. after FIB milling (if milling direction is not perpendicular to the tilt axis, estimate and add rotation)
@@ -44,29 +50,54 @@ measureGeo	= False		# estimates pretilt and rotation values of support film by m
 # Session settings
 beamTiltComp	= True		# use beam tilt compensation (uses coma vs image shift calibrations)
 addAF		= False		# does autofocus at the start of every tilt group, increases exposure on tracking TS drastically
+afTol		= 0		# addAF: only autofocus when the predicted focus uncertainty [microns] since the last autofocus exceeds this value (from z0 fit of tracking target, CTF results and focus drift; 0: autofocus at every tilt group)
+afInterval	= 5		# addAF: minimum time [minutes] between autofocus on the same branch (only used when afTol > 0)
 previewAli	= True		# adds initial dose, but makes sure start tilt image is on target (uses view image and aligns to buffer P if alignToP == True)
 viewAli 	= False		# adds an alignment step with a View image if it was saved during the target selection (only if previewAli is activated)
-geoRefine	= False		# uses on-the-fly CtfFind results of first image to refine geometry before tilting (only use when CTF fits on your sample seem reliable)
+geoRefine	= False		# uses on-the-fly CTF fit results to refine geometry before tilting and keeps refining it at every tilt (only use when CTF fits on your sample seem reliable)
 
 # Advanced settings
 doCtfFind	= False		# set to False to skip CTFfind estimation (only necessary if it causes crashes => if it does crash, SerialEM will output some tourbleshoot data that you should send to David!) 
 doCtfPlotter	= True		# runs ctfplotter instead of CTFfind, needs standalone version of 3Dmod on PATH
-fitLimit	= 30		# geoRefine: minimum resolution [Angstroms] needed for CTF fit to be considered for geoRefine
+ctfWorker	= False		# runs CTF estimation in a background process (PACEtomo_ctfWorker.py) instead of after every Record (results are used for geoRefine/focusSlopeCal when available)
+pythonExe	= "python"	# Python executable used to run background workers (needs numpy, sort and preview workers also need mrcfile, see README)
+workerDir	= ""		# folder containing the PACEtomo worker scripts (e.g. PACEtomo_ctfWorker.py)
+sortWorker	= False		# sorts every finished tilt series by tilt angle in a background process (PACEtomo_sortWorker.py) and writes .rawtlt/.tlt and dose order files
+previewWorker	= False		# reconstructs a binned preview tomogram and central slab JPEG of every finished tilt series in a background process (PACEtomo_previewWorker.py, uses alignment errors saved by extendedMdoc)
+transferWorker	= False		# copies every finished tilt series and its mdoc to transferDir in a background process (PACEtomo_transferWorker.py) without touching files that are still being collected (tgts, run and telemetry files are copied at the end)
+transferDir	= ""		# destination folder for transferWorker
+transferRate	= 0		# bandwidth limit [MB/s] for transferWorker (0: no limit)
+dashboard	= False		# serves a live web page of the session from the telemetry file (PACEtomo_dashboard.py, open http://localhost:dashboardPort in a browser, needs telemetry)
+dashboardHost	= "localhost"	# address of dashboard (set to 0.0.0.0 to allow access from other computers)
+dashboardPort	= 8765		# port of dashboard
+fitLimit	= 30		# geoRefine/focusSlopeCal: minimum resolution [Angstroms] needed for CtfFind result to be considered for geoRefine/focusSlopeCal
 parabolTh	= 9		# geoRefine: minimum number of passable CtfFind values to fit paraboloid instead of plane 
+geoOutlier	= 3		# geoRefine: CTF results deviating from the current geometry model by more than this many robust standard deviations are ignored
 imageShiftLimit	= 20		# maximum image shift [microns] SerialEM is allowed to apply (this is a SerialEM property entry, default is 15 microns)
 dataPoints	= 4		# number of recent specimen shift data points used for estimation of eucentric offset (default: 4)
 alignLimit	= 0.5		# maximum shift [microns] allowed for record tracking between tilts, should reduce loss of target in case of low contrast (not applied for tracking TS); also the threshold to take a second tracking image when using trackTwice
 minCounts	= 0 		# minimum mean counts per second of record image (if set > 0, tilt series branch will be aborted if mean counts are not sufficient)
+aliQualityMin	= 0		# minimum alignment quality of a target (0-1, running average of alignment shifts relative to alignLimit), branch will be aborted if quality drops below (0: disabled)
+aliClampMax	= 0		# number of consecutive alignments limited by alignLimit after which a branch will be aborted (0: disabled)
 ignoreNegStart 	= True		# ignore first shift on 2nd branch, which is usually very large on bad stages
 slowTilt	= False		# do backlash step for all tilt angles, on bad stages large tilt steps are less accurate
+backlashModel	= False		# skip backlash steps when the backlash model (calibrate with PACEtomo_backlashCal.py) predicts a tracking error without backlash below backlashTol, keeps refining the model from tracking shifts and saves it to the calibration file
+backlashTol	= 0.1		# backlashModel: maximum predicted tracking error [microns] (95th percentile) to skip backlash step
 taOffsetPos	= 0 		# additional tilt axis offset values [microns] applied to calculations for postitive and...
 taOffsetNeg	= 0 		# ...negative branch of the tilt series (possibly useful for side-entry holder systems)
 extendedMdoc	= True		# saves additional info to .mdoc file
+mdocRecovery	= True		# when realigning during recovery, rebuild prediction history of all targets from extended mdoc files and realign tracking target to its last image instead of resetting prediction parameters
+tgtsFormat	= 1		# format of run files (1: text, 2: JSON lines with typed values, faster to read for analysis scripts; convert with PACEtomo_tgtsFile.py)
+registry	= False		# indexes areas, runs and tilt series in an SQLite registry in your home directory for fast lookup of run files and analysis across sessions (PACEtomo_registry.py, has to be in folder set by PythonModulePath property)
+telemetry	= True		# saves predictions, measurements and timings of every image to a _telemetry.csv file next to the run file (can be summarized with PACEtomo_analyzeTelemetry.py)
 checkDewar	= True		# check if dewars are refilling before every acquisition
 cryoARM		= False		# if you use a JEOL cryoARM TEM, this will keep the dewar refilling in sync
 coldFEG		= False		# if you use a cold FEG, this will flash the gun whenever the dewars are being refilled
 flashInterval	= -1 		# time in hours between cold FEG flashes, -1: flash only during dewar refill (interval is ignored on Krios, uses FlashingAdvised function instead)
-slitInterval	= 0 		# time in minutes between centering the energy filder slit using RefineZLP, ONLY works with tgtPattern (needs pattern vectors to find good position for alignment)
+slitInterval	= 0 		# maximum time in minutes between centering the energy filter slit using RefineZLP, needs tgtPattern (pattern vectors are used to find an empty hole) or slitShiftX/Y
+slitTol		= 0		# refines ZLP at the end of a tilt when the ZLP drift [eV] predicted until the end of the next tilt exceeds this value (drift rate is learned from the shifts found by RefineZLP; 0: only use slitInterval)
+slitShiftX	= 0		# specimen shift [microns] from tracking target to an empty area (e.g. hole or vacuum) used for RefineZLP (0, 0: use hole outside of tgt pattern along vector B)
+slitShiftY	= 0
 
 # Target montage settings
 tgtMontage	= False		# collect montage for each target using the shorter camera length (e.g. for square aperture montage tomography)
@@ -80,13 +111,47 @@ tgtTrackMnt	= False 	# set to True if you also want the tracking target to be a
 import serialem as sem
 import os
 import copy
+import time
+import subprocess
 from datetime import datetime
 import glob
+import hashlib
+from collections import namedtuple
 import numpy as np
-from scipy import optimize
+from scipy import optimize, ndimage
+try:
+	import PACEtomo_tgtsFile as tgtsFile								# shared tgts file reader/writer (has to be in folder set by PythonModulePath property)
+except ImportError:
+	sem.OKBox("PACEtomo_tgtsFile.py could not be imported! Please copy it to the folder set by the PythonModulePath property in your SerialEMproperties.txt.")
+	sem.Exit()
+try:
+	import PACEtomo_registry as runRegistry							# optional SQLite registry of runs (has to be in folder set by PythonModulePath property)
+except ImportError:
+	runRegistry = None
 
 versionPACE = "1.7.0beta"
 versionCheck = sem.IsVersionAtLeast("40100", "20231001")
+calibrationFile = os.path.join(os.path.expanduser("~"), "PACEtomo_calibration.txt")		# microscope specific values refined during runs (e.g. focusSlope)
+profileFile = os.path.join(os.path.expanduser("~"), "PACEtomo_profile.txt")			# microscope specific settings (key = value lines) overriding the defaults above
+
+settingsSchema = {											# name: [type, min, max] (None: no limit)
+	"startTilt": [float, -90, 90], "minTilt": [float, -90, 0], "maxTilt": [float, 0, 90], "step": [float, 0.1, 90],
+	"minDefocus": [float, -50, 50], "maxDefocus": [float, -50, 50], "stepDefocus": [float, 0, 50],
+	"focusSlope": [float, -1, 1], "focusSlopeCal": [bool, None, None], "focusCtrl": [bool, None, None], "focusCtrlMax": [float, 0, None], "delayIS": [float, 0, 60], "savePipeline": [bool, None, None], "delayTilt": [float, 0, 60], "zeroExpTime": [float, 0, 60],
+	"trackExpTime": [float, 0, 60], "trackDefocus": [float, -50, 50], "trackMag": [int, 0, None], "trackTwice": [bool, None, None], "stretchAli": [bool, None, None],
+	"pretilt": [float, -90, 90], "rotation": [float, -180, 180],
+	"tgtPattern": [bool, None, None], "alignToP": [bool, None, None], "refineVec": [bool, None, None], "measureGeo": [bool, None, None],
+	"beamTiltComp": [bool, None, None], "addAF": [bool, None, None], "afTol": [float, 0, None], "afInterval": [float, 0, None], "previewAli": [bool, None, None], "viewAli": [bool, None, None], "geoRefine": [bool, None, None],
+	"doCtfFind": [bool, None, None], "doCtfPlotter": [bool, None, None], "ctfWorker": [bool, None, None], "pythonExe": [str, None, None], "workerDir": [str, None, None],
+	"sortWorker": [bool, None, None], "previewWorker": [bool, None, None], "transferWorker": [bool, None, None], "transferDir": [str, None, None], "transferRate": [float, 0, None],
+	"registry": [bool, None, None], "dashboard": [bool, None, None], "dashboardHost": [str, None, None], "dashboardPort": [int, 1, 65535],
+	"fitLimit": [float, 0, None], "parabolTh": [int, 6, None], "geoOutlier": [float, 0, None], "imageShiftLimit": [float, 0, None], "dataPoints": [int, 1, None],
+	"alignLimit": [float, 0, None], "minCounts": [float, 0, None], "aliQualityMin": [float, 0, 1], "aliClampMax": [int, 0, None], "ignoreNegStart": [bool, None, None], "slowTilt": [bool, None, None], "backlashModel": [bool, None, None], "backlashTol": [float, 0, None],
+	"taOffsetPos": [float, None, None], "taOffsetNeg": [float, None, None], "extendedMdoc": [bool, None, None], "mdocRecovery": [bool, None, None], "tgtsFormat": [int, 1, 2], "telemetry": [bool, None, None],
+	"checkDewar": [bool, None, None], "cryoARM": [bool, None, None], "coldFEG": [bool, None, None], "flashInterval": [float, -1, None], "slitInterval": [float, 0, None], "slitTol": [float, 0, None], "slitShiftX": [float, None, None], "slitShiftY": [float, None, None],
+	"tgtMontage": [bool, None, None], "tgtMntSize": [int, 1, None], "tgtMntOverlap": [float, 0, 1], "tgtMntFocusCor": [bool, None, None], "tgtTrackMnt": [bool, None, None],
+	"vecA0": [float, None, None], "vecA1": [float, None, None], "vecB0": [float, None, None], "vecB1": [float, None, None], "size": [int, 0, None],	# tgt pattern from tgts file (no default)
+}
 if not versionCheck and sem.IsVariableDefined("warningVersion") == 0:
 	runScript = sem.YesNoBox("\n".join(["WARNING: You are using a version of SerialEM that does not support all PACEtomo features. It is recommended to update to the latest SerialEM beta version!", "", "Do you want to run PACEtomo regardless?"]))
 	if not runScript:
@@ -122,86 +187,495 @@ def checkColdFEG():
 	else:
 			sem.LongOperation("FF", str(flashInterval))	
 
-def checkSlit(vec, size, tilt, pn):									# check ZLP in hole outside of pattern along tilt axis
-	global lastSlitCheck
+def checkSlit(tilt, pn):										# check ZLP in empty area (slitShiftX/Y from tracking target or hole outside of pattern along vector B) and update ZLP drift rate
+	global lastSlitCheck, slitDrift, slitCount
 	sem.Echo("Refining ZLP...")
 	sem.SetImageShift(position[0][pn]["ISXset"], position[0][pn]["ISYset"])
-	shift = vec * (size + 1)
+	if slitShiftX != 0 or slitShiftY != 0:
+		shift = np.array([slitShiftX, slitShiftY], dtype=float)
+	else:
+		shift = np.array([vecB0, vecB1], dtype=float) * (size + 1)
 	shift[1] *= np.cos(np.radians(tilt))
 	sem.ImageShiftByMicrons(*shift)
+	loss = sem.ReportEnergyFilter()[1]
 	sem.RefineZLP()
+	zlpShift = abs(sem.ReportEnergyFilter()[1] - loss)						# energy loss includes ZLP offset
 	sem.SetImageShift(position[0][pn]["ISXset"], position[0][pn]["ISYset"])
+	elapsed = (sem.ReportClock() - lastSlitCheck) / 60
+	if elapsed > 1:
+		slitDrift = (1 - slitWeight) * slitDrift + slitWeight * zlpShift / elapsed
 	lastSlitCheck = sem.ReportClock()
+	slitCount += 1
+	sem.Echo("ZLP shift: " + str(round(zlpShift, 2)) + " eV after " + str(round(elapsed, 1)) + " min (drift: " + str(round(slitDrift * 60, 2)) + " eV/h)")
 
-def parseTargets(targetFile):
-	targets = []
-	geoPoints = []
-	savedRun = []
-	branch = None
-	resume = {"sec": 0, "pos": 0}
-	for line in targetFile:
-		col = line.strip(os.linesep).split(" ")
-		if col[0] == "": continue
-		if line.startswith("_set") and len(col) == 4:
-			if col[1] in globals():
-				sem.Echo("WARNING: Read setting from tgts file and overwrite: " + col[1] + " = " + col[3])
-				globals()[col[1]] = float(col[3])
-			else:
-				sem.Echo("WARNING: Attempted to overwrite " + col[1] + " but variable does not exist!")
-		elif line.startswith("_spos"):
-			resume["sec"] = int(col[2].split(",")[0])
-			resume["pos"] = int(col[2].split(",")[1])
-		elif line.startswith("_tgt"):
-			targets.append({})
-			branch = None
-		elif line.startswith("_pbr"):
-			savedRun.append([{},{}])
-			branch = 0
-		elif line.startswith("_nbr"):
-			branch = 1
-		elif line.startswith("_geo"):
-			geoPoints.append({})
-			branch = "geo"
-		else:
-			if branch is None:
-				targets[-1][col[0]] = col[2]
-			elif branch == "geo":
-				geoPoints[-1][col[0]] = float(col[2])
-			else:
-				savedRun[-1][branch][col[0]] = col[2]
-	if savedRun == []: savedRun = False
-	return targets, savedRun, resume, geoPoints
+def calcStretch(tilt, refTilt):									# matrix to stretch reference image perpendicular to tilt axis (in buffer [row, col] coords)
+	factor = np.cos(np.radians(tilt)) / np.cos(np.radians(refTilt))
+	axis = np.linalg.inv(c2ssMatrix) @ np.array([0, 1])						# camera direction perpendicular to tilt axis
+	axis = np.array([axis[1], axis[0]]) / np.linalg.norm(axis)
+	return np.linalg.inv(np.identity(2) + (factor - 1) * np.outer(axis, axis))			# affine_transform maps output to input coords, hence inverse
+
+def stretchBuffer(buffer, matrix):
+	image = np.asarray(sem.bufferImage(buffer))
+	center = (np.array(image.shape) - 1) / 2
+	stretched = ndimage.affine_transform(image, matrix, offset=center - matrix @ center, order=1, prefilter=False, cval=np.mean(image), output=image.dtype)
+	sem.PutImageInBuffer(stretched, buffer, stretched.shape[1], stretched.shape[0], buffer)
 
 def updateTargets(fileName, targets, position=[], sec=0, pos=0):
-	output = ""
+	settings = {}
 	if sec > 0 or pos > 0:
-		output += "_set startTilt = " + str(startTilt) + "\n"
-		output += "_set minTilt = " + str(minTilt) + "\n"
-		output += "_set maxTilt = " + str(maxTilt) + "\n"
-		output += "_set step = " + str(step) + "\n"
-		output += "_set pretilt = " + str(pretilt) + "\n"
-		output += "_set rotation = " + str(rotation) + "\n"
-		output += "_spos = " + str(sec) + "," + str(pos) + "\n" * 2
-	for pos in range(len(targets)):
-		output += "_tgt = " + str(pos + 1).zfill(3) + "\n"
-		for key in targets[pos].keys():
-			output += key + " = " + targets[pos][key] + "\n"
-		if position != []:
-			output += "_pbr" + "\n"
-			for key in position[pos][1].keys():
-				output += key + " = " + str(position[pos][1][key]).strip("[]").replace(" ","") + "\n"
-			output += "_nbr" + "\n"
-			for key in position[pos][2].keys():
-				output += key + " = " + str(position[pos][2][key]).strip("[]").replace(" ","") + "\n"		
-		output += "\n"
-	with open(fileName, "w") as f:
+		settings = {"startTilt": startTilt, "minTilt": minTilt, "maxTilt": maxTilt, "step": step, "pretilt": pretilt, "rotation": rotation}
+	savedRun = [[position[i][1], position[i][2]] for i in range(len(targets))] if position != [] else False
+	tgtsFile.writeTargets(fileName, targets, savedRun=savedRun, resume={"sec": sec, "pos": pos}, settings=settings, version=tgtsFormat)
+
+def geoBasis(x, y):										# terms of paraboloid z = a + b * x + c * y + d * (x**2) + e * (y**2) + f * x * y (first 3 terms for plane)
+	return np.array([np.ones_like(x), x, y, x**2, y**2, x * y], dtype=float)
+
+def geoUpdate(x, y, z):											# add height estimate to running normal equations unless it is an outlier
+	if geoModel["fits"] > 0:
+		res = z - geoBasis(x, y) @ geoModel["p"]
+		scale = max(0.1, 1.4826 * np.median(np.abs(geoModel["res"]))) if len(geoModel["res"]) > 0 else geoModel["rmse"] + 0.1
+		if abs(res) > geoOutlier * scale:
+			geoModel["rejected"] += 1
+			return False
+		geoModel["res"].append(res)
+		if len(geoModel["res"]) > 100:
+			geoModel["res"].pop(0)
+	a = geoBasis(x, y)
+	geoModel["AtA"] += np.outer(a, a)
+	geoModel["Atb"] += a * z
+	geoModel["btb"] += z**2
+	geoModel["n"] += 1
+	return True
+
+def refineGeometry():											# solve normal equations and apply change of fitted heights to z0 of all targets (also used as prior of z0 fits)
+	n = geoModel["n"]
+	terms = 6 if n >= parabolTh else 3
+	p = np.zeros(6)
+	p[:terms] = np.linalg.lstsq(geoModel["AtA"][:terms, :terms], geoModel["Atb"][:terms], rcond=None)[0]
+	rmse = np.sqrt(max(0, geoModel["btb"] - 2 * p @ geoModel["Atb"] + p @ geoModel["AtA"] @ p) / n)
+	geoModel["p"] = p
+	geoModel["rmse"] = rmse
+	geoModel["fits"] += 1
+
+	zs = p[1:] @ geoBasis(*geoCoords)[1:]								# height of each target without constant offset (focus offsets are not a geometry problem)
+	if geoModel["base"] is None:									# z0 before first refinement (initial geometry or z0 of recovered run)
+		geoModel["base"] = [[position[pos][pn]["z0"] for pn in (1, 2)] for pos in range(len(position))]
+	dz = zs - geoModel["applied"]
+	geoModel["applied"] = zs
+	for pos in range(len(position)):
+		for pn in (1, 2):
+			if not position[pos][pn]["skip"]:
+				position[pos][pn]["z0"] += dz[pos]
+	sem.Echo("Refined geometry (" + ("paraboloid" if terms == 6 else "plane") + ") using " + str(n) + " CTF results (" + str(geoModel["rejected"]) + " outliers): RMSE = " + str(round(rmse, 3)) + " | max z0 change = " + str(round(np.max(np.abs(dz)), 3)))
+
+def geoPrior(pos, pn, z0, cov):									# combine z0 fitted to shifts with z0 of geometry model (prior with variance of geometry fit)
+	z0Geo = geoModel["base"][pos][pn - 1] + geoModel["applied"][pos]
+	varGeo = max(0.1, geoModel["rmse"])**2
+	varFit = cov[0, 0] if np.isfinite(cov[0, 0]) else np.inf					# few data points give no covariance
+	if np.isinf(varFit):
+		return z0Geo, np.array([[varGeo]])
+	return (z0 * varGeo + z0Geo * varFit) / (varFit + varGeo), np.array([[varFit * varGeo / (varFit + varGeo)]])
+
+def readCalibration():											# read microscope specific calibration values saved by previous runs
+	calibration = {}
+	if os.path.exists(calibrationFile):
+		with open(calibrationFile) as f:
+			for line in f.readlines():
+				col = line.split("=")
+				if len(col) == 2 and not line.startswith("#"):
+					calibration[col[0].strip()] = float(col[1])
+	return calibration
+
+def writeCalibration(values):										# update calibration file with given values
+	calibration = readCalibration()
+	calibration.update(values)
+	output = "# PACEtomo calibration updated " + datetime.now().strftime("%d.%m.%Y %H:%M:%S") + "\n"
+	for key, value in calibration.items():
+		output += key + " = " + str(value) + "\n"
+	with open(calibrationFile, "w") as f:
 		f.write(output)
 
-def geoPlane(x, a, b):
-	return a * x[0] + b * x[1]
+def parseSetting(name, value):										# convert value to type of setting and check range, returns None if invalid
+	valType, valMin, valMax = settingsSchema[name]
+	value = str(value).strip().strip("\"'")
+	try:
+		if valType == bool:
+			if value.lower() not in ["true", "false", "1", "0", "1.0", "0.0"]:
+				return None
+			return value.lower() in ["true", "1", "1.0"]
+		if valType == str:
+			return value
+		value = float(value)
+		if valType == int:
+			if value != int(value):
+				return None
+			value = int(value)
+	except ValueError:
+		return None
+	if (valMin is not None and value < valMin) or (valMax is not None and value > valMax):
+		return None
+	return value
+
+def describeSetting(name):										# expected type and range of setting for warnings
+	valType, valMin, valMax = settingsSchema[name]
+	return valType.__name__ + ("" if valMin is None else " >= " + str(valMin)) + ("" if valMax is None else " <= " + str(valMax))
+
+def readProfile():											# read settings of microscope profile file as strings
+	profile = {}
+	if os.path.exists(profileFile):
+		with open(profileFile) as f:
+			for line in f.readlines():
+				col = line.split("=", 1)
+				if len(col) == 2 and not line.startswith("#"):
+					profile[col[0].strip()] = col[1].strip()
+	return profile
+
+def loadSettings(overrides=None):										# merge script defaults, microscope profile and tgts file overrides into immutable settings snapshot
+	values = {name: globals()[name] if name in globals() else None for name in settingsSchema.keys()}
+	for name, value in values.items():
+		if value is not None and parseSetting(name, value) is None:
+			sem.Echo("WARNING: Default setting " + name + " = " + str(value) + " is invalid (" + describeSetting(name) + ")!")
+		elif value is not None:
+			values[name] = parseSetting(name, value)
+	for source, entries in [["profile", readProfile()], ["tgts file", overrides]]:
+		for name, value in (entries or {}).items():
+			if name not in settingsSchema.keys():
+				sem.Echo("WARNING: Attempted to overwrite " + name + " from " + source + " but setting does not exist!")
+				continue
+			parsed = parseSetting(name, value)
+			if parsed is None:
+				sem.Echo("WARNING: Ignored invalid setting from " + source + ": " + name + " = " + str(value) + " (expected " + describeSetting(name) + ")")
+				continue
+			sem.Echo("WARNING: Read setting from " + source + " and overwrite: " + name + " = " + str(parsed))
+			values[name] = parsed
+	values["branchsteps"] = max(values["maxTilt"] - values["startTilt"], abs(values["minTilt"] - values["startTilt"])) / 2 / values["step"]	# derived values
+	return namedtuple("Settings", values.keys())(**values)
+
+def changeSettings(**values):										# change settings during the run in snapshot and in globals (read by hot loop)
+	global settings
+	settings = settings._replace(**values)
+	globals().update(values)
+
+def checkSettings():											# warn about settings that were changed as globals without changeSettings
+	for name, value in settings._asdict().items():
+		if globals()[name] is not value and globals()[name] != value:
+			sem.Echo("WARNING: Setting " + name + " was changed from " + str(value) + " to " + str(globals()[name]) + " without changeSettings! The snapshot was updated to the changed value.")
+			changeSettings(**{name: globals()[name]})					# keep the value the hot loop uses, never restore a stale one
+
+def settingsHash(settings):										# hash of all settings to compare runs
+	return hashlib.sha1("\n".join([name + " = " + repr(value) for name, value in settings._asdict().items()]).encode()).hexdigest()
+
+def writeSettings(filename, settings):
+	output = "# PACEtomo settings from " + datetime.now().strftime("%d.%m.%Y %H:%M:%S") + "\n"
+	output += "# hash = " + settingsHash(settings) + "\n"
+	for name, value in settings._asdict().items():
+		output += name + " = " + str(value) + "\n"
+	with open(filename + "_settings.txt", "w") as f:
+		f.write(output)
 
-def geoPara(x, a, b, c, d, e):
-	return a * x[0] + b * x[1] + c * (x[0]**2) + d * (x[1]**2) + e * x[0] * x[1]
+def slopeUpdate(x, y):											# add measured defocus error to running linear regression vs tilt
+	slopeModel["n"] += 1
+	slopeModel["Sx"] += x
+	slopeModel["Sy"] += y
+	slopeModel["Sxx"] += x**2
+	slopeModel["Sxy"] += x * y
+	slopeModel["Syy"] += y**2
+
+def refineSlope():											# calculate focus slope from regression and apply it if it is reliable
+	n = slopeModel["n"]
+	varX = slopeModel["Sxx"] - slopeModel["Sx"]**2 / n
+	if n < 10 or varX < 100 * n:									# need at least 10 points and standard deviation of tilt angles of at least 10 degrees
+		return
+	slope = (slopeModel["Sxy"] - slopeModel["Sx"] * slopeModel["Sy"] / n) / varX
+	ss = slopeModel["Syy"] - slopeModel["Sy"]**2 / n - slope**2 * varX
+	error = np.sqrt(max(0, ss) / (n - 2) / varX)
+	if error < 0.002:										# only apply slope when standard error is below 0.002 microns per degree
+		changeSettings(focusSlope=-slope)							# defocus error is corrected by the opposite slope
+		writeCalibration({"focusSlope": round(focusSlope, 5)})
+		sem.Echo("Refined focus slope using " + str(n) + " CTF results: " + str(round(focusSlope, 5)) + " +/- " + str(round(error, 5)) + " microns per degree")
+
+def processCtf(pos, pn, tilt, realTilt, ctfDefocus, focuscorrection, focusctrl):			# use reliable CTF result to refine geometry, focus slope and focus of target
+	error = ctfDefocus - position[pos][pn]["tgtDefocus"] + focusctrl					# defocus error without focus controller corrections applied until this image
+	if geoRefine:
+		height = error / np.cos(np.radians(realTilt))						# defocus error translated to height offset at this tilt
+		if not geoUpdate(geoCoords[0][pos], geoCoords[1][pos], height):
+			sem.Echo("[" + str(pos + 1) + "] CTF result is an outlier and was not used to refine the geometry.")
+	if focusSlopeCal:
+		slopeUpdate(tilt - startTilt, error - focuscorrection)					# defocus error without applied focus slope correction
+	if focusCtrl:
+		controlFocus(pos, pn, tilt, error)
+	if addAF and afTol > 0:
+		afState[pn]["ctf"].append(error - focusctrl)						# defocus error of image (includes focus controller corrections)
+
+def controlFocus(pos, pn, tilt, error):								# update running average of defocus error of target and apply bounded correction to its focus
+	branches = (1, 2) if tilt == startTilt else (pn, )						# start tilt image is shared by both branches
+	for b in branches:
+		residual = error - position[pos][b]["focusCtrl"]					# remove corrections already applied (CTF results of ctfWorker arrive later)
+		if abs(residual) > focusCtrlLimit:
+			sem.Echo("[" + str(pos + 1) + "] CTF defocus error of " + str(round(residual, 2)) + " microns is too large and was not used to correct the focus.")
+			return
+		position[pos][b]["focusErr"] = (1 - focusWeight) * position[pos][b]["focusErr"] + focusWeight * residual
+		correction = float(np.clip(position[pos][b]["focusErr"], -focusCtrlMax, focusCtrlMax))
+		position[pos][b]["focus"] -= correction
+		position[pos][b]["focusErr"] -= correction						# corrected part of error is not corrected again
+		position[pos][b]["focusCtrl"] += correction
+	sem.Echo("[" + str(pos + 1) + "] Focus control: error = " + str(round(residual, 3)) + " | correction = " + str(round(correction, 3)) + " | total = " + str(round(position[pos][pn]["focusCtrl"], 3)))
+
+def tiltUpdate(move, stepSize, error):								# add tracking error after tilt move to running linear regression vs step size
+	model = tiltModel[move]
+	if model["n"] >= tiltModelMax:									# halve weight of old data to follow changes of the stage
+		for key in model.keys():
+			model[key] /= 2
+	model["n"] += 1
+	model["Sx"] += stepSize
+	model["Sy"] += error
+	model["Sxx"] += stepSize**2
+	model["Sxy"] += stepSize * error
+
+def tiltError(move, stepSize):										# predicted tracking error [microns] (95th percentile) after tilt move of step size, None if not enough data
+	model = tiltModel[move]
+	n = model["n"]
+	if n < 3:
+		return None
+	varX = model["Sxx"] - model["Sx"]**2 / n
+	slope = (model["Sxy"] - model["Sx"] * model["Sy"] / n) / varX if varX > 0.25 * n else 0	# only fit step dependence if step sizes vary by more than 0.5 degrees
+	mean = (model["Sy"] - slope * model["Sx"]) / n + slope * stepSize
+	return 2 * max(0, mean)										# length of 2D error is roughly Rayleigh distributed, 95th percentile is about twice the mean
+
+def skipBacklash(angle, pn):										# backlash model predicts that error of direct tilt move to angle can be absorbed by alignment
+	global backlashSkipped
+	current = sem.ReportTiltAngle()
+	direction = 1 if angle > current else -1
+	error = tiltError("tiltPos" if direction > 0 else "tiltNeg", abs(angle - current))
+	if error is not None and direction != approach[pn]:						# previous images of branch were approached from other side of backlash
+		error += tiltOffset
+	if error is not None and error < backlashTol:
+		backlashSkipped += 1
+		return True
+	return False
+
+def tiltStage(angle, backlash, pn):									# tilt to angle (backlash: approach angle from lower tilt), returns type and step size of move
+	current = sem.ReportTiltAngle()
+	move = "tiltPos" if angle > current else "tiltNeg"
+	if backlash and backlashModel and skipBacklash(angle, pn):
+		backlash = False
+	sem.TiltTo(angle)
+	if backlash:
+		sem.TiltBy(-step)
+		sem.TiltTo(angle)
+		move += "BL"
+	approach[pn] = 1 if backlash or angle > current else -1
+	return move, abs(angle - current)
+
+def startWorker(script, args):										# start worker script in a separate Python process running in the background
+	workerFile = os.path.join(workerDir, script)
+	if not os.path.exists(workerFile):
+		sem.Echo("WARNING: Worker script " + workerFile + " not found! Check your workerDir setting.")
+		return None
+	with open(os.path.splitext(runFileName)[0] + "_" + os.path.splitext(script)[0] + ".log", "a") as log:
+		try:
+			worker = subprocess.Popen([pythonExe, workerFile] + [str(arg) for arg in args], cwd=curDir, stdout=log, stderr=subprocess.STDOUT)
+		except OSError as err:
+			sem.Echo("WARNING: " + script + " could not be started: " + str(err))
+			return None
+	sem.Echo("Started " + script + " in background (PID: " + str(worker.pid) + ").")
+	return worker
+
+def findRunFiles(folder, fileStem):									# run files of tgts file from registry (indexed lookup) or from folder
+	if registry and runRegistry is not None:
+		try:
+			db = runRegistry.connect()
+			runFiles = runRegistry.findRunFiles(db, os.path.join(folder, fileStem + ".txt"))
+			db.close()
+			nextRun = os.path.join(folder, fileStem + "_run" + str(tgtsFile.runNumber(runFiles[-1]) + 1).zfill(2) + ".txt") if len(runFiles) > 0 else ""
+			if len(runFiles) > 0 and not os.path.exists(nextRun):				# registry is complete if there is no newer run file
+				return runFiles
+		except Exception as err:
+			sem.Echo("WARNING: Registry could not be read (" + str(err) + ").")
+	return tgtsFile.findRunFiles(folder, fileStem)
+
+def updateRegistry(function, *args):									# registry errors must not stop the run
+	if not registry:
+		return None
+	try:
+		return function(registryDB, *args)
+	except Exception as err:
+		changeSettings(registry=False)
+		sem.Echo("WARNING: Registry could not be updated and was deactivated (" + str(err) + ").")
+		try:
+			registryDB.close()
+		except Exception:
+			pass
+		return None
+
+def closeSeries(pos):											# list tilt series that will not receive more images for background workers
+	if targets[pos]["tsfile"] not in closedSeries:
+		closedSeries.append(targets[pos]["tsfile"])
+		with open(closedFileName, "a") as f:
+			f.write(targets[pos]["tsfile"] + "\n")
+
+def readCtfWorker():											# read new CTF results written by ctfWorker and use results of images of this run
+	global ctfProcess
+	if ctfProcess is not None and ctfProcess.poll() is not None:					# results written before the worker stopped are still used
+		sem.Echo("WARNING: ctfWorker stopped (exit code " + str(ctfProcess.returncode) + ")! Images taken from now on will not get CTF results for geoRefine, focusSlopeCal and focusCtrl.")
+		ctfProcess = None
+	for pos in range(len(targets)):
+		if len(ctfPending[pos]) == 0:
+			continue
+		resultFile = os.path.join(curDir, os.path.splitext(targets[pos]["tsfile"])[0] + "_ctf.txt")
+		lines, ctfOffset[pos] = tgtsFile.readNewLines(resultFile, ctfOffset[pos])
+		for line in lines:
+			col = line.split()
+			if len(col) < 3 or line.startswith("#") or int(col[0]) not in ctfPending[pos].keys():
+				continue
+			pn, tilt, realTilt, focuscorrection, focusctrl = ctfPending[pos].pop(int(col[0]))
+			if float(col[2]) < fitLimit:
+				processCtf(pos, pn, tilt, realTilt, float(col[1]), focuscorrection, focusctrl)
+
+def readMdocHistory(fileName):										# get tilt angle, specimen shift and eucentric offset of all sections from extended mdoc file for both branches
+	sections = []
+	if not os.path.exists(fileName):
+		return None
+	with open(fileName) as f:
+		for line in f.readlines():
+			col = line.strip().split(" = ")
+			if line.startswith("[ZValue"):
+				sections.append({})
+			elif len(sections) > 0 and len(col) == 2 and col[0] in ["TiltAngle", "SpecimenShift", "EucentricOffset"]:
+				sections[-1][col[0]] = [float(val) for val in col[1].split()]
+	sections = [sec for sec in sections if len(sec.keys()) == 3]
+	if len(sections) == 0:
+		return None
+	history = [None, [], []]
+	for sec in sections:										# start tilt image is first image of both branches
+		if sec["TiltAngle"][0] >= sections[0]["TiltAngle"][0] - 0.1:
+			history[1].append([sec["TiltAngle"][0], sec["SpecimenShift"][1], sec["EucentricOffset"][0]])
+		if sec["TiltAngle"][0] <= sections[0]["TiltAngle"][0] + 0.1:
+			history[2].append([sec["TiltAngle"][0], sec["SpecimenShift"][1], sec["EucentricOffset"][0]])
+	return history
+
+def realignTracking(pn, angle):										# align tracking target to its last image of branch and apply offset to all targets of branch
+	sem.TiltTo(angle)
+	sem.OpenOldFile(targets[0]["tsfile"])
+	sem.ReadFile(position[0][pn]["sec"], "O")
+	sem.CloseFile()
+	sem.SetImageShift(position[0][pn]["ISXset"], position[0][pn]["ISYset"])
+	offset = np.zeros(2)
+	for attempt in range(3):
+		sem.R()
+		sem.AlignTo("O")
+		bufIS = np.array(sem.ReportISforBufferShift())
+		offset += bufIS
+		if np.linalg.norm(is2ssMatrix @ bufIS) < 0.05:						# repeat until residual shift is below 50 nm
+			break
+	for pos in range(len(position)):
+		position[pos][pn]["ISXset"] += offset[0]
+		position[pos][pn]["ISYset"] += offset[1]
+	shift = is2ssMatrix @ offset
+	sem.Echo("Realigned tracking target on " + ("positive" if pn == 1 else "negative") + " branch: " + str(round(shift[0], 3)) + " | " + str(round(shift[1], 3)) + " microns")
+
+def initActive():											# sets of targets still collected on each branch
+	for pn in (1, 2):
+		active[pn] = set([pos for pos in range(len(position)) if not position[pos][pn]["skip"]])
+
+def abortBranch(pos, pn, message="", reason=""):							# stop collecting target on branch, remove it from active targets and save reason to run file
+	position[pos][pn]["skip"] = True
+	position[pos][pn]["reason"] = reason
+	active[pn].discard(pos)
+	if message != "":
+		sem.Echo("WARNING: Target [" + str(pos + 1) + "] " + message + " This branch will be aborted.")
+
+def scoreAlignment(pos, pn, shift):									# update alignment quality of target with alignment shift [microns] relative to prediction
+	clamped = alignLimit > 0 and np.linalg.norm(shift) >= 0.99 * alignLimit			# peak was limited by LimitNextAutoAlign
+	if alignLimit > 0:
+		score = 0 if clamped else max(0, 1 - np.linalg.norm(shift) / alignLimit)
+	else:
+		score = 1
+	if position[pos][pn]["aliCount"] == 0:
+		position[pos][pn]["aliScore"] = score
+	else:
+		position[pos][pn]["aliScore"] = (1 - aliWeight) * position[pos][pn]["aliScore"] + aliWeight * score
+	position[pos][pn]["aliCount"] += 1
+	position[pos][pn]["aliClamps"] = position[pos][pn]["aliClamps"] + 1 if clamped else 0
+	return score
+
+def focusUncertainty(pn):										# predicted focus uncertainty [microns] of branch since last autofocus and its main source
+	elapsed = (sem.ReportClock() - afState[pn]["time"]) / 60
+	terms = {
+		"model": afState[pn]["model"],									# accumulated uncertainty of focus changes from z0 fit of tracking target
+		"ctf": abs(np.mean(afState[pn]["ctf"])) if len(afState[pn]["ctf"]) >= afMinCtf else 0,	# common defocus error of CTF results
+		"drift": afDrift * elapsed									# focus drift since last autofocus
+	}
+	return np.sqrt(np.sum(np.square(list(terms.values())))), max(terms, key=terms.get), elapsed
+
+def autofocus(pn, reason):										# measure defocus on tracking target and correct focus of all targets on branch
+	global afDrift
+	sem.G(-1)
+	defocus, *_ = sem.ReportAutoFocus()
+	focuserror = float(defocus) - targetDefocus
+	for i in range(0, len(position)):
+		position[i][pn]["focus"] -= focuserror
+	elapsed = (sem.ReportClock() - afState[pn]["time"]) / 60
+	if elapsed > 1:
+		afDrift = (1 - afWeight) * afDrift + afWeight * abs(focuserror) / elapsed		# all focus error is attributed to drift (conservative)
+	afState[pn] = {"time": sem.ReportClock(), "model": 0, "ctf": []}
+	afCount[reason] += 1
+	sem.Echo("Autofocus (" + reason + "): focus error = " + str(round(focuserror, 3)) + " microns")
+
+def saveImage():											# save image in buffer A to current file (savePipeline: only copy it to saveBuffer and save it later with finishSave)
+	global pendingSave
+	if not savePipeline:
+		sem.S()
+		return
+	finishSave()											# only one image can be pending
+	sem.Copy("A", saveBuffer)
+	pendingSave = {"file": int(sem.ReportFileNumber()), "sec": int(sem.ReportFileZsize()), "autodoc": [], "close": False, "pos": None}
+
+def finishSave():											# save pending image to its file, add its autodoc entries and close the file if it is complete, returns time [s] it took
+	global pendingSave
+	if pendingSave is None:
+		return 0
+	timeSave = sem.ReportClock()
+	current = int(sem.ReportFileNumber())
+	switched = current != pendingSave["file"]
+	if switched:
+		sem.SwitchToFile(pendingSave["file"])
+	sem.S(saveBuffer)
+	if len(pendingSave["autodoc"]) > 0:
+		for key, value in pendingSave["autodoc"]:
+			sem.AddToAutodoc(key, value)
+		sem.WriteAutodoc()
+	if pendingSave["close"]:
+		sem.CloseFile()
+		if current > pendingSave["file"]:						# file numbers after closed file move down
+			current -= 1
+	if switched:
+		sem.SwitchToFile(current)
+	if pendingSave["pos"] is not None:							# run file and closed series are only updated once image is saved
+		pos = pendingSave["pos"]
+		updateTargets(runFileName, targets, position, pendingSave["sec"], pos)
+		if pos != 0 and position[pos][1]["skip"] and position[pos][2]["skip"]:
+			closeSeries(pos)
+	pendingSave = None
+	return sem.ReportClock() - timeSave
+
+def remainingImages(curPN, tilt, queued):								# images still planned for active targets after current image
+	remaining = queued
+	for pn in (1, 2):
+		branchTilt = tilt if pn == curPN else (plustilt if pn == 1 else minustilt)
+		steps = int(round(((maxTilt - branchTilt) if pn == 1 else (branchTilt - minTilt)) / step))
+		perTilt = len(active[pn]) + (1 if len(active[pn]) > 0 and 0 not in active[pn] else 0)	# tracking target is imaged as long as branch has active targets
+		remaining += perTilt * max(0, steps)
+	return remaining
+
+def writeTelemetry():											# append collected telemetry rows to telemetry file
+	global telemetryRows
+	if len(telemetryRows) > 0:
+		with open(telemetryFileName, "a") as f:
+			if f.tell() == 0:
+				f.write(",".join([col + ":" + dtype for col, dtype in telemetryColumns]) + "\n")
+			f.write("".join([",".join([str(round(value, 5)) if isinstance(value, float) else str(value) for value in row]) + "\n" for row in telemetryRows]))
+		telemetryRows = []
 
 def Tilt(tilt):
 	def calcSSChange(x, z0):									# x = array(tilt, n0) => needs to be one array for optimize.curve_fit()
@@ -211,7 +685,7 @@ def Tilt(tilt):
 		return z0 * (np.cos(np.radians(x[0])) - np.cos(np.radians(x[0] - increment))) + x[1] * (np.sin(np.radians(x[0])) - np.sin(np.radians(x[0] - increment)))
 
 	def setTrack():
-		global trackMag, origMag
+		global origMag
 		if trackDefocus < maxDefocus:
 			sem.SetDefocus(position[0][pn]["focus"] + trackDefocus - targetDefocus)
 		if trackExpTime > 0:
@@ -227,7 +701,7 @@ def Tilt(tilt):
 			while sem.ReportMag()[0] == origMag:						# has to be checked, because Rec is sometimes not updated (JEOL)
 				if attempt >= 10:
 					sem.Echo("WARNING: Magnification could not be changed. Continuing with the same magnification for all tilt series.")
-					trackMag = 0
+					changeSettings(trackMag=0)
 					break
 				sem.SetMag(trackMag)
 				sem.GoToLowDoseArea("R")
@@ -244,20 +718,18 @@ def Tilt(tilt):
 				sem.SetMag(origMag)
 				sem.GoToLowDoseArea("R")
 
-	global recover #, trackMag, origMag
+	global recover, imagesDone #, trackMag, origMag
+
+	timeTilt = sem.ReportClock()
 
-	sem.TiltTo(tilt)
 	if tilt < startTilt:
 		increment = -step
-		sem.TiltBy(-step)
-		sem.TiltTo(tilt)
 		pn = 2
+		tiltMove = tiltStage(tilt, True, pn)
 	else:
-		if slowTilt and tilt > startTilt:							# on bad stages, better to do backlash as well to enhance accuracy
-			sem.TiltBy(-step)
-			sem.TiltTo(tilt)
 		increment = step
 		pn = 1
+		tiltMove = tiltStage(tilt, slowTilt and tilt > startTilt, pn)				# on bad stages, better to do backlash as well to enhance accuracy
 
 	sem.Delay(delayTilt, "s")
 	realTilt = float(sem.ReportTiltAngle())
@@ -265,6 +737,11 @@ def Tilt(tilt):
 	if zeroExpTime > 0 and tilt == startTilt:
 		sem.SetExposure("R", zeroExpTime)
 
+	stretchMatrix = None
+	if stretchAli and tilt != startTilt:								# same stretch for all targets since all references were taken at the previous tilt
+		refTilt = position[0][pn]["angles"][-1] if len(position[0][pn]["angles"]) > 0 else tilt - increment
+		stretchMatrix = calcStretch(realTilt, refTilt)
+
 	if recover:
 		# preview align to last tracking TS
 		sem.OpenOldFile(targets[0]["tsfile"])
@@ -289,13 +766,12 @@ def Tilt(tilt):
 	else:
 		posStart = 0
 
-	for pos in range(posStart, len(position)):
+	queue = [pos for pos in sorted(active[pn] | {0}) if pos >= posStart]				# tracking target is always needed for tracking
+	for q, pos in enumerate(queue):
 		sem.Echo("")
 		sem.Echo("Target " + str(pos + 1) + " / " + str(len(position)) + ":")
 		sem.SetStatusLine(2, "Target: " + str(pos + 1) + " / " + str(len(position)))
-		if pos != 0 and position[pos][pn]["skip"]: 
-			sem.Echo("[" + str(pos + 1) + "] was skipped on this branch.")
-			continue
+		timeStart = time.perf_counter()
 		if tilt != startTilt:
 			sem.OpenOldFile(targets[pos]["tsfile"])
 			sem.ReadFile(position[pos][pn]["sec"], "O")					# read last image of position for AlignTo
@@ -319,23 +795,30 @@ def Tilt(tilt):
 		SSYprev = position[pos][pn]["SSY"]
 		SSYpred = position[pos][pn]["SSY"] + SSchange
 
+		sem.SetImageShift(position[pos][pn]["ISXset"], position[pos][pn]["ISYset"])
+		sem.ImageShiftByMicrons(0, SSchange)
+		timeSave = finishSave()									# save previous image while image shift settles
+
 		focuscorrection = focusSlope * (tilt - startTilt)
 		position[pos][pn]["focus"] += focuscorrection
 		position[pos][pn]["focus"] -= focuschange
 
 		sem.SetDefocus(position[pos][pn]["focus"])
-		sem.SetImageShift(position[pos][pn]["ISXset"], position[pos][pn]["ISYset"])
-		sem.ImageShiftByMicrons(0, SSchange)
 
 ### Autofocus (optional) and tracking TS settings
-		if pos == 0:
-			if addAF and (tilt - startTilt) % (2 * increment) != 0 and abs(tilt - startTilt) > step:
-				sem.G(-1)
-				defocus, *_ = sem.ReportAutoFocus()
-				focuserror = float(defocus) - targetDefocus
-				for i in range(0, len(position)):
-					position[i][pn]["focus"] -= focuserror
+		afReason = ""
+		if pos == 0 and addAF and tilt != startTilt:
+			if afTol == 0:
+				if (tilt - startTilt) % (2 * increment) != 0 and abs(tilt - startTilt) > step:
+					afReason = "schedule"
+			else:
+				uncertainty, source, elapsed = focusUncertainty(pn)
+				if uncertainty > afTol and elapsed >= afInterval:
+					afReason = source
+			if afReason != "":
+				autofocus(pn, afReason)
 				sem.SetDefocus(position[pos][pn]["focus"])
+		if pos == 0:
 
 			setTrack()
 
@@ -343,13 +826,15 @@ def Tilt(tilt):
 		if checkDewar: checkFilling()
 		if beamTiltComp: 
 			sem.AdjustBeamTiltforIS()
-		sem.Delay(delayIS, "s")
+		sem.Delay(max(0, delayIS - timeSave), "s")						# time spent saving previous image counts towards delay
 		sem.R()
-		sem.S()
+		saveImage()
 
 		bufISXpre = 0 										# only non 0 if two tracking images are taken
 		bufISYpre = 0
 		if tilt != startTilt or (not tgtPattern and "tgtfile" in targets[pos].keys()):		# align to previous image if it exists 
+			if stretchMatrix is not None:
+				stretchBuffer("O", stretchMatrix)
 			if pos != 0: 
 				sem.LimitNextAutoAlign(alignLimit)					# gives maximum distance for AlignTo to avoid runaway tracking
 			sem.AlignTo("O")
@@ -358,11 +843,13 @@ def Tilt(tilt):
 				if abs(ASX) > alignLimit * 1000 or abs(ASY) > alignLimit * 1000:
 					bufISXpre, bufISYpre = sem.ReportISforBufferShift()		# have to be added only to ISset but not ISali (since ali only considers the IS chain of ali images)
 					sem.R()
-					sem.S()
+					saveImage()
 					sem.AlignTo("O")
 
 		bufISX, bufISY = sem.ReportISforBufferShift()
 		sem.ImageShiftByUnits(position[pos][pn]["ISXali"], position[pos][pn]["ISYali"])		# remove accumulated buffer shifts to calculate alignment to initial startTilt image
+		if backlashModel and pos == 0 and tilt != startTilt and len(position[0][pn]["shifts"]) > 0 and not recover:
+			tiltUpdate(*tiltMove, np.linalg.norm(is2ssMatrix @ np.array([bufISX + bufISXpre, bufISY + bufISYpre])))	# tracking shift includes stage error of tilt move
 
 		if beamTiltComp: 
 			sem.RestoreBeamTilt()
@@ -391,16 +878,21 @@ def Tilt(tilt):
 						#correctedFocus = position[pos][pn]["focus"] - np.tan(np.radians(realTilt)) * montSSY
 
 						sem.SetDefocus(correctedFocus)
+					timeSave = finishSave()
 					if beamTiltComp: 
 						sem.AdjustBeamTiltforIS()
-					sem.Delay(delayIS, "s")
+					sem.Delay(max(0, delayIS - timeSave), "s")
 					sem.R()
-					sem.S()
+					saveImage()
 
 					sem.ImageShiftByPixels(-montX, -montY)
 					if beamTiltComp: 
 						sem.RestoreBeamTilt()
-					sem.CloseFile()
+					if savePipeline:
+						pendingSave["close"] = True
+					else:
+						sem.CloseFile()
+			finishSave()									# tilt series file has to be current file again
 
 		position[pos][pn]["focus"] -= focuscorrection						# remove correction or it accumulates
 
@@ -433,15 +925,21 @@ def Tilt(tilt):
 			position[pos][2]["ISYali"] += bufISY
 
 		aErrX, aErrY = is2ssMatrix @ np.array([position[pos][pn]["ISXali"], position[pos][pn]["ISYali"]])
+		if pos != 0 and tilt != startTilt:
+			aliScore = scoreAlignment(pos, pn, is2ssMatrix @ np.array([bufISX, bufISY]))
 
 		sem.Echo("[" + str(pos + 1) + "] Prediction: y = " + str(round(SSYpred, 3)) + " | z = " + str(round(position[pos][pn]["focus"], 3)) + " | z0 = " + str(round(position[pos][pn]["z0"], 3)))
 		sem.Echo("[" + str(pos + 1) + "] Reality: y = " + str(round(position[pos][pn]["SSY"], 3)))
 		sem.Echo("[" + str(pos + 1) + "] Focus change: " + str(round(focuschange, 3)) + " | Focus correction: " + str(round(focuscorrection, 3)))
 		sem.Echo("[" + str(pos + 1) + "] Alignment error: x = " + str(round(aErrX * 1000)) + " nm | y = " + str(round(aErrY * 1000)) + " nm")		
+		if (aliQualityMin > 0 or aliClampMax > 0) and pos != 0 and tilt != startTilt:
+			sem.Echo("[" + str(pos + 1) + "] Alignment quality: " + str(round(aliScore, 2)) + " (average: " + str(round(position[pos][pn]["aliScore"], 2)) + ")")
 
 ### Calculate new z0
+		timePred = time.perf_counter()
 
 		ddy = position[pos][pn]["SSY"] - SSYprev
+		predicted = 1										# SSYpred was predicted from previous image of branch
 		if (tilt == startTilt or
 				(ignoreNegStart and pn == 2 and len(position[pos][pn]["shifts"]) == 0) or
 				recover or
@@ -450,6 +948,7 @@ def Tilt(tilt):
 				(resumePN == 2 and tilt == resumeMinus - step and pos < posResumed) or
 				(resumePN == 2 and tilt == resumePlus + step)):		
 				# ignore shift if first image or first shift of second branch or first image after resuming run (all possible conditions)
+			predicted = 0
 			ddy = calcSSChange([realTilt, position[pos][pn]["n0"]], position[pos][pn]["z0"])
 
 		position[pos][pn]["shifts"].append(ddy)
@@ -461,7 +960,16 @@ def Tilt(tilt):
 
 		position[pos][pn]["z0"], cov = optimize.curve_fit(calcSSChange, np.vstack((position[pos][pn]["angles"], [position[pos][pn]["n0"] for i in range(0, len(position[pos][pn]["angles"]))])), position[pos][pn]["shifts"], p0=(position[pos][pn]["z0"]))
 		position[pos][pn]["z0"] = position[pos][pn]["z0"][0]
-
+		if geoRefine and geoModel["base"] is not None:						# z0 fit alone would discard geometry refinement
+			position[pos][pn]["z0"], cov = geoPrior(pos, pn, position[pos][pn]["z0"], cov)
+		if pos == 0 and addAF and afTol > 0:
+			z0Error = np.sqrt(cov[0, 0]) if np.isfinite(cov[0, 0]) else afZ0Prior			# few data points give no covariance
+			afState[pn]["model"] += z0Error * abs(np.cos(np.radians(realTilt + increment)) - np.cos(np.radians(realTilt)))	# uncertainty of next focus change
+		timePred = time.perf_counter() - timePred
+
+		timeCtf = time.perf_counter()
+		ctfDefocus = np.nan
+		focusctrl = position[pos][pn]["focusCtrl"]							# focus controller correction included in this image
 		if doCtfFind:
 			cfind = sem.CtfFind("A", (min(maxDefocus, trackDefocus) - 2), min(-0.2, minDefocus + 2))
 			sem.Echo("[" + str(pos + 1) + "] CtfFind: " + str(round(cfind[0], 3)) + " microns (" + str(round(cfind[-1], 2)) + " A)")
@@ -470,62 +978,108 @@ def Tilt(tilt):
 			cplot = sem.Ctfplotter("A", (min(maxDefocus, trackDefocus) - 2), min(-0.2, minDefocus + 2), 1, 0, pretilt)
 			sem.Echo("[" + str(pos + 1) + "] Ctfplotter: " + str(round(cplot[0], 3)) + " microns")
 
-		if geoRefine and tilt == startTilt:
-			if doCtfPlotter:
-				geo[0].append(position[pos][pn]["SSX"])
-				geo[1].append(position[pos][pn]["SSY"])
-				geo[2].append(cplot[0])
-			elif doCtfFind and len(cfind) > 5:
-				if cfind[5] < fitLimit:							# save vectors for geoRefine only if CTF fit has reasonable resolution
-					geo[0].append(position[pos][pn]["SSX"])
-					geo[1].append(position[pos][pn]["SSY"])
-					geo[2].append(cfind[0])
-
-		position[pos][pn]["sec"] = int(sem.ReportFileZsize()) - 1				# save section number for next alignment
-
-		# progress = collected images * (positions - skipped positions) + current position - skipped positions scaled assuming homogeneous distribution of skipped positions
-		progress = position[pos][pn]["sec"] * (len(position) - skippedTgts) + pos - skippedTgts * pos / len(position) + 1
-		percent = round(100 * (progress / maxProgress), 1)
+		if doCtfPlotter:
+			ctfDefocus = cplot[0]
+			processCtf(pos, pn, tilt, realTilt, cplot[0], focuscorrection, focusctrl)
+		elif doCtfFind and len(cfind) > 5 and cfind[5] < fitLimit:					# use CtfFind only if CTF fit has reasonable resolution
+			ctfDefocus = cfind[0]
+			processCtf(pos, pn, tilt, realTilt, cfind[0], focuscorrection, focusctrl)
+		timeCtf = time.perf_counter() - timeCtf
+
+		position[pos][pn]["sec"] = pendingSave["sec"] if pendingSave is not None else int(sem.ReportFileZsize()) - 1	# save section number for next alignment
+		if ctfWorker:
+			ctfPending[pos][position[pos][pn]["sec"]] = [pn, tilt, realTilt, focuscorrection, focusctrl]	# remember conditions until ctfWorker result is available
+
+		imagesDone += 1
+		remaining = remainingImages(pn, tilt, len(queue) - q - 1)
+		percent = round(100 * imagesDone / (imagesDone + remaining), 1)
 		bar = '#' * int(percent / 2) + '_' * (50 - int(percent / 2))
-		if percent - resumePercent > 0:
-			remTime = int((sem.ReportClock() - startTime) / (percent - resumePercent) * (100 - percent) / 60)
+		if imagesDone > imagesStart:
+			remTime = int((sem.ReportClock() - startTime) / (imagesDone - imagesStart) * remaining / 60)
 		else:
 			remTime = "?"
 		sem.Echo("Progress: |" + bar + "| " + str(percent) + " % (" + str(remTime) + " min remaining)")
 
 		if extendedMdoc:
-			sem.AddToAutodoc("SpecimenShift", str(position[pos][pn]["SSX"]) + " " + str(position[pos][pn]["SSY"]))
-			sem.AddToAutodoc("EucentricOffset", str(position[pos][pn]["z0"]))
+			autodoc = [("SpecimenShift", str(position[pos][pn]["SSX"]) + " " + str(position[pos][pn]["SSY"])), ("EucentricOffset", str(position[pos][pn]["z0"])), ("AlignmentError", str(aErrX) + " " + str(aErrY))]
 			if doCtfFind:
-				sem.AddToAutodoc("CtfFind", str(cfind[0]))
+				autodoc.append(("CtfFind", str(cfind[0])))
 			if doCtfPlotter:
-				sem.AddToAutodoc("Ctfplotter", str(cplot[0]))
-			sem.WriteAutodoc()
+				autodoc.append(("Ctfplotter", str(cplot[0])))
+			if pendingSave is not None:
+				pendingSave["autodoc"] = autodoc
+			else:
+				for key, value in autodoc:
+					sem.AddToAutodoc(key, value)
+				sem.WriteAutodoc()
 
-		sem.CloseFile()
+		if pendingSave is None:
+			sem.CloseFile()
 
 ### Abort conditions
 		if np.linalg.norm(np.array([position[pos][pn]["SSX"], position[pos][pn]["SSY"]], dtype=float)) > imageShiftLimit - alignLimit:
-			position[pos][pn]["skip"] = True
-			sem.Echo("WARNING: Target [" + str(pos + 1) + "] is approaching the image shift limit. This branch will be aborted.")
+			abortBranch(pos, pn, "is approaching the image shift limit.", "imageShiftLimit")
 
 		if minCounts > 0:
 			meanCounts = sem.ReportMeanCounts()
 			expTime, *_ = sem.ReportExposure("R")
 			if meanCounts / expTime < minCounts:
-				position[pos][pn]["skip"] = True
-				sem.Echo("WARNING: Target [" + str(pos + 1) + "] was too dark. This branch will be aborted.")
+				abortBranch(pos, pn, "was too dark.", "tooDark")
 
 		if tilt >= maxTilt or tilt <= minTilt:
-			position[pos][pn]["skip"] = True
-			if maxTilt - startTilt != abs(minTilt - startTilt):
-				sem.Echo("WARNING: Target [" + str(pos + 1) + "] has reached the final tilt angle. This branch will be aborted.")			
+			abortBranch(pos, pn, "has reached the final tilt angle." if maxTilt - startTilt != abs(minTilt - startTilt) else "", "finalTilt")
 
-		updateTargets(runFileName, targets, position, position[pos][pn]["sec"], pos)	
+		if pos != 0 and not position[pos][pn]["skip"] and position[pos][pn]["aliCount"] >= aliMinCount:
+			if aliQualityMin > 0 and position[pos][pn]["aliScore"] < aliQualityMin:
+				abortBranch(pos, pn, "lost alignment quality (" + str(round(position[pos][pn]["aliScore"], 2)) + " < " + str(aliQualityMin) + ").", "alignmentLost")
+			elif aliClampMax > 0 and position[pos][pn]["aliClamps"] >= aliClampMax:
+				abortBranch(pos, pn, "hit the alignment limit " + str(position[pos][pn]["aliClamps"]) + " times in a row.", "alignmentLost")
+
+		if pendingSave is not None:								# file is closed and run file updated after pending image was saved
+			pendingSave["close"] = True
+			pendingSave["pos"] = pos
+		else:
+			updateTargets(runFileName, targets, position, position[pos][pn]["sec"], pos)	
+			if pos != 0 and position[pos][1]["skip"] and position[pos][2]["skip"]:		# tracking target is only closed at the end
+				closeSeries(pos)
+
+		if registry:
+			registryImages.append((pos + 1, targets[pos]["tsfile"], pn, tilt, time.perf_counter() - timeStart, float(np.hypot(aErrX, aErrY)), position[pos][pn]["reason"]))
+
+		if telemetry:
+			telemetryRows.append([pos + 1, pn, tilt, realTilt, position[pos][pn]["sec"], SSYpred, position[pos][pn]["SSY"], predicted, position[pos][pn]["focus"], focuschange, focuscorrection, position[pos][pn]["focusCtrl"], ctfDefocus, position[pos][pn]["z0"], aErrX, aErrY, position[pos][pn]["aliScore"], abortReasons.index(position[pos][pn]["reason"]), afReasons.index(afReason), position[pos][pn]["dose"], timePred, timeCtf, time.perf_counter() - timeStart])
+
+	finishSave()											# all images of tilt have to be saved before tilting
+
+	if telemetry:
+		writeTelemetry()
+
+	if registry:
+		updateRegistry(runRegistry.addImages, registryRun, registryImages)
+		registryImages.clear()
+
+	if backlashModel and tilt != startTilt:
+		writeCalibration({move + "_" + key: round(value, 6) for move in tiltMoves for key, value in tiltModel[move].items()})
+
+	if ctfWorker:
+		readCtfWorker()
+
+### Refine geometry with all CTF results so far
+	if geoRefine:
+		if geoModel["n"] >= 3:
+			refineGeometry()
+		elif tilt == startTilt:
+			sem.Echo("WARNING: Not enough reliable CTF results (" + str(geoModel["n"]) + ") to refine geometry. Continuing with initial geometry model.")
+
+	if focusSlopeCal:
+		refineSlope()
 
 ### Refine energy filter slit if appropiate
-	if tgtPattern and slitInterval > 0 and (lastSlitCheck - sem.ReportClock() / 60) > slitInterval:
-		checkSlit(np.array([vecB0, vecB1]), size, realTilt, pn)
+	if slitInterval > 0 or slitTol > 0:
+		elapsed = (sem.ReportClock() - lastSlitCheck) / 60
+		tiltTime = (sem.ReportClock() - timeTilt) / 60						# next tilt is assumed to take as long as this one
+		if (slitInterval > 0 and elapsed >= slitInterval) or (slitTol > 0 and slitDrift * (elapsed + tiltTime) > slitTol):
+			checkSlit(realTilt, pn)
 
 	if zeroExpTime > 0 and tilt == startTilt:
 		sem.RestoreCameraSet("R")
@@ -533,24 +1087,8 @@ def Tilt(tilt):
 	if recover:
 		recover = False	
 
-def dumpVars(filename):
-	output = "# PACEtomo settings from " + datetime.now().strftime("%d.%m.%Y %H:%M:%S") + "\n"
-	save = False
-	for var in globals():										# globals() is ordered by creation, start and end points might have to be adjusted if script changes
-		if var == "sem":									# first var after settings vars
-			break
-		if save:
-			output += var + " = " + str(globals()[var]) + "\n"
-		if var == "SEMflush":									# last var before settings vars
-			save = True
-	with open(filename + "_settings.txt", "w") as f:
-		f.write(output)
-
 ######## END FUNCTIONS ########
 
-if (maxTilt > 70 or (minTilt - step) < -70) and sem.IsVariableDefined("warningTiltAngle") == 0:
-	sem.Pause("WARNING: Tilt angles go beyond +/- 70 degrees. Most stage limitations do not allow for symmetrical tilt series with these values!")
-	sem.SetPersistentVar("warningTiltAngle", "")
 if int(sem.ReportAxisPosition("F")[0]) != 0 and sem.IsVariableDefined("warningFocusArea") == 0:
 	sem.Pause("WARNING: Position of Focus area is not 0! Please set it to 0 to autofocus on the tracking target!")
 	sem.SetPersistentVar("warningFocusArea", "")
@@ -559,10 +1097,6 @@ if float(sem.ReportTiltAxisOffset()[0]) == 0 and sem.IsVariableDefined("warningT
 	sem.SetPersistentVar("warningTAOffset", "")
 
 sem.SuppressReports()
-if beamTiltComp:											# check if there is a calibration saved, throws error if not
-	sem.ReportComaVsISmatrix()
-if tgtPattern:												# initialize in case tgts file contains values
-	vecA0 = vecA1 = vecB0 = vecB1 = size = None
 
 ### Find target file
 sem.ReportNavItem()
@@ -573,7 +1107,7 @@ curDir = sem.ReportDirectory()
 
 if fileStem != "" and fileExt == ".txt":
 	tf = sorted(glob.glob(os.path.join(curDir, fileStem + ".txt")))					# find  tgts file
-	tfr = sorted(glob.glob(os.path.join(curDir, fileStem + "_run??.txt")))				# find run files but not copied tgts file
+	tfr = findRunFiles(curDir, fileStem)								# find run files but not copied tgts file
 	tf.extend(tfr)											# only add run files to list of considered files
 	while tf == []:
 		searchInput = sem.YesNoBox("\n".join(["Target file not found! Please choose the directory containing the target file!", "WARNING: All future target files will be searched here!"]))
@@ -582,7 +1116,7 @@ if fileStem != "" and fileExt == ".txt":
 		sem.UserSetDirectory("Please choose the directory containing the target file!")
 		curDir = sem.ReportDirectory()
 		tf = sorted(glob.glob(os.path.join(curDir, fileStem + ".txt")))				# find  tgts file
-		tfr = sorted(glob.glob(os.path.join(curDir, fileStem + "_run??.txt")))			# find run files but not copied tgts file
+		tfr = findRunFiles(curDir, fileStem)							# find run files but not copied tgts file
 		tf.extend(tfr)										# only add run files to list of considered files
 else:
 	sem.OKBox("The navigator item note does not contain a target file. Make sure to setup PACEtomo targets using the selectTargets script!")
@@ -593,10 +1127,16 @@ sem.SaveLogOpenNew(navNote.split("_tgts")[0])
 sem.Echo("PACEtomo Version " + versionPACE)
 sem.ProgramTimeStamps()
 
-with open(tf[-1]) as f:											# open last tgts or tgts_run file
-	targetFile = f.readlines()
+targets, savedRun, resume, overrides, geoPoints = tgtsFile.readTargets(tf[-1])				# read last tgts or tgts_run file (values as strings)
+
+settings = loadSettings(overrides)									# immutable snapshot of settings used for this run
+globals().update(settings._asdict())									# read-only copy for the hot loop, settings adjusted during the run (e.g. focusSlope, pretilt) are changed with changeSettings()
 
-targets, savedRun, resume, geoPoints = parseTargets(targetFile)
+if (maxTilt > 70 or (minTilt - step) < -70) and sem.IsVariableDefined("warningTiltAngle") == 0:
+	sem.Pause("WARNING: Tilt angles go beyond +/- 70 degrees. Most stage limitations do not allow for symmetrical tilt series with these values!")
+	sem.SetPersistentVar("warningTiltAngle", "")
+if beamTiltComp:											# check if there is a calibration saved, throws error if not
+	sem.ReportComaVsISmatrix()
 
 ### Recovery data
 recoverInput = 0
@@ -611,14 +1151,14 @@ if savedRun != False and (resume["sec"] > 0 or resume["pos"] > 0):
 
 		stageX, stageY, stageZ = sem.ReportStageXYZ()
 		if abs(stageX - float(targets[0]["stageX"])) > 1.0 or abs(stageY - float(targets[0]["stageY"])) > 1.0:	# test if stage was moved (with 1 micron wiggle room)
-			userRealign = sem.YesNoBox("It seems that the stage was moved since stopping acquisition. Do you want to realign to the tracking target before resuming? This will also reset prediction parameters reducing tracking accuracy.")	
+			userRealign = sem.YesNoBox("It seems that the stage was moved since stopping acquisition. Do you want to realign to the tracking target before resuming?" + ("" if mdocRecovery else " This will also reset prediction parameters reducing tracking accuracy."))	
 			realign = True if userRealign == 1 else False
 	else:
 		sem.AllowFileOverwrite(1)
 
 ### Start setup
 
-dumpVars(os.path.splitext(os.path.basename(tf[-1]))[0])							# write settings vars to text file
+writeSettings(os.path.splitext(os.path.basename(tf[-1]))[0], settings)					# write settings snapshot to text file
 
 sem.ResetClock()
 
@@ -633,22 +1173,131 @@ sem.Echo("Start: " + str(startTilt) + " deg - Min/Max: " + str(minTilt) + "/" +
 sem.Echo("Data points used: " + str(dataPoints))
 sem.Echo("Target defocus range (min/max/step): " + str(minDefocus) + "/" + str(maxDefocus) + "/" + str(stepDefocus))
 sem.Echo("Sample pretilt (rotation): " + str(pretilt) + " (" + str(rotation) + ")")
+if focusSlopeCal:
+	calibration = readCalibration()
+	if "focusSlope" in calibration.keys():
+		changeSettings(focusSlope=calibration["focusSlope"])
+		sem.Echo("Loaded focus correction slope from calibration file.")
 sem.Echo("Focus correction slope: " + str(focusSlope))
+sem.Echo("Settings hash: " + settingsHash(settings))
 
 if trackMag > 0:
 	sem.Echo("WARNING: A magnification offset for the tracking target changes the Low Dose Record mode temporarily. Please double-check your Record mode in case the script is stopped prematurely or crashes!")
 
-branchsteps = max(maxTilt - startTilt, abs(minTilt - startTilt)) / 2 / step
-
 sem.SetProperty("ImageShiftLimit", imageShiftLimit)
 sem.SetNewFileType(0)		# set file type to mrc in case user changed default file type
 
+### Geometry model (running normal equations of CTF derived heights vs specimen coords)
+geoCoords = np.array([[float(tgt["SSX"]) if "SSX" in tgt.keys() else 0 for tgt in targets], [float(tgt["SSY"]) if "SSY" in tgt.keys() else 0 for tgt in targets]])
+geoModel = {"AtA": np.zeros((6, 6)), "Atb": np.zeros(6), "btb": 0, "n": 0, "p": np.zeros(6), "rmse": 0, "res": [], "rejected": 0, "fits": 0, "applied": np.zeros(len(targets)), "base": None}
+
+### Focus slope model (running linear regression of CTF defocus error vs tilt angle)
+slopeModel = {"n": 0, "Sx": 0, "Sy": 0, "Sxx": 0, "Sxy": 0, "Syy": 0}
+
+### Backlash model (running linear regression of tracking error vs step size for each type of tilt move)
+tiltMoves = ["tiltPos", "tiltPosBL", "tiltNeg", "tiltNegBL"]						# direction of tilt move with or without backlash step
+tiltModel = {move: {"n": 0, "Sx": 0, "Sy": 0, "Sxx": 0, "Sxy": 0} for move in tiltMoves}
+tiltModelMax = 200											# number of data points after which old data gets less weight
+tiltOffset = np.inf											# shift [microns] between approaching a tilt angle from below or above (measured by PACEtomo_backlashCal.py)
+approach = {1: 1, 2: 1}											# direction of last approach of each branch (start tilt is approached from below)
+backlashSkipped = 0
+if backlashModel:
+	calibration = readCalibration()
+	for move in tiltMoves:
+		for key in tiltModel[move].keys():
+			if move + "_" + key in calibration.keys():
+				tiltModel[move][key] = calibration[move + "_" + key]
+	tiltOffset = calibration["tiltOffset"] if "tiltOffset" in calibration.keys() else np.inf
+	if tiltModel["tiltNeg"]["n"] < 3:
+		sem.Echo("WARNING: Backlash model is not calibrated. Run PACEtomo_backlashCal.py to calibrate it. Backlash steps will not be skipped for the negative branch.")
+	else:
+		sem.Echo("Loaded backlash model from calibration file.")
+
+### Active targets per branch (updated by abortBranch, used for tilt plan and progress)
+active = {1: set(), 2: set()}
+imagesDone = 0
+abortReasons = ["", "finalTilt", "imageShiftLimit", "tooDark", "alignmentLost"]			# abort column of telemetry is index in this list
+aliWeight = 0.3												# weight of new alignment in running average of alignment quality
+aliMinCount = 3												# minimum number of alignments before alignment quality can abort a branch
+focusWeight = 0.5											# weight of new CTF defocus error in running average of focus controller
+focusCtrlLimit = 2											# CTF defocus errors [microns] larger than this are treated as failed fits by focus controller
+
+### Autofocus scheduler (addAF with afTol > 0)
+afReasons = ["", "schedule", "model", "ctf", "drift"]						# af column of telemetry is index in this list
+afState = {pn: {"time": 0, "model": 0, "ctf": []} for pn in (1, 2)}				# clock [s] of last autofocus, accumulated z0 uncertainty and CTF errors since then
+afCount = {reason: 0 for reason in afReasons[1:]}
+afDrift = 0.02												# focus drift [microns/min] (assumed until measured by autofocus)
+afWeight = 0.5												# weight of new drift measurement in running average
+afZ0Prior = 1												# z0 uncertainty [microns] when z0 fit has too few data points
+afMinCtf = 2												# minimum number of CTF results to estimate common defocus error
+
+### ZLP scheduler (slitTol > 0)
+slitDrift = 0.05											# ZLP drift [eV/min] (assumed until measured by RefineZLP)
+slitWeight = 0.5											# weight of new drift measurement in running average
+slitCount = 0
+
+### Save pipeline (savePipeline)
+saveBuffer = "N"											# buffer holding image until it is saved (not used otherwise)
+pendingSave = None											# file number, section, autodoc entries and completion tasks of image that was not saved yet
+
 ### Create run file
 counter = 1
 while os.path.exists(os.path.join(curDir, fileStem + "_run" + str(counter).zfill(2) + ".txt")):
 	counter += 1
 runFileName = os.path.join(curDir, fileStem + "_run" + str(counter).zfill(2) + ".txt")
 
+### Telemetry (one row per image, typed columns in header)
+telemetryFileName = os.path.splitext(runFileName)[0] + "_telemetry.csv"
+telemetryColumns = [("target", "int"), ("branch", "int"), ("tilt", "float"), ("realTilt", "float"), ("sec", "int"), ("SSYpred", "float"), ("SSY", "float"), ("predicted", "int"), ("focus", "float"), ("focusChange", "float"), ("focusCorrection", "float"), ("focusCtrl", "float"), ("ctfDefocus", "float"), ("z0", "float"), ("aErrX", "float"), ("aErrY", "float"), ("aliScore", "float"), ("abort", "int"), ("af", "int"), ("dose", "float"), ("timePred", "float"), ("timeCtf", "float"), ("timeTotal", "float")]
+telemetryRows = []
+
+### Background workers
+workerDone = os.path.splitext(runFileName)[0] + "_done"						# signals workers that no more images will be added
+closedFileName = os.path.splitext(runFileName)[0] + "_closed.txt"					# lists finished tilt series
+closedSeries = []
+if ctfWorker:
+	ctfPending = [{} for tgt in targets]							# conditions of images still waiting for results: {sec: [pn, tilt, realTilt, focuscorrection, focusctrl]}
+	ctfOffset = [0 for tgt in targets]								# read position in result files
+	ctfProcess = startWorker("PACEtomo_ctfWorker.py", ["--kV", sem.ReportHighVoltage(), "--minDefocus", max(0.2, -(minDefocus + 2)), "--maxDefocus", -(min(maxDefocus, trackDefocus) - 2), "--done", workerDone, "--files"] + [tgt["tsfile"] for tgt in targets])
+	if ctfProcess is not None:
+		changeSettings(doCtfFind=False, doCtfPlotter=False)					# CTF estimation is done by worker
+	else:
+		changeSettings(ctfWorker=False)
+		sem.Echo("WARNING: Falling back to CTF estimation after every image.")
+if focusCtrl and not (doCtfFind or doCtfPlotter or ctfWorker):
+	changeSettings(focusCtrl=False)
+	sem.Echo("WARNING: focusCtrl needs CTF estimation (doCtfFind, doCtfPlotter or ctfWorker) and was deactivated.")
+if (slitInterval > 0 or slitTol > 0) and not tgtPattern and slitShiftX == 0 and slitShiftY == 0:
+	changeSettings(slitInterval=0, slitTol=0)
+	sem.Echo("WARNING: ZLP refinement needs tgtPattern or slitShiftX/Y to find an empty area and was deactivated.")
+if sortWorker:
+	startWorker("PACEtomo_sortWorker.py", ["--closed", closedFileName, "--done", workerDone])
+if transferWorker:
+	if transferDir != "":
+		startWorker("PACEtomo_transferWorker.py", ["--dest", transferDir, "--rate", transferRate, "--closed", closedFileName, "--done", workerDone, "--session", os.path.join(curDir, fileStem + ".txt"), runFileName, closedFileName] + ([telemetryFileName] if telemetry else []))
+	else:
+		sem.Echo("WARNING: No transferDir was set. Tilt series will not be transferred.")
+if registry:
+	registryDB = None
+	if runRegistry is None:
+		changeSettings(registry=False)
+		sem.Echo("WARNING: PACEtomo_registry.py could not be imported. Runs will not be registered.")
+	else:
+		try:
+			registryDB = runRegistry.connect()
+		except Exception as err:
+			changeSettings(registry=False)
+			sem.Echo("WARNING: Registry could not be opened (" + str(err) + "). Runs will not be registered.")
+	registryImages = []										# images of current tilt: (target, tsfile, branch, tilt, time, alignment error, abort reason)
+	if registry:
+		registryRun = updateRegistry(runRegistry.addRun, os.path.join(curDir, fileStem + ".txt"), runFileName, versionPACE, settingsHash(settings), settings._asdict(), recover, navID)
+if dashboard:
+	if not telemetry:
+		changeSettings(telemetry=True)
+		sem.Echo("WARNING: The dashboard needs telemetry. Telemetry was activated.")
+	if startWorker("PACEtomo_dashboard.py", ["--telemetry", telemetryFileName, "--closed", closedFileName, "--done", workerDone, "--host", dashboardHost, "--port", dashboardPort, "--tilts", startTilt, minTilt, maxTilt, step, "--files"] + [tgt["tsfile"] for tgt in targets]) is not None:
+		sem.Echo("Dashboard: http://" + dashboardHost + ":" + str(dashboardPort))
+
 ### Initital actions
 if not recover:
 	sem.Echo("Moving to target area...")
@@ -672,7 +1321,7 @@ if not recover:
 		if refineVec and tgtPattern and size is not None:
 			if float(sem.ReportDefocus()) < -50:
 				sem.Echo("WARNING: Large defocus offsets for View can cause additional offsets in image shift upon mag change.")
-			size = int(size)
+			changeSettings(size=int(size))
 			sem.Echo("Refining target pattern...")
 			sem.GoToLowDoseArea("R")
 			ISX0, ISY0, *_ = sem.ReportImageShift()
@@ -692,7 +1341,7 @@ if not recover:
 			if np.linalg.norm([shiftx - SSX, shifty - SSY]) > 0.5:
 				sem.Echo("WARNING: Refined vector differs by more than 0.5 microns! Original vectors will be used.")
 			else:
-				vecA0, vecA1 = (round(SSX / size, 4), round(SSY / size, 4))
+				changeSettings(vecA0=round(SSX / size, 4), vecA1=round(SSY / size, 4))
 				sem.Echo("Refined vector A: (" + str(vecA0) + ", " + str(vecA1) + ")")
 
 				sem.SetImageShift(ISX0, ISY0)						# reset IS to center position
@@ -711,7 +1360,7 @@ if not recover:
 				if np.linalg.norm([shiftx - SSX, shifty - SSY]) > 0.5:
 					sem.Echo("WARNING: Refined vector differs by more than 0.5 microns! Original vectors will be used.")
 				else:
-					vecB0, vecB1 = (round(SSX / size, 4), round(SSY / size, 4))
+					changeSettings(vecB0=round(SSX / size, 4), vecB1=round(SSY / size, 4))
 					sem.Echo("Refined vector B: (" + str(vecB0) + ", " + str(vecB1) + ")")
 
 					targetNo = 0
@@ -766,9 +1415,9 @@ if not recover:
 				sem.Echo("Fitted plane into cloud of " + str(len(geoPoints)) + " points.")
 				sem.Echo("Normal vector: " + str(norm))
 				sign = 1 if norm[1] <= 0 else -1
-				pretilt = sign * np.degrees(np.arccos(norm[2]))
+				changeSettings(pretilt=float(sign * np.degrees(np.arccos(norm[2]))))
 				sem.Echo("Estimated pretilt: " + str(pretilt) + " degrees")
-				rotation = round(-np.degrees(np.arctan(norm[0]/norm[1])), 1)
+				changeSettings(rotation=round(float(-np.degrees(np.arctan(norm[0]/norm[1]))), 1))
 				sem.Echo("Estimated rotation: " + str(rotation) + " degrees")
 			else:
 				sem.Echo("WARNING: Not enough geo points could be checked successfully. Geometry could not be measured.")
@@ -780,9 +1429,13 @@ if not recover:
 	sem.V()
 	sem.Copy("A", "O")
 
-	sem.TiltBy(-2 * step)
-	if slowTilt: sem.TiltBy(step)
-	sem.TiltTo(startTilt)
+	if backlashModel and skipBacklash(startTilt, 1):
+		approach[1] = approach[2] = 1 if startTilt > sem.ReportTiltAngle() else -1
+		sem.TiltTo(startTilt)
+	else:
+		sem.TiltBy(-2 * step)
+		if slowTilt: sem.TiltBy(step)
+		sem.TiltTo(startTilt)
 
 	sem.V()
 	sem.AlignTo("O")
@@ -811,9 +1464,8 @@ if not recover:
 ### Target setup
 	sem.Echo("Setting up " + str(len(targets)) + " targets...")
 
-	posTemplate = {"SSX": 0, "SSY": 0, "focus": 0, "z0": 0, "n0": 0, "shifts": [], "angles": [], "ISXset": 0, "ISYset": 0, "ISXali": 0, "ISYali": 0, "dose": 0, "sec": 0, "skip": False}
+	posTemplate = {"SSX": 0, "SSY": 0, "focus": 0, "tgtDefocus": 0, "z0": 0, "n0": 0, "shifts": [], "angles": [], "ISXset": 0, "ISYset": 0, "ISXali": 0, "ISYali": 0, "dose": 0, "sec": 0, "skip": False, "reason": "", "aliScore": 1.0, "aliCount": 0, "aliClamps": 0, "focusErr": 0, "focusCtrl": 0}
 	position = []
-	skippedTgts = 0
 	for i, tgt in enumerate(targets):
 		position.append([])
 		position[-1].append(copy.deepcopy(posTemplate))
@@ -833,7 +1485,6 @@ if not recover:
 			position[-1][0]["skip"] = True
 			position[-1].append(copy.deepcopy(position[-1][0]))
 			position[-1].append(copy.deepcopy(position[-1][0]))
-			skippedTgts += 1
 			continue
 
 		tiltScaling = np.cos(np.radians(pretilt * np.cos(np.radians(rotation)) + startTilt)) / np.cos(np.radians(pretilt * np.cos(np.radians(rotation))))	# stretch shifts from 0 tilt to startTilt
@@ -871,6 +1522,7 @@ if not recover:
 		position[-1][0]["SSX"] = float(SSX)
 		position[-1][0]["SSY"] = float(SSY)
 		position[-1][0]["focus"] = correctedFocus
+		position[-1][0]["tgtDefocus"] = trackDefocus if i == 0 and trackDefocus < maxDefocus else targetDefocus + positionFocus - focus0	# defocus aimed for without geometry corrections
 		position[-1][0]["z0"] = z0_ini								# offset from eucentric height (will be refined during collection)
 		position[-1][0]["n0"] = float(tgt["SSY"])						# offset from tilt axis
 		position[-1][0]["ISXset"] = float(ISXset)
@@ -890,46 +1542,14 @@ if not recover:
 	sem.Echo("Tilt step " + str(1) + " out of " + str(int((maxTilt - minTilt) / step + 1)) + " (" + str(startTilt) + " deg)...")
 	sem.SetStatusLine(1, "Tilt step: " + str(1) + " / " + str(int((maxTilt - minTilt) / step + 1)))
 
-	maxProgress = ((maxTilt - minTilt) / step + 1) * (len(position) - skippedTgts)
-	resumePercent = 0
+	initActive()
+	imagesStart = 0
 	startTime = sem.ReportClock()
 	lastSlitCheck = startTime
 
-	geo = [[], [], []]
-
 	plustilt = minustilt = startTilt
 	Tilt(startTilt)
 
-	if geoRefine:
-		if len(geo[2]) >= 3:									# if number of points > 3: fit z = a * x + b * y
-			sem.Echo("Refining geometry...")
-			sem.Echo(str(len(geo[2])) + " usable CtfFind results found.")
-			if len(geo[2]) >= parabolTh:							# if number of points > 6: fit z = a * x + b * y + c * (x**2) + d * (y**2) + e * x * y
-				sem.Echo("Fitting paraboloid...")
-				geoF = geoPara
-			else:							
-				sem.Echo("Fitting plane...")
-				geoF = geoPlane
-
-			p, cov = optimize.curve_fit(geoF, [geo[0], geo[1]], [z - geo[2][0] for z in geo[2]])
-
-			ss = 0
-			for i in range(0, len(geo[2])):
-				ss += (geo[2][i] - geo[2][0] - geoF([geo[0][i], geo[1][i]], *p))**2
-			rmse = np.sqrt(ss / len(geo[2]))
-
-			sem.Echo("Fit parameters: " + " # ".join(p.astype(str)))
-			sem.Echo("RMSE: " + str(round(rmse, 3)))
-
-			for pos in range(0, len(position)):						# calculate and adjust refined z0
-				zs = geoF([position[pos][1]["SSX"], position[pos][1]["SSY"]], *p)
-				z0_ref = position[pos][1]["z0"] + zs * np.cos(np.radians(startTilt)) + position[pos][1]["SSY"] * np.sin(np.radians(startTilt))
-
-				position[pos][1]["z0"] = z0_ref
-				position[pos][2]["z0"] = z0_ref
-		else: 
-			sem.Echo("WARNING: Not enough reliable CtfFind results (" + str(len(geo[2])) + ") to refine geometry. Continuing with initial geometry model.")
-
 	startstep = 0
 	substep = [0, 0]
 	posResumed = -1
@@ -950,13 +1570,14 @@ else:
 		else:
 			sem.RealignToOtherItem(navID, 1)
 	position = []
-	skippedTgts = 0
 	for pos in range(len(targets)):
 		position.append([{},{},{}])
+		history = readMdocHistory(os.path.join(curDir, targets[pos]["tsfile"] + ".mdoc")) if realign and mdocRecovery else None
 		for i in range(2):
 			position[-1][i+1]["SSX"] = float(savedRun[pos][i]["SSX"])
 			position[-1][i+1]["SSY"] = float(savedRun[pos][i]["SSY"])
 			position[-1][i+1]["focus"] = float(savedRun[pos][i]["focus"])
+			position[-1][i+1]["tgtDefocus"] = float(savedRun[pos][i]["tgtDefocus"]) if "tgtDefocus" in savedRun[pos][i].keys() else targetDefocus
 			position[-1][i+1]["z0"] = float(savedRun[pos][i]["z0"])
 			position[-1][i+1]["n0"] = float(savedRun[pos][i]["n0"])
 			if savedRun[pos][i]["shifts"] != "" and not realign:
@@ -967,6 +1588,11 @@ else:
 				position[-1][i+1]["angles"] = [float(angle) for angle in savedRun[pos][i]["angles"].split(",")]
 			else:
 				position[-1][i+1]["angles"] = []
+			if history is not None and len(history[i+1]) > 1:				# rebuild prediction history from mdoc
+				first = 2 if i == 1 and ignoreNegStart else 1					# first shift of negative branch was also ignored during collection
+				position[-1][i+1]["shifts"] = [float(shift) for shift in np.diff([sec[1] for sec in history[i+1][first - 1:]])][-dataPoints:]
+				position[-1][i+1]["angles"] = [sec[0] for sec in history[i+1][first:]][-dataPoints:]
+				position[-1][i+1]["z0"] = history[i+1][-1][2]
 			position[-1][i+1]["ISXset"] = float(savedRun[pos][i]["ISXset"])
 			position[-1][i+1]["ISYset"] = float(savedRun[pos][i]["ISYset"])
 			position[-1][i+1]["ISXali"] = float(savedRun[pos][i]["ISXali"])
@@ -974,12 +1600,18 @@ else:
 			position[-1][i+1]["dose"] = float(savedRun[pos][i]["dose"])
 			position[-1][i+1]["sec"] = int(savedRun[pos][i]["sec"])
 			position[-1][i+1]["skip"] = True if savedRun[pos][i]["skip"] == "True" or targets[pos]["skip"] == "True" else False
+			position[-1][i+1]["reason"] = savedRun[pos][i]["reason"] if "reason" in savedRun[pos][i].keys() else ""
+			position[-1][i+1]["aliScore"] = float(savedRun[pos][i]["aliScore"]) if "aliScore" in savedRun[pos][i].keys() else 1.0
+			position[-1][i+1]["aliCount"] = int(savedRun[pos][i]["aliCount"]) if "aliCount" in savedRun[pos][i].keys() else 0
+			position[-1][i+1]["aliClamps"] = int(savedRun[pos][i]["aliClamps"]) if "aliClamps" in savedRun[pos][i].keys() else 0
+			position[-1][i+1]["focusErr"] = float(savedRun[pos][i]["focusErr"]) if "focusErr" in savedRun[pos][i].keys() else 0
+			position[-1][i+1]["focusCtrl"] = float(savedRun[pos][i]["focusCtrl"]) if "focusCtrl" in savedRun[pos][i].keys() else 0
 
 		sem.AreaForCumulRecordDose(pos + 1)							# set dose accumulator to highest recorded prior dose
 		sem.AccumulateRecordDose(max(position[-1][1]["dose"], position[-1][2]["dose"]))
 
-		if targets[pos]["skip"] == "True":
-			skippedTgts += 1
+		if savedRun[pos][0]["angles"] != "" or savedRun[pos][1]["angles"] != "":			# target has images
+			imagesDone += max(position[-1][1]["sec"], position[-1][2]["sec"]) + 1		# images already in tilt series file
 
 	startstep = (resume["sec"] - 1) // 4 								# figure out start values for branch loops
 	substep = [min((resume["sec"] - 1) % 4, 2), (resume["sec"] - 1) % 4 // 3]
@@ -1010,38 +1642,53 @@ else:
 
 	posResumed = resume["pos"] + 1
 
-	maxProgress = ((maxTilt - minTilt) / step + 1) * (len(position) - skippedTgts)
-	# progress = collected images * (positions - skipped positions) + current position - skipped positions scaled assuming homogeneous distribution of skipped positions
-	progress = resume["sec"] * (len(position) - skippedTgts) + resume["pos"] - skippedTgts * resume["pos"] / len(position)
-	resumePercent = round(100 * (progress / maxProgress), 1)
+	initActive()
+	imagesStart = imagesDone
 
 	sem.GoToLowDoseArea("R")
 	origMag, *_ = sem.ReportMag()
 	is2ssMatrix = np.array(sem.ISToSpecimenMatrix(0)).reshape((2, 2))
+	camX, camY, *_ = sem.CameraProperties()
+	c2ssMatrix = np.array(sem.CameraToSpecimenMatrix(0)).reshape((2, 2))
+
+	if realign and mdocRecovery:
+		if trackMag > 0:
+			sem.Echo("WARNING: Tracking target can not be realigned to its last image when using trackMag. Only the realignment to the navigator item was applied.")
+		else:
+			resumeTilt = sem.ReportTiltAngle()
+			for pn in (1, 2):
+				if savedRun[0][pn - 1]["angles"] != "":
+					realignTracking(pn, float(savedRun[0][pn - 1]["angles"].split(",")[-1]))
+			sem.TiltTo(resumeTilt)
+
 	focus0 = (position[0][1]["focus"] + position[0][2]["focus"]) / 2 				# get estimate for original microscope focus value by taking average of both branches of tracking target
 
 	startTime = sem.ReportClock()
 	lastSlitCheck = startTime
 
+if previewWorker:											# start after setup to have camera matrix in both cases
+	startWorker("PACEtomo_previewWorker.py", ["--matrix"] + list(c2ssMatrix.flatten()) + ["--closed", closedFileName, "--done", workerDone])
 
 ### Tilt series
 for i in range(startstep, int(np.ceil(branchsteps))):
+	if len(active[1]) == 0 and len(active[2]) == 0: break						# all branches finished
 	for j in range(substep[0], 2):
 		plustilt += step
-		if all([pos[1]["skip"] for pos in position]): continue
+		if len(active[1]) == 0: continue							# branch without active targets is dropped from tilt plan
 		sem.Echo("")
 		sem.Echo("Tilt step " + str(i * 4 + j + 1 + 1) + " out of " + str(int((maxTilt - minTilt) / step + 1)) + " (" + str(plustilt) + " deg)...")
 		sem.SetStatusLine(1, "Tilt step: " + str(i * 4 + j + 1 + 1) + " / " + str(int((maxTilt - minTilt) / step + 1)))
 		Tilt(plustilt)
 	for j in range(substep[1], 2):
 		minustilt -= step
-		if all([pos[2]["skip"] for pos in position]): continue
+		if len(active[2]) == 0: continue
 		sem.Echo("")
 		sem.Echo("Tilt step " + str(i * 4 + j + 3 + 1) + " out of " + str(int((maxTilt - minTilt) / step + 1)) + " (" + str(minustilt) + " deg)...")
 		sem.SetStatusLine(1, "Tilt step: " + str(i * 4 + j + 3 + 1) + " / " + str(int((maxTilt - minTilt) / step + 1)))
 		Tilt(minustilt)
 	substep = [0, 0]										# reset substeps after recovery
 	if coldFEG: checkColdFEG()									# check for flashing at the end of each step
+	checkSettings()
 
 ### Finish
 sem.ClearStatusLine(0)
@@ -1051,11 +1698,25 @@ sem.SetDefocus(focus0)
 sem.SetImageShift(0, 0)
 sem.CloseFile()
 updateTargets(runFileName, targets)
+for pos in range(len(targets)):
+	if os.path.exists(os.path.join(curDir, targets[pos]["tsfile"])):
+		closeSeries(pos)
+open(workerDone, "w").close()
+if registry:
+	updateRegistry(runRegistry.finishRun, registryRun)
+	if registry:										# otherwise already closed by updateRegistry
+		registryDB.close()
 
 totalTime = round(sem.ReportClock() / 60, 1)
 perTime = round(totalTime / len(position), 1)
 if recoverInput == 1:
 	perTime = "since recovery: " + str(perTime)
+if slitInterval > 0 or slitTol > 0:
+	sem.Echo("ZLP refinements: " + str(slitCount) + " (drift: " + str(round(slitDrift * 60, 2)) + " eV/h)")
+if addAF:
+	sem.Echo("Autofocus: " + str(sum(afCount.values())) + " (" + ", ".join([reason + ": " + str(count) for reason, count in afCount.items() if count > 0]) + ")")
+if backlashModel:
+	sem.Echo("Backlash model skipped " + str(backlashSkipped) + " backlash steps.")
 sem.Echo(datetime.now().strftime("%d.%m.%Y %H:%M:%S"))
 sem.Echo("##### All tilt series completed in " + str(totalTime) + " min (" + str(perTime) + " min per tilt series) #####")
 sem.SaveLog()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_benchmark
+# Purpose:	Measures the Python-side time per image of PACEtomo for synthetic target patterns using the serialem stand-in.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# Runs the complete PACEtomo script with the serialem stand-in of this folder for grid patterns of 1, 9, 49, 121 and 1000 targets.
+# Time spent in the stand-in (simulated microscope) is measured separately and excluded. Setup time (until the first image is saved) is
+# reported separately. The remaining time per image is split into:
+#	prediction	calculation of new eucentric offset (timePred column of telemetry file)
+#	runFile		reading and writing of tgts and run files (PACEtomo_tgtsFile)
+#	logging		Echo and status line commands
+#	stateCopy	copy.deepcopy of target state
+#	other		everything else (image shift and focus calculations, telemetry, ...)
+# Usage:	python PACEtomo_benchmark.py [--targets 1 9 49] [--repeats 3] [--set geoRefine=True] [--save baseline.json]
+#		python PACEtomo_benchmark.py --baseline PACEtomo_benchmark_baseline.json [--tolerance 0.5]	(exits with 1 on regression)
+
+import os
+import sys
+import copy
+import json
+import time
+import glob
+import runpy
+import shutil
+import argparse
+import inspect
+import tempfile
+import platform
+import numpy as np
+
+simDir = os.path.dirname(os.path.abspath(__file__))
+betaDir = os.path.dirname(simDir)
+sys.path.insert(0, betaDir)										# PACEtomo_tgtsFile
+sys.path.insert(0, simDir)										# serialem stand-in
+import serialem as sem
+import PACEtomo_tgtsFile as tgtsFile
+
+patterns = [1, 9, 49, 121, 1000]
+metrics = ["script", "prediction", "runFile", "logging", "stateCopy", "other"]
+logCommands = ["Echo", "SetStatusLine", "ClearStatusLine", "SaveLog", "SaveLogOpenNew"]
+timers = {"serialem": 0, "runFile": 0, "logging": 0, "stateCopy": 0}
+setup = {}												# timers at end of setup (first saved image)
+depth = [0]
+
+######## FUNCTIONS ########
+
+def timed(category, func):										# add time spent in outermost timed call to category
+	def wrapper(*args, **kwargs):
+		if depth[0] > 0:
+			return func(*args, **kwargs)
+		depth[0] += 1
+		start = time.perf_counter()
+		try:
+			return func(*args, **kwargs)
+		finally:
+			timers[category] += time.perf_counter() - start
+			depth[0] -= 1
+	return wrapper
+
+def instrument():											# wrap stand-in commands, tgts file functions and deepcopy with timers
+	for name, func in inspect.getmembers(sem, inspect.isfunction):
+		if func.__module__ == sem.__name__ and not name.startswith("_") and name != "reset":
+			setattr(sem, name, timed("logging" if name in logCommands else "serialem", func))
+	tgtsFile.readTargets = timed("runFile", tgtsFile.readTargets)
+	tgtsFile.writeTargets = timed("runFile", tgtsFile.writeTargets)
+	copy.deepcopy = timed("stateCopy", copy.deepcopy)
+	save = sem.S
+	def firstSave(*args):										# mark end of setup at first saved image
+		if setup == {}:
+			setup.update(timers)
+			setup["time"] = time.perf_counter()
+		return save(*args)
+	sem.S = firstSave
+
+def makePattern(nTargets, spacing=1.5):									# grid of targets sorted by distance from center (tracking target first)
+	side = int(np.ceil(np.sqrt(nTargets)))
+	coords = (np.indices((side, side)).reshape(2, -1).T - (side - 1) / 2) * spacing
+	coords = coords[np.argsort(np.hypot(coords[:, 0], coords[:, 1]), kind="stable")][:nTargets]
+	return [{"tsfile": "bench_ts_" + str(i + 1).zfill(4) + ".mrc", "SSX": round(float(x), 3), "SSY": round(float(y), 3), "stageX": 0, "stageY": 0, "skip": False} for i, (x, y) in enumerate(coords)]
+
+def runScript(script, nTargets, settings):								# run PACEtomo once and return time per image [ms] of each category
+	folder = tempfile.mkdtemp(prefix="PACEtomo_bench_")
+	sem.reset()
+	sem.config.update({"directory": folder, "navNote": "bench_tgts.txt", "echo": False, "abortAfter": 0, "imageSize": 64})
+	tgtsFile.writeTargets(os.path.join(folder, "bench_tgts.txt"), makePattern(nTargets), settings=settings)
+	for key in timers.keys():
+		timers[key] = 0
+	setup.clear()
+	cwd = os.getcwd()
+	os.chdir(folder)
+	start = time.perf_counter()
+	try:
+		runpy.run_path(script, run_name="__main__")
+	except sem.ScriptExit as err:									# sem.Exit() at the end of the script raises ScriptExit without message
+		if str(err) != "":
+			raise RuntimeError("PACEtomo stopped: " + str(err))
+	finally:
+		total = time.perf_counter() - start
+		os.chdir(cwd)
+
+	images = sum([len(f["sections"]) for f in sem.state["files"]])
+	prediction = 0
+	for fileName in glob.glob(os.path.join(folder, "*_telemetry.csv")):
+		with open(fileName) as f:
+			header = [col.split(":")[0] for col in f.readline().strip().split(",")]
+		data = np.loadtxt(fileName, delimiter=",", skiprows=1, ndmin=2)
+		if data.size > 0:
+			prediction += np.sum(data[:, header.index("timePred")])
+	shutil.rmtree(folder)
+
+	result = {"images": images, "setup": (setup["time"] - start - setup["serialem"]) * 1000}		# setup time [ms] without stand-in time
+	result["script"] = (start + total - setup["time"] - timers["serialem"] + setup["serialem"]) / images * 1000
+	result["prediction"] = prediction / images * 1000
+	for key in ["runFile", "logging", "stateCopy", "serialem"]:
+		result[key] = (timers[key] - setup[key]) / images * 1000
+	result["other"] = result["script"] - result["prediction"] - result["runFile"] - result["logging"] - result["stateCopy"]
+	return result
+
+def compareBaseline(results, baseline, tolerance, minDiff):						# list of metrics that are slower than baseline
+	regressions = []
+	for nTargets, result in results.items():
+		if nTargets not in baseline.keys():
+			continue
+		for metric in metrics:
+			base = baseline[nTargets][metric]
+			if result[metric] > base * (1 + tolerance) and result[metric] - base > minDiff:
+				regressions.append(nTargets + " targets: " + metric + " " + str(round(result[metric], 2)) + " ms (baseline: " + str(round(base, 2)) + " ms)")
+	return regressions
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark Python-side time per image of PACEtomo with the serialem stand-in.")
+	parser.add_argument("--script", default=os.path.join(betaDir, "PACEtomo_v1.7.py"), help="PACEtomo script to benchmark")
+	parser.add_argument("--targets", nargs="+", type=int, default=patterns, help="numbers of targets")
+	parser.add_argument("--repeats", type=int, default=3, help="runs per number of targets (median is reported)")
+	parser.add_argument("--set", nargs="*", default=[], help="PACEtomo settings as key=value (written to tgts file)")
+	parser.add_argument("--save", default="", help="save results as baseline to this json file")
+	parser.add_argument("--baseline", default="", help="compare results to this baseline json file")
+	parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative increase of time per image compared to baseline")
+	parser.add_argument("--minDiff", type=float, default=0.2, help="ignore increases smaller than this [ms per image]")
+	args = parser.parse_args()
+
+	settings = {"minTilt": -6, "maxTilt": 6, "step": 3, "imageShiftLimit": 100}			# short tilt series to keep 1000 targets manageable
+	settings.update(dict([entry.split("=", 1) for entry in args.set]))
+	instrument()
+
+	results = {}
+	print("targets | images | setup [ms] | " + " | ".join([metric for metric in metrics]) + " [ms per image] | stand-in")
+	for nTargets in args.targets:
+		runs = [runScript(args.script, nTargets, settings) for i in range(max(1, args.repeats))]
+		result = {key: float(np.median([run[key] for run in runs])) for key in runs[0].keys()}	# median of repeats is robust to single slow runs
+		result["images"] = runs[0]["images"]
+		results[str(nTargets)] = result
+		print(str(nTargets).rjust(7) + " | " + str(result["images"]).rjust(6) + " | " + str(round(result["setup"])).rjust(10) + " | " + " | ".join([str(round(result[metric], 2)).rjust(len(metric)) for metric in metrics]) + " | " + str(round(result["serialem"], 2)))
+		sys.stdout.flush()
+
+	if args.save != "":
+		with open(args.save, "w") as f:
+			json.dump({"settings": settings, "python": platform.python_version(), "numpy": np.__version__, "results": {key: {metric: round(val, 4) for metric, val in result.items()} for key, result in results.items()}}, f, indent=1)
+		print("Saved baseline to " + args.save)
+
+	if args.baseline != "":
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+		if baseline["settings"] != settings:
+			print("WARNING: Settings differ from baseline settings: " + str(baseline["settings"]))
+		regressions = compareBaseline(results, baseline["results"], args.tolerance, args.minDiff)
+		if len(regressions) > 0:
+			print("REGRESSION:")
+			print("\n".join(["  " + entry for entry in regressions]))
+			sys.exit(1)
+		print("No regressions compared to " + args.baseline)
+
+if __name__ == "__main__":
+	main()
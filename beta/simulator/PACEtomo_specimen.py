@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# ===================================================================
+#ScriptName	PACEtomo_specimen
+# Purpose:	Renders synthetic specimen images (holey carbon, lamella) for the serialem stand-in and for image processing benchmarks.
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.0
+# Last Change:	2026/10/19: created
+# ===================================================================
+
+# The specimen is defined in specimen coordinates [microns] (tilt axis along X) by a params dict (see defaults). Images are rendered
+# for a camera to specimen matrix, center, tilt angle and defocus, so images of the same specimen at different positions and tilt
+# angles are consistent:
+#	holes	holey carbon lattice (vecA, vecB, diameter) with thin ice texture in the holes
+#	lamella	lamella of given width and direction with cellular texture and dark particles
+# Projection stretch (1 / cos(tilt) perpendicular to the tilt axis), thickness dependent absorption, defocus (Fresnel propagation) and shot
+# noise (dose) are applied. Ground truth lattice vectors in camera pixels are returned by latticeVectors.
+# Usage:	python PACEtomo_specimen.py render --out holes.mrc [--type lamella] [--size 4096] [--pixel 10] [--tilts -60 60 3] [--defocus -50] [--dose 0.5]
+#		python PACEtomo_specimen.py bench [--sizes 1024 2048 4096 8192] [--pixel 10]
+
+import time
+import argparse
+import numpy as np
+from scipy import fft, ndimage
+try:
+	import mrcfile
+except ImportError:
+	mrcfile = None
+
+defaults = {
+	"type": "holes",										# holes or lamella
+	"seed": 0,											# random seed of texture and particles
+	"vecA": (1.2, 0.0),										# holes: lattice vectors [microns]
+	"vecB": (0.0, 1.2),
+	"offset": (0.0, 0.0),										# holes: position of a hole center [microns]
+	"diameter": 0.6,										# holes: hole diameter [microns]
+	"edge": 0.01,											# holes: width of hole edge [microns]
+	"carbon": 0.25,											# holes: transmission of carbon support
+	"lamellaWidth": 12.0,										# lamella: width [microns]
+	"lamellaAngle": 0.0,										# lamella: direction of lamella relative to tilt axis [degrees]
+	"particles": 2.0,										# lamella: dark particles per square micron
+	"particleSize": 0.03,										# lamella: particle radius [microns]
+	"texture": 0.1,											# amplitude of random texture
+	"textureScale": 0.05,										# size of texture features [microns]
+	"thickness": 150,										# ice/lamella thickness [nm]
+	"mfp": 350,											# inelastic mean free path [nm] (absorption increases with 1 / cos(tilt))
+	"phase": 0.5,											# phase shift [rad] of fully scattering material (phase contrast with defocus)
+}
+
+textureTiles = {}
+
+######## FUNCTIONS ########
+
+def makeParams(params={}):
+	merged = dict(defaults)
+	merged.update(params)
+	return merged
+
+def makeTexture(seed, size=512):									# periodic band-limited noise tile with standard deviation 1
+	if seed not in textureTiles.keys():
+		rng = np.random.default_rng(seed)
+		freq = np.hypot(*np.meshgrid(np.fft.fftfreq(size), np.fft.rfftfreq(size), indexing="ij"))
+		spectrum = (rng.standard_normal(freq.shape) + 1j * rng.standard_normal(freq.shape)) * np.exp(-(freq * 16)**2) / np.maximum(freq, 1 / size)
+		spectrum[0, 0] = 0
+		tile = np.fft.irfft2(spectrum, s=(size, size))
+		textureTiles[seed] = (tile / np.std(tile)).astype(np.float32)
+	return textureTiles[seed]
+
+def sampleTexture(x, y, params):									# texture value at specimen coords [microns] (tile pixel = textureScale / 4)
+	tile = makeTexture(params["seed"])
+	scale = 4 / params["textureScale"]
+	return ndimage.map_coordinates(tile, [y * scale, x * scale], order=1, mode="grid-wrap", prefilter=False)
+
+def holes(x, y, params):										# transmission of holey carbon at specimen coords [microns]
+	lattice = np.column_stack([params["vecA"], params["vecB"]])
+	coords = np.linalg.inv(lattice) @ np.vstack([x - params["offset"][0], y - params["offset"][1]])
+	dist = np.hypot(*(lattice @ (coords - np.round(coords))))					# distance to nearest hole center (exact for near rectangular lattices)
+	inside = 1 / (1 + np.exp(np.clip((dist - params["diameter"] / 2) / max(params["edge"], 1e-6) * 4, -50, 50)))
+	return params["carbon"] + (1 - params["carbon"]) * inside
+
+def lamella(x, y, params):										# transmission of lamella at specimen coords [microns]
+	angle = np.radians(params["lamellaAngle"])
+	across = -np.sin(angle) * x + np.cos(angle) * y
+	inside = 1 / (1 + np.exp(np.clip((np.abs(across) - params["lamellaWidth"] / 2) / 0.05, -50, 50)))
+	value = 0.05 + 0.95 * inside
+	if params["particles"] > 0:									# dark particles on regular grid cells with random offsets
+		cell = 1 / np.sqrt(params["particles"])
+		ix, iy = np.floor(x / cell), np.floor(y / cell)
+		rng = np.random.default_rng(params["seed"] + 1)
+		jitter = rng.random((2, 97, 89))
+		px = (ix + jitter[0, ix.astype(int) % 97, iy.astype(int) % 89]) * cell
+		py = (iy + jitter[1, ix.astype(int) % 97, iy.astype(int) % 89]) * cell
+		value *= 1 - 0.5 * np.exp(-((x - px)**2 + (y - py)**2) / (2 * params["particleSize"]**2))
+	return value
+
+def transmission(x, y, params):
+	if params["type"] == "lamella":
+		value = lamella(x, y, params)
+	else:
+		value = holes(x, y, params)
+	return value * (1 + params["texture"] * sampleTexture(x, y, params))
+
+def applyDefocus(image, pixelSize, defocus, phase=0.5, voltage=300, cs=2.7, bfactor=100):		# pixelSize [nm], defocus [microns] (negative: underfocus)
+	wavelength = 12.2643 / np.sqrt(voltage * 1000 * (1 + voltage * 0.978466e-3))			# [A]
+	ky = fft.fftfreq(image.shape[0], d=pixelSize * 10).astype(np.float32)
+	kx = fft.fftfreq(image.shape[1], d=pixelSize * 10).astype(np.float32)
+	k2 = ky[:, np.newaxis]**2 + kx[np.newaxis, :]**2
+	chi = np.pi * wavelength * (-defocus * 1e4) * k2 - np.pi / 2 * cs * 1e7 * wavelength**3 * k2**2
+	propagator = (np.exp(1j * chi) * np.exp(-bfactor / 4 * k2)).astype(np.complex64)
+	wave = np.sqrt(np.clip(image, 0, None)) * np.exp(1j * phase * (1 - image)).astype(np.complex64)	# scattering material also shifts phase
+	wave = fft.ifft2(fft.fft2(wave, workers=-1) * propagator, workers=-1)
+	return (wave.real**2 + wave.imag**2).astype(np.float32)
+
+def addNoise(image, counts, rng):									# shot noise for counts per pixel at transmission 1
+	mean = np.clip(image, 0, None) * counts
+	if counts < 20:
+		return (rng.poisson(mean) / counts).astype(np.float32)
+	return ((mean + np.sqrt(mean) * rng.standard_normal(image.shape, dtype=np.float32)) / counts).astype(np.float32)
+
+def render(params, shape, c2ss, center=(0, 0), tilt=0, defocus=0, dose=0, seed=None, blockRows=1024):	# c2ss: camera pixel to specimen [microns], dose [e/A^2]
+	params = makeParams(params)
+	pixelSize = np.sqrt(abs(np.linalg.det(c2ss))) * 1000						# [nm]
+	cosine = np.cos(np.radians(tilt))
+	image = np.empty(shape, dtype=np.float32)
+	cols = np.arange(shape[1], dtype=np.float32) - (shape[1] - 1) / 2
+	for start in range(0, shape[0], blockRows):							# render in blocks to limit memory at 8k
+		rows = np.arange(start, min(start + blockRows, shape[0]), dtype=np.float32) - (shape[0] - 1) / 2
+		r, c = np.meshgrid(rows, cols, indexing="ij")
+		x = center[0] + c2ss[0, 0] * c + c2ss[0, 1] * r
+		y = center[1] + (c2ss[1, 0] * c + c2ss[1, 1] * r) / cosine				# projection stretch perpendicular to tilt axis
+		image[start:start + len(rows)] = transmission(x.ravel(), y.ravel(), params).reshape(x.shape)
+	image *= np.exp(-params["thickness"] / params["mfp"] / cosine)
+	if defocus != 0:
+		image = applyDefocus(image, pixelSize, defocus, params["phase"])
+	if dose > 0:
+		rng = np.random.default_rng(params["seed"] if seed is None else seed)
+		image = addNoise(image, dose * (pixelSize * 10)**2, rng)
+	return image
+
+def latticeVectors(params, c2ss, tilt=0):								# hole lattice vectors in camera pixels [x, y] at tilt angle
+	params = makeParams(params)
+	cosine = np.cos(np.radians(tilt))
+	stretch = np.array([[1, 0], [0, cosine]])
+	ss2c = np.linalg.inv(c2ss)
+	return [ss2c @ stretch @ np.array(vec) for vec in (params["vecA"], params["vecB"])]
+
+def renderTiltSeries(params, tilts, shape, c2ss, center=(0, 0), defocus=0, dose=0):
+	return np.array([render(params, shape, c2ss, center, tilt, defocus, dose, seed=i) for i, tilt in enumerate(tilts)])
+
+def writeMrc(fileName, images, pixelSize):								# pixelSize [nm]
+	if mrcfile is None:
+		raise ImportError("Writing MRC files needs the mrcfile package.")
+	with mrcfile.new(fileName, overwrite=True) as mrc:
+		mrc.set_data(np.asarray(images, dtype=np.float32))
+		mrc.voxel_size = pixelSize * 10
+
+def benchmark(sizes, pixelSize, params={}, repeat=3):							# render time [ms] of each step for each camera size
+	c2ss = np.identity(2) * pixelSize / 1000
+	results = {}
+	for size in sizes:
+		times = {"projection": [], "defocus": [], "noise": []}
+		for i in range(repeat):
+			start = time.perf_counter()
+			image = render(params, (size, size), c2ss, tilt=30)
+			times["projection"].append(time.perf_counter() - start)
+			start = time.perf_counter()
+			image = applyDefocus(image, pixelSize, -50)
+			times["defocus"].append(time.perf_counter() - start)
+			start = time.perf_counter()
+			addNoise(image, 0.5 * (pixelSize * 10)**2, np.random.default_rng(i))
+			times["noise"].append(time.perf_counter() - start)
+		results[size] = {key: min(val) * 1000 for key, val in times.items()}
+	return results
+
+######## END FUNCTIONS ########
+
+def main():
+	parser = argparse.ArgumentParser(description="Render synthetic specimen images.")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+	renderParser = subparsers.add_parser("render", help="render image or tilt series to MRC file")
+	renderParser.add_argument("--out", required=True, help="output MRC file")
+	renderParser.add_argument("--type", default="holes", choices=["holes", "lamella"], help="specimen type")
+	renderParser.add_argument("--size", type=int, default=4096, help="camera size [pixels]")
+	renderParser.add_argument("--pixel", type=float, default=10, help="pixel size [nm]")
+	renderParser.add_argument("--tilts", nargs=3, type=float, default=None, help="min, max and step of tilt angles [degrees] (default: single image at 0)")
+	renderParser.add_argument("--defocus", type=float, default=0, help="defocus [microns]")
+	renderParser.add_argument("--dose", type=float, default=0, help="dose per image [e/A^2] (0: no noise)")
+	renderParser.add_argument("--set", nargs="*", default=[], help="specimen parameters as key=value (vectors as x,y)")
+	benchParser = subparsers.add_parser("bench", help="measure render time for different camera sizes")
+	benchParser.add_argument("--sizes", nargs="+", type=int, default=[1024, 2048, 4096, 8192], help="camera sizes [pixels]")
+	benchParser.add_argument("--pixel", type=float, default=10, help="pixel size [nm]")
+	args = parser.parse_args()
+
+	if args.command == "render":
+		params = {"type": args.type}
+		for entry in args.set:
+			key, value = entry.split("=", 1)
+			params[key] = tuple(float(val) for val in value.split(",")) if "," in value else int(value) if value.isdigit() else float(value)
+		tilts = np.arange(args.tilts[0], args.tilts[1] + args.tilts[2] / 2, args.tilts[2]) if args.tilts is not None else [0]
+		images = renderTiltSeries(params, tilts, (args.size, args.size), np.identity(2) * args.pixel / 1000, defocus=args.defocus, dose=args.dose)
+		writeMrc(args.out, images, args.pixel)
+		print("Wrote " + str(len(images)) + " image(s) to " + args.out)
+		if args.type == "holes":
+			print("Lattice vectors at 0 degrees [pixels]: " + ", ".join([str(np.round(vec, 1)) for vec in latticeVectors(params, np.identity(2) * args.pixel / 1000)]))
+	else:
+		print("size | projection | defocus | noise [ms]")
+		for size, result in benchmark(args.sizes, args.pixel).items():
+			print(str(size).rjust(4) + " | " + str(round(result["projection"])).rjust(10) + " | " + str(round(result["defocus"])).rjust(7) + " | " + str(round(result["noise"])).rjust(5))
+
+if __name__ == "__main__":
+	main()
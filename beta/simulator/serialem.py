@@ -0,0 +1,453 @@
+# ===================================================================
+#ScriptName	serialem (stand-in)
+# Purpose:	Stand-in for the SerialEM Python module to run PACEtomo scripts off the microscope.
+#		Commands act on a simple physical model of stage, specimen and optics (tilt, image shift, defocus, buffers, files).
+#		More information at http://github.com/eisfabian/PACEtomo
+# Created:	2026/10/19
+# Revision:	v1.2
+# Last Change:	2026/10/19: added synthetic specimen images (PACEtomo_specimen)
+#		2026/10/19: added physics model (tilt axis offset, specimen heights, stage tilt error and drift, noisy alignment)
+#		2026/10/19: created
+# ===================================================================
+
+# Put this folder first on sys.path (e.g. PYTHONPATH) to run PACEtomo scripts with it. Images, mdoc files and stage
+# movements are only kept in memory (except for mdoc files written by WriteAutodoc). See PACEtomo_benchmark.py for an example driver.
+#
+# Physics model (all lengths in microns, change config before calling reset()):
+#	Specimen height h(x, y) is a plane (pretilt, rotation) plus smooth random bumps (heightNoise) around the nav item.
+#	A specimen point p is imaged at tilt t at specimen shift X = px - stageX, Y = r + (py - stageY - r) * cos(t) - H * sin(t)
+#	with H = h(p) - stageZ (height above tilt axis) and r the error of the tilt axis offset known to SerialEM (tiltAxisError).
+#	Its defocus is the objective defocus plus H * cos(t) + (py - stageY - r) * sin(t) (same sign convention as PACEtomo focus changes).
+#	Every tilt adds a random stage tilt error and stage shift. The stage drifts with driftRate during the run.
+#	Open files are numbered from 1 in order of opening, CloseFile makes the last opened file current. Saving an image takes saveTime.
+#	The zero loss peak drifts with zlpDrift. RefineZLP sets the energy offset to the current ZLP (with noise).
+#	Every image remembers the specimen point at its center. AlignTo measures where the reference center is now, plus noise.
+# With config["specimen"] set to a dict of PACEtomo_specimen parameters, buffers contain rendered images of the specimen at the beam
+# position, tilt angle and defocus of the model instead of noise.
+# The ground truth of every saved image is kept in state["files"][i]["truth"] (specimen point at center, tilt, defocus, ZLP error).
+
+import os
+import time
+import numpy as np
+import PACEtomo_specimen as specimen
+
+class ScriptExit(Exception):
+	pass
+
+# Configuration (can be changed by the driver before running a script)
+config = {
+	"navNote": "",											# nav note of selected item (name of tgts file)
+	"directory": os.getcwd(),									# SerialEM working directory
+	"camera": (4096, 4096),										# camera size [pixels]
+	"pixelSize": 0.25,										# Record pixel size [nm]
+	"dose": 3.0,											# dose per Record image [e/A^2]
+	"yesNo": 1,											# answer to all YesNoBox calls
+	"echo": False,											# print Echo output
+	"sleep": False,											# actually wait for Delay calls
+	"abortAfter": 0,										# raise ScriptExit after this many saved images (simulates crash)
+	"imageSize": 512,										# size of simulated images [pixels] (images of all saved sections are kept in memory)
+	"specimen": None,										# PACEtomo_specimen parameters (e.g. {"type": "holes"}) to render images (None: noise images)
+	"mapPixelSize": 20.0,										# pixel size of map files read by ReadOtherFile/LoadOtherMap [nm]
+	"mapCenters": {},										# specimen coords (x, y) of map files read by ReadOtherFile/LoadOtherMap (unknown maps are assumed to be on target)
+
+	# Physics model
+	"seed": 0,											# random seed of specimen and all errors
+	"navStage": (0.0, 0.0),										# stage position of nav item (tracking target)
+	"tiltAxisOffset": 0.5,										# tilt axis offset known to SerialEM
+	"tiltAxisError": 0.0,										# true minus known tilt axis offset
+	"eucentricError": 0.3,										# height of specimen above tilt axis at nav item after Eucentricity
+	"pretilt": 0.0,											# specimen pretilt [degrees]
+	"rotation": 0.0,										# specimen rotation [degrees]
+	"heightNoise": 0.1,										# amplitude of random height variation
+	"heightScale": 3.0,										# lateral size of random height variation
+	"tiltError": 0.02,										# standard deviation of stage tilt error [degrees]
+	"stageShift": 0.02,										# standard deviation of stage shift per tilt
+	"tiltBacklash": 0.0,										# difference of stage position when approaching a tilt angle from below or above
+	"tiltBacklashNoise": 0.0,									# standard deviation of backlash per degree of tilt move when tilt direction reverses
+	"driftRate": 0.0,										# stage drift [nm/s]
+	"driftAngle": 30.0,										# direction of stage drift [degrees]
+	"alignNoise": 0.003,										# standard deviation of AlignTo error
+	"alignOutlier": 0.0,										# probability of AlignTo locking onto a random wrong position
+	"focusNoise": 0.05,										# standard deviation of autofocus and CTF fit error
+	"stageMoveError": 0.5,										# standard deviation of stage position after MoveToNavItem
+	"saveTime": 0.0,										# time [s] to save an image
+	"zlpDrift": 0.0,										# drift of zero loss peak [eV/min]
+	"zlpNoise": 0.1,										# standard deviation of ZLP position found by RefineZLP [eV]
+}
+
+# Microscope state
+state = {}
+log = []
+calls = []
+
+def reset():
+	rng = np.random.default_rng(config["seed"])
+	nBumps = 60
+	state.clear()
+	state.update({
+		"tilt": 0.0, "IS": np.zeros(2), "defocus": 0.0, "targetDefocus": 0.0, "mag": 33000, "exposure": {}, "clock": 0.0,
+		"vars": {}, "persistent": {}, "buffers": {}, "files": [], "openFiles": [], "curFile": -1, "bufShift": np.zeros(2), "alignLimit": 0, "dose": {}, "doseArea": 0,
+		"properties": {"ImageShiftLimit": 15, "DummyInstance": 0}, "autofocus": 0.0,
+		"rng": rng, "zlp": 0.0, "zlpOffset": 0.0, "tiltDir": 1, "backlash": config["tiltBacklash"] / 2,
+		"bumps": np.column_stack([rng.uniform(-30, 30, (nBumps, 2)) + np.array(config["navStage"]), rng.normal(0, config["heightNoise"], nBumps)]),
+	})
+	state["stage"] = np.array([config["navStage"][0], config["navStage"][1], 0.0])
+	state["stage"][2] = _height(np.array(config["navStage"])) - config["eucentricError"]
+	log.clear()
+	calls.clear()
+
+is2ss = np.array([[1.0, 0.0], [0.0, 1.0]])								# image shift units to specimen microns
+c2ss = np.array([[0.0, -1.0], [1.0, 0.0]]) * config["pixelSize"] / 1000				# camera pixels to specimen microns
+
+def _call(name):
+	calls.append(name)
+
+def _image(shape=None):
+	shape = shape if shape is not None else (config["imageSize"], config["imageSize"])
+	rng = np.random.default_rng(len(calls))
+	return rng.normal(100, 10, shape).astype(np.float32)
+
+### Physics model
+
+def _height(p):												# specimen height at specimen point p (stage coords)
+	d = p - np.array(config["navStage"])
+	plane = np.tan(np.radians(config["pretilt"])) * (np.cos(np.radians(config["rotation"])) * d[1] - np.sin(np.radians(config["rotation"])) * d[0])
+	bumps = state["bumps"]
+	return plane + np.sum(bumps[:, 2] * np.exp(-np.sum((bumps[:, :2] - p)**2, axis=1) / (2 * config["heightScale"]**2)))
+
+def _project(p, tilt=None):										# specimen shift and defocus offset of specimen point p at current tilt
+	t = np.radians(state["tilt"] if tilt is None else tilt)
+	r = config["tiltAxisError"]
+	m = p - state["stage"][:2]
+	H = _height(p) - state["stage"][2]
+	return np.array([m[0], r + (m[1] - r) * np.cos(t) - H * np.sin(t)]), H * np.cos(t) + (m[1] - r) * np.sin(t)
+
+def _beamCenter():											# specimen point at center of beam
+	ss = is2ss @ state["IS"]
+	t = np.radians(state["tilt"])
+	r = config["tiltAxisError"]
+	p = np.array([ss[0], ss[1]]) + state["stage"][:2]
+	for i in range(4):										# height depends on position, converges quickly for small slopes
+		H = _height(p) - state["stage"][2]
+		p[1] = state["stage"][1] + r + (ss[1] - r + H * np.sin(t)) / np.cos(t)
+	return p
+
+def _advance(seconds):											# advance clock and stage drift
+	state["clock"] += seconds
+	state["zlp"] += config["zlpDrift"] * seconds / 60
+	if config["driftRate"] != 0:
+		angle = np.radians(config["driftAngle"])
+		state["stage"][:2] += config["driftRate"] / 1000 * seconds * np.array([np.cos(angle), np.sin(angle)])
+
+def _tilt(angle):
+	rng = state["rng"]
+	_advance(abs(angle - state["tilt"]) / 10 + 1)							# stage tilt speed ~10 deg/s
+	direction = np.sign(angle - state["tilt"]) or state["tiltDir"]
+	if config["tiltBacklash"] != 0 and direction != state["tiltDir"]:				# stage position depends on approach direction, large moves are less reproducible
+		backlash = direction * config["tiltBacklash"] / 2 + rng.normal(0, config["tiltBacklashNoise"] * abs(angle - state["tilt"]))
+		state["stage"][1] += backlash - state["backlash"]
+		state["backlash"] = backlash
+	state["tiltDir"] = direction
+	state["tilt"] = angle + rng.normal(0, config["tiltError"])
+	state["stage"][:2] += rng.normal(0, config["stageShift"], 2)
+
+def _buffer(image=None, center=None, pixelSize=None, tilt=None):					# buffer content including ground truth
+	center = _beamCenter() if center is None else center
+	pixelSize = config["pixelSize"] * config["camera"][0] / config["imageSize"] if pixelSize is None else pixelSize	# binned view of whole camera
+	tilt = state["tilt"] if tilt is None else tilt
+	defocus = state["defocus"] + _project(center, tilt)[1]
+	if image is None:
+		image = _render(center, tilt, defocus, pixelSize) if config["specimen"] is not None else _image()
+	return {"image": image, "center": center, "tilt": tilt, "defocus": defocus, "pixelSize": pixelSize, "zlpError": state["zlp"] - state["zlpOffset"]}
+
+def _render(center, tilt, defocus, pixelSize):								# image of specimen at center [specimen microns]
+	matrix = c2ss / config["pixelSize"] * pixelSize
+	return specimen.render(config["specimen"], (config["imageSize"], config["imageSize"]), matrix, center=center, tilt=tilt, defocus=defocus, dose=config["dose"], seed=len(calls))
+
+def _getBuffer(buf):
+	if buf not in state["buffers"]:
+		state["buffers"][buf] = _buffer()
+	return state["buffers"][buf]
+
+### Script control
+
+def Exit(*args):
+	raise ScriptExit()
+
+def Echo(*args):
+	text = " ".join([str(a) for a in args])
+	log.append(text)
+	if config["echo"]:
+		print(text)
+
+def OKBox(*args):
+	Echo(*args)
+
+def YesNoBox(*args):
+	return config["yesNo"]
+
+def Pause(*args):
+	Echo(*args)
+
+def Delay(value, unit="ms"):
+	seconds = value / 1000 if unit == "ms" else value
+	_advance(seconds)
+	if config["sleep"]:
+		time.sleep(seconds)
+
+def SuppressReports(*args): pass
+def ProgramTimeStamps(*args): pass
+def SetStatusLine(*args): pass
+def ClearStatusLine(*args): pass
+def SaveLog(*args): pass
+def SaveLogOpenNew(*args): pass
+def IsVersionAtLeast(*args): return 1
+def ReportClock(): return state["clock"]
+def ResetClock(): state["clock"] = 0.0
+
+def SetVariable(name, value): state["vars"][name] = str(value)
+def GetVariable(name): return state["vars"].get(name, "")
+def IsVariableDefined(name): return 1 if name in state["vars"] or name in state["persistent"] else 0
+def SetPersistentVar(name, value): state["persistent"][name] = str(value)
+
+def ReportProperty(name): return state["properties"].get(name, 0)
+def SetProperty(name, value): state["properties"][name] = value
+def SetUserSetting(*args): pass
+
+def ReportDirectory(): return config["directory"]
+def UserSetDirectory(*args): pass
+def SetDirectory(path): config["directory"] = path
+
+### Navigator
+
+def ReportNavItem():
+	state["vars"]["navIndex"] = "1"
+	state["vars"]["navNote"] = config["navNote"]
+	state["vars"]["navLabel"] = "001"
+	return 1.0, config["navStage"][0], config["navStage"][1], 0.0, 0.0
+def ReportNumTableItems(): return 1
+def MoveToNavItem(*args):
+	_call("MoveToNavItem")
+	_advance(5)
+	state["stage"][:2] = np.array(config["navStage"]) + state["rng"].normal(0, config["stageMoveError"], 2)
+	state["IS"] = np.zeros(2)
+def RealignToOtherItem(*args):										# stage move and image shift to center nav item
+	MoveToNavItem()
+	_call("RealignToOtherItem")
+	_advance(10)
+	error = _project(np.array(config["navStage"]))[0] + state["rng"].normal(0, config["alignNoise"], 2)
+	state["IS"] = np.linalg.inv(is2ss) @ error
+def UpdateItemZ(*args): pass
+def LoadOtherMap(*args):
+	center = config["mapCenters"].get("nav", np.array(config["navStage"], dtype=float))
+	state["buffers"]["O" if len(args) < 2 else args[1]] = _buffer(center=np.array(center, dtype=float), pixelSize=config["mapPixelSize"], tilt=0.0)
+
+### Stage, optics and image shift
+
+def TiltTo(angle):
+	_call("TiltTo")
+	_tilt(float(angle))
+def TiltBy(angle):
+	_call("TiltBy")
+	_tilt(state["tilt"] + float(angle))
+def ReportTiltAngle(): return round(state["tilt"], 2)
+def ReportTiltAxisOffset(): return config["tiltAxisOffset"], 0.0
+def ReportStageXYZ(): return tuple(state["stage"])
+def Eucentricity(*args):
+	_call("Eucentricity")
+	_advance(30)
+	state["stage"][2] = _height(_beamCenter()) - config["eucentricError"]
+def ReportAxisPosition(*args): return 0.0, 0.0
+
+def SetImageShift(x, y): state["IS"] = np.array([x, y], dtype=float)
+def ReportImageShift(): return state["IS"][0], state["IS"][1], 0.0, 0.0, 0.0, 0.0
+def ImageShiftByUnits(x, y): state["IS"] += np.array([x, y], dtype=float)
+def ImageShiftByMicrons(x, y): state["IS"] += np.linalg.inv(is2ss) @ np.array([x, y], dtype=float)
+def ImageShiftByPixels(x, y): state["IS"] += np.linalg.inv(is2ss) @ c2ss @ np.array([x, y], dtype=float)
+def ResetImageShift(*args): state["IS"] = np.zeros(2)
+def ReportSpecimenShift():
+	ss = is2ss @ state["IS"]
+	return ss[0], ss[1]
+def ISToSpecimenMatrix(*args): return tuple(is2ss.flatten())
+def StageToSpecimenMatrix(*args): return 1.0, 0.0, 0.0, 1.0
+def SpecimenToStageMatrix(*args): return 1.0, 0.0, 0.0, 1.0
+def CameraToSpecimenMatrix(*args): return tuple(c2ss.flatten())
+def SpecimenToCameraMatrix(*args): return tuple(np.linalg.inv(c2ss).flatten())
+def AdjustBeamTiltforIS(*args): pass
+def RestoreBeamTilt(*args): pass
+def ReportComaVsISmatrix(*args): return 0.0, 0.0, 0.0, 0.0
+
+def SetDefocus(value): state["defocus"] = float(value)
+def ReportDefocus(): return state["defocus"]
+def SetTargetDefocus(value): state["targetDefocus"] = float(value)
+def ReportMag(): return state["mag"], 0.0
+def SetMag(value): state["mag"] = value
+def GoToLowDoseArea(*args): pass
+def UpdateLowDoseParams(*args): pass
+def RestoreLowDoseParams(*args): pass
+def RefineZLP(*args):
+	_call("RefineZLP")
+	_advance(10)
+	state["zlpOffset"] = state["zlp"] + state["rng"].normal(0, config["zlpNoise"])
+def ReportEnergyFilter(): return 20.0, state["zlpOffset"], 1.0					# slit width, energy loss (includes ZLP offset), slit in
+def ReportIlluminatedArea(): return 0.02
+
+### Camera and buffers
+
+def CameraProperties(*args): return config["camera"][0], config["camera"][1], 1.0, 0.0, config["pixelSize"]
+def SetExposure(mode, value, *args): state["exposure"][mode] = float(value)
+def ReportExposure(mode): return state["exposure"].get(mode, 1.0), 0.0
+def SetBinning(*args): pass
+def SetCameraArea(*args): pass
+def RestoreCameraSet(mode=None):
+	if mode is None: state["exposure"].clear()
+	else: state["exposure"].pop(mode, None)
+
+def _acquire(mode):
+	_call(mode)
+	_advance(state["exposure"].get(mode, 1.0))
+	for buf in reversed("ABCDEFGHIJKLMN"[:-1]):						# roll buffers
+		if buf in state["buffers"]:
+			state["buffers"][chr(ord(buf) + 1)] = state["buffers"][buf]
+	state["buffers"]["A"] = _buffer()
+
+def R(*args): _acquire("R")
+def L(*args): _acquire("L")
+def V(*args): _acquire("V")
+def Search(*args): _acquire("V")
+def G(*args):												# G(-1) only measures defocus, otherwise defocus is changed to target defocus
+	_call("G")
+	_advance(2)
+	state["autofocus"] = state["defocus"] + _project(_beamCenter())[1] + state["rng"].normal(0, config["focusNoise"])
+	if len(args) == 0 or int(args[0]) >= 0:
+		state["defocus"] += state["targetDefocus"] - state["autofocus"]
+def ReportAutoFocus(): return state["autofocus"], 0.0, 0.0
+def AcquireToMatchBuffer(*args): _acquire("V")
+def Copy(fromBuf, toBuf): state["buffers"][toBuf] = dict(_getBuffer(fromBuf))
+def CropCenterToSize(*args): pass
+def ImageProperties(buf="A"):
+	content = _getBuffer(buf)
+	return float(content["image"].shape[1]), float(content["image"].shape[0]), 1.0, 1.0, content["pixelSize"], 0.0
+def ReduceImage(buf, factor):										# bin image into buffer A
+	content = dict(_getBuffer(buf))
+	factor = int(factor)
+	image = content["image"]
+	rows, cols = image.shape[0] // factor, image.shape[1] // factor
+	content["image"] = image[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor).mean(axis=(1, 3)).astype(np.float32)
+	content["pixelSize"] *= factor
+	state["buffers"]["A"] = content
+def ImageConditions(buf="A"): return config["dose"], 0.0, 0.0
+def ReportMeanCounts(*args): return 100.0
+def bufferImage(buf):
+	image = _getBuffer(buf)["image"]
+	image.flags.writeable = False
+	return image
+def PutImageInBuffer(image, buf, *args):
+	content = dict(_getBuffer(buf))
+	content["image"] = np.array(image)
+	state["buffers"][buf] = content
+def ReportCurrentBuffer(): return "A", 0.0
+
+def LimitNextAutoAlign(limit): state["alignLimit"] = float(limit)
+def AlignTo(buf, *args):										# shift image to center specimen point of reference in current image
+	_call("AlignTo")
+	_advance(0.2)
+	rng = state["rng"]
+	ref = _getBuffer(buf)
+	current = _getBuffer("A")
+	error = _project(ref["center"])[0] - _project(current["center"])[0]
+	if rng.random() < config["alignOutlier"]:
+		error = rng.uniform(-0.5, 0.5, 2)
+	if state["alignLimit"] > 0 and np.linalg.norm(error) > state["alignLimit"]:		# peak outside of limit cannot be found
+		error *= state["alignLimit"] / np.linalg.norm(error)
+	shift = np.linalg.inv(is2ss) @ (error + rng.normal(0, config["alignNoise"], 2))
+	state["bufShift"] = shift
+	state["IS"] += shift
+	current["center"] = _beamCenter()
+	state["alignLimit"] = 0
+def ReportISforBufferShift(): return state["bufShift"][0], state["bufShift"][1]
+def ReportAlignShift():
+	ss = is2ss @ state["bufShift"]
+	px = np.linalg.inv(c2ss) @ ss
+	return px[0], px[1], 0.0, 0.0, ss[0] * 1000, ss[1] * 1000
+
+def CtfFind(buf="A", *args):
+	_advance(1)
+	return _getBuffer(buf)["defocus"] + state["rng"].normal(0, config["focusNoise"]), 0.1, 0.0, 0.0, 0.1, 8.0
+def Ctfplotter(buf="A", *args):
+	_advance(1)
+	return _getBuffer(buf)["defocus"] + state["rng"].normal(0, config["focusNoise"]), 0.1, 0.0, 0.0, 0.1, 8.0
+
+def AreaForCumulRecordDose(area): state["doseArea"] = area
+def AccumulateRecordDose(dose): state["dose"][state["doseArea"]] = state["dose"].get(state["doseArea"], 0) + dose
+
+### Files
+
+def SetNewFileType(*args): pass
+def AllowFileOverwrite(*args): pass
+def DoesFileExist(name): return 1 if os.path.exists(os.path.join(config["directory"], name)) else 0
+def _openFile(index):											# open files are numbered from 1 in order of opening, new file becomes current
+	if index in state["openFiles"]:
+		raise ScriptExit("File already open: " + state["files"][index]["name"])
+	state["openFiles"].append(index)
+	state["curFile"] = index
+def OpenNewFile(name):
+	_call("OpenNewFile")
+	state["files"].append({"name": name, "sections": [], "mdoc": [], "truth": []})
+	_openFile(len(state["files"]) - 1)
+def OpenOldFile(name):
+	_call("OpenOldFile")
+	for i, f in enumerate(state["files"]):
+		if f["name"] == name:
+			_openFile(i)
+			break
+	else:
+		raise ScriptExit("File not found: " + name)
+def _curFile():
+	if state["curFile"] < 0:
+		raise ScriptExit("No file open")
+	return state["files"][state["curFile"]]
+def CloseFile(*args):											# last opened file becomes current
+	_call("CloseFile")
+	if state["curFile"] >= 0:
+		state["openFiles"].remove(state["curFile"])
+	state["curFile"] = state["openFiles"][-1] if len(state["openFiles"]) > 0 else -1
+def ReportFileNumber(): return float(state["openFiles"].index(state["curFile"]) + 1) if state["curFile"] >= 0 else -1.0
+def SwitchToFile(number):
+	number = int(number)
+	if number < 1 or number > len(state["openFiles"]):
+		raise ScriptExit("No open file with number " + str(number))
+	state["curFile"] = state["openFiles"][number - 1]
+def S(buf="A", *args):
+	_call("S")
+	_advance(config["saveTime"])
+	f = _curFile()
+	content = dict(_getBuffer(buf))
+	f["sections"].append(content)
+	f["mdoc"].append({"TiltAngle": round(content["tilt"], 2)})
+	f["truth"].append({"center": content["center"], "tilt": content["tilt"], "defocus": content["defocus"], "zlpError": content.get("zlpError", 0.0)})
+	if config["abortAfter"] > 0 and sum([len(f["sections"]) for f in state["files"]]) >= config["abortAfter"]:
+		raise ScriptExit("Simulated crash")
+def ReportFileZsize(): return float(len(_curFile()["sections"]))
+def ReadFile(sec, buf):
+	f = _curFile()
+	state["buffers"][buf] = dict(f["sections"][int(sec)])
+def ReadOtherFile(sec, buf, name):
+	center = config["mapCenters"].get(os.path.basename(name))
+	state["buffers"][buf] = _buffer(center=np.array(center, dtype=float) if center is not None else None, pixelSize=config["mapPixelSize"], tilt=0.0)
+def AddToAutodoc(key, value): _curFile()["mdoc"][-1][key] = value
+def WriteAutodoc(*args):
+	f = _curFile()
+	with open(os.path.join(config["directory"], f["name"] + ".mdoc"), "w") as mdoc:
+		for i, sec in enumerate(f["mdoc"]):
+			mdoc.write("[ZValue = " + str(i) + "]\n" + "".join([key + " = " + str(value) + "\n" for key, value in sec.items()]) + "\n")
+
+### Facility
+
+def AreDewarsFilling(): return 0
+def LongOperation(*args): pass
+def IsFEGFlashingAdvised(*args): return 0
+def NextFEGFlashHighTemp(*args): pass
+def ReportHighVoltage(): return 300.0
+
+reset()